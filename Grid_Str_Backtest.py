@@ -1,8 +1,123 @@
+import argparse
+import bisect
+import os
+
 import pandas as pd
 import matplotlib.pyplot as plt
 import matplotlib.dates as mdates
 import numpy as np
 
+from Grid_candle_store import CandleStore
+
+
+def next_band_exit(close, start, buy_level, sell_level, block=64):
+    # First bar at or after start whose close is at/below buy_level or at/above sell_level,
+    # or len(close). Windows double in size, so a long quiet stretch costs a few array scans.
+    n = len(close)
+    while start < n:
+        stop = min(start + block, n)
+        window = close[start:stop]
+        hit = (window <= buy_level) | (window >= sell_level)
+        if hit.any():
+            return start + int(hit.argmax())
+        start = stop
+        block *= 2
+    return n
+
+
+class MinSegmentTree:
+    # Range minimum over a fixed array with point updates, both O(log n)
+    def __init__(self, values):
+        self.size = 1
+        while self.size < len(values):
+            self.size *= 2
+        self.tree = [float('inf')] * (2 * self.size)
+        self.tree[self.size:self.size + len(values)] = values
+        for i in range(self.size - 1, 0, -1):
+            self.tree[i] = min(self.tree[2 * i], self.tree[2 * i + 1])
+
+    def update(self, i, value):
+        i += self.size
+        self.tree[i] = value
+        while i > 1:
+            i //= 2
+            self.tree[i] = min(self.tree[2 * i], self.tree[2 * i + 1])
+
+    def query(self, lo, hi):
+        # Minimum over [lo, hi)
+        result = float('inf')
+        lo += self.size
+        hi += self.size
+        while lo < hi:
+            if lo & 1:
+                result = min(result, self.tree[lo])
+                lo += 1
+            if hi & 1:
+                hi -= 1
+                result = min(result, self.tree[hi])
+            lo //= 2
+            hi //= 2
+        return result
+
+
+def match_trades(trade_log, grid_range, quantity):
+    # Pairs each trade with the first open position (in insertion order) on the other side whose
+    # price is within grid_range, as scanning open_positions did, without the quadratic scan:
+    # positions of each side are sorted by price, so the ones within grid_range of a trade are
+    # one contiguous run, and a segment tree gives the earliest still open among them.
+    # open_positions was keyed by date: the last trade of a date sits at the first one's place.
+    open_positions = {}
+    for trade in trade_log:
+        open_positions[trade['Date']] = trade
+    dates = list(open_positions)
+
+    sides = {}
+    for bs in ('Buy', 'Sell'):
+        entries = sorted((open_positions[date]['Price'], index) for index, date in enumerate(dates)
+                         if open_positions[date]['B/S'] == bs)
+        sides[bs] = {
+            'prices': [price for price, _ in entries],
+            'slot': {index: slot for slot, (_, index) in enumerate(entries)},
+            'open': MinSegmentTree([index for _, index in entries]),
+        }
+
+    closed_trades = {}
+    total_pnl = 0
+    for trade in trade_log:
+        date = trade['Date']
+        price = trade['Price']
+        bs = trade['B/S']
+        other = sides['Sell' if bs == 'Buy' else 'Buy']
+        # abs(q - price) <= grid_range holds on one run of the sorted prices q
+        lo = bisect.bisect_left(other['prices'], True,
+                                key=lambda q: q >= price or abs(q - price) <= grid_range)
+        hi = bisect.bisect_left(other['prices'], True,
+                                key=lambda q: q > price and abs(q - price) > grid_range)
+        index = other['open'].query(lo, hi)
+        if index == float('inf'):
+            continue
+        other_date = dates[index]
+        other_price = open_positions[other_date]['Price']
+        if bs == 'Buy':
+            pnl = (price - other_price) * quantity
+        else:
+            pnl = (other_price - price) * quantity
+        closed_trades[other_date] = {
+            'Date': other_date,
+            'Price': other_price,
+            'B/S': 'Sell' if bs == 'Buy' else 'Buy',
+            'PNL': pnl
+        }
+        closed_trades[date] = {
+            'Date': date,
+            'Price': price,
+            'B/S': bs,
+            'PNL': pnl
+        }
+        total_pnl += pnl
+        other['open'].update(other['slot'][index], float('inf'))
+    return closed_trades, total_pnl
+
 
 def grid_bot_strategy(df, start_date, end_date, initial_price, lower_limit, upper_limit, grid_levels, initial_capital):
     # Filteration
@@ -10,27 +125,29 @@ def grid_bot_strategy(df, start_date, end_date, initial_price, lower_limit, uppe
     df = df[(df['date'] >= start_date) & (df['date'] <= end_date)]
     df = df[(df['close'] >= lower_limit) & (df['close'] <= upper_limit)]
     df = df.iloc[::-1]
+    close = df['close'].to_numpy(dtype=float)
+    dates = df['date'].to_numpy()
 
     # Calculate the grid range and initial buy/sell levels
     grid_range = (upper_limit - lower_limit) / grid_levels
     buy_level = initial_price - grid_range
     sell_level = initial_price + grid_range
     trade_log = []
-    total_pnl = 0
-    quantity = 0
-    open_positions = {}  # To track open positions
+    # Every closed trade is sized with the quantity at the last bar's price
+    quantity = ((initial_capital / float(close[-1])) / (grid_levels/2)) if len(close) else 0
 
     print(f"Initial Buy Level: {buy_level}, Initial Sell Level: {sell_level}")
     print(f"Grid Range: {grid_range}")
 
 # ////////////////////////////////////////////////////////////////////////////////////////////////////////////////////
 
-# In this part , we are calculating buy/sell_level and appending trade log and open_positions to be closed in next itereation
+# In this part , we jump from fill to fill: a bar fills only when its close leaves the band
+# between buy_level and sell_level, and each fill shifts the band by grid_range
 
-    for i, row in df.iterrows():
-        price = row['close']
-        date = row['date']
-        quantity = ((initial_capital / price) / (grid_levels/2))
+    i = next_band_exit(close, 0, buy_level, sell_level)
+    while i < len(close):
+        price = float(close[i])
+        date = pd.Timestamp(dates[i])
 
         if price <= buy_level:
             trade_log.append({
@@ -40,15 +157,11 @@ def grid_bot_strategy(df, start_date, end_date, initial_price, lower_limit, uppe
                 'Buy_Level': buy_level,
                 'Sell_Level': sell_level
             })
-            open_positions[date] = {
-                'Price': price,
-                'B/S': 'Buy'
-            }
             # Update levels
             sell_level = buy_level + grid_range
             buy_level = buy_level - grid_range
 
-        elif price >= sell_level:
+        else:
             trade_log.append({
                 'Date': date,
                 'Price': price,
@@ -56,61 +169,17 @@ def grid_bot_strategy(df, start_date, end_date, initial_price, lower_limit, uppe
                 'Buy_Level': buy_level,
                 'Sell_Level': sell_level
             })
-            open_positions[date] = {
-                'Price': price,
-                'B/S': 'Sell'
-            }
 
             buy_level = sell_level - grid_range
             sell_level = sell_level + grid_range
 
+        i = next_band_exit(close, i + 1, buy_level, sell_level)
+
 #  /////////////////////////////////////////////////////////////////////////////////////////////////////////
 
 # In this part , Match and close trades
 
-    closed_trades = {}
-    for trade in trade_log:
-        date = trade['Date']
-        price = trade['Price']
-        bs = trade['B/S']
-        if bs == 'Buy':
-            for other_date, other_trade in open_positions.items():
-                if other_trade['B/S'] == 'Sell' and abs(other_trade['Price'] - price) <= grid_range:
-                    pnl = (price - other_trade['Price']) * quantity
-                    closed_trades[other_date] = {
-                        'Date': other_date,
-                        'Price': other_trade['Price'],
-                        'B/S': 'Sell',
-                        'PNL': pnl
-                    }
-                    closed_trades[date] = {
-                        'Date': date,
-                        'Price': price,
-                        'B/S': 'Buy',
-                        'PNL': pnl
-                    }
-                    total_pnl += pnl
-                    del open_positions[other_date]
-                    break
-        elif bs == 'Sell':
-            for other_date, other_trade in open_positions.items():
-                if other_trade['B/S'] == 'Buy' and abs(other_trade['Price'] - price) <= grid_range:
-                    pnl = (other_trade['Price'] - price) * quantity
-                    closed_trades[other_date] = {
-                        'Date': other_date,
-                        'Price': other_trade['Price'],
-                        'B/S': 'Buy',
-                        'PNL': pnl
-                    }
-                    closed_trades[date] = {
-                        'Date': date,
-                        'Price': price,
-                        'B/S': 'Sell',
-                        'PNL': pnl
-                    }
-                    total_pnl += pnl
-                    del open_positions[other_date]
-                    break
+    closed_trades, total_pnl = match_trades(trade_log, grid_range, quantity)
 
     # Convert trade log to DataFrame and include PNL calculations
     trade_log_df = pd.DataFrame(trade_log, columns=[
@@ -124,7 +193,25 @@ def grid_bot_strategy(df, start_date, end_date, initial_price, lower_limit, uppe
     return trade_log_df, closed_trades_df, total_pnl
 
 
-df = pd.read_csv('BTC-2017min.csv')
+def load_price_data(candle_root=None):
+    # BTC-2017min.csv, or with candle_root the local BTC/USD minute candles ingested into that
+    # candle store (see Grid_candle_ingest.py), newest first like the CSV
+    if candle_root is None:
+        return pd.read_csv('BTC-2017min.csv')
+    if not os.path.isdir(candle_root):
+        raise ValueError(f"No candle store at {candle_root}")
+    candles = CandleStore(candle_root).candles('local', 'BTC/USD', '1m')
+    if candles.empty:
+        raise ValueError(f"No local BTC/USD candles in {candle_root}; ingest them with Grid_candle_ingest.py")
+    return pd.DataFrame({'date': candles['Open time'], 'close': candles['Close']}).iloc[::-1]
+
+
+# python Grid_Str_Backtest.py [--candle-root candle_store]
+parser = argparse.ArgumentParser(description="Backtest and plot the grid strategy on BTC minute candles")
+parser.add_argument('--candle-root', default=None,
+                    help="read candles from this candle store instead of BTC-2017min.csv")
+candle_root = parser.parse_args().candle_root if __name__ == "__main__" else None
+df = load_price_data(candle_root)
 
 trade_log_df, closed_trades_df, total_pnl = grid_bot_strategy(
     df,
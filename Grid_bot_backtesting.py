@@ -1,133 +1,1283 @@
+import bisect
+import hashlib
+import queue
+import threading
+import time
+from collections import OrderedDict, deque
+import numpy as np
 import pandas as pd
 import tkinter as tk
 from tkinter import messagebox
 from tkinter import ttk
 from tkcalendar import DateEntry
 import ccxt
+from Grid_candle_store import CandleStore
+from Grid_heatmap import SweepHeatmap
+from Grid_results_store import ResultsStore
+
+
+TRANSACTION_FEE_RATE = 0.0003
+# Live preview: recompute this long after the last edit, and check for its result this often
+PREVIEW_DELAY_MS = 100
+PREVIEW_POLL_MS = 15
+# Derived series (date slices, price-filtered copies) and crossing-event arrays kept per series;
+# older ones are dropped first, so sweeps over many limits do not hold every copy
+DERIVED_CACHE_SIZE = 8
+# The optimizer sweeps grid levels; with Sweep Upper Limit ticked, also against upper limits
+# placed at these multiples of the entered limit's distance above the initial price
+SWEEP_GRID_LEVELS = [20, 30, 40, 50, 60, 70, 80]
+SWEEP_UPPER_LIMIT_SCALES = [1.5, 1.25, 1.0, 0.75, 0.5]
+
+
+class RangeIndex:
+    # Min and max of a price array over aligned blocks of 1, 2, 4, ... bars (about 2n values
+    # each). first_outside finds the first bar at or after start priced at/below lower or
+    # at/above upper in O(log n), climbing over blocks that stay inside and descending into the
+    # first one that does not.
+    def __init__(self, values):
+        self.n = len(values)
+        mins, maxs = [values], [values]
+        while len(mins[-1]) > 1:
+            lo, hi = mins[-1], maxs[-1]
+            if len(lo) % 2:
+                lo = np.r_[lo, np.inf]
+                hi = np.r_[hi, -np.inf]
+            mins.append(np.minimum(lo[0::2], lo[1::2]))
+            maxs.append(np.maximum(hi[0::2], hi[1::2]))
+        self.mins = mins
+        self.maxs = maxs
+
+    def first_outside(self, start, lower, upper):
+        # Returns n when every bar from start on stays strictly inside (lower, upper)
+        if start >= self.n:
+            return self.n
+        mins, maxs = self.mins, self.maxs
+        k, b = 0, start
+        while True:
+            if mins[k][b] <= lower or maxs[k][b] >= upper:
+                while k > 0:
+                    k -= 1
+                    b *= 2
+                    if not (mins[k][b] <= lower or maxs[k][b] >= upper):
+                        b += 1
+                return b
+            b += 1
+            while b % 2 == 0 and k + 1 < len(mins):
+                b //= 2
+                k += 1
+            if b >= len(mins[k]):
+                return self.n
+
+
+class PreparedSeries:
+    # Candles sorted by open time and held as read-only typed arrays. Built once per fetch and
+    # shared by every run, date selections are searchsorted slices that return views.
+    price_columns = ['Open', 'High', 'Low', 'Close', 'Volume']
+
+    def __init__(self, times, columns):
+        self.times = times
+        self.columns = columns
+        self._cache = {}
+        self._derived = OrderedDict()
+        self._derived_lock = threading.Lock()
+
+    @classmethod
+    def from_frame(cls, df):
+        if isinstance(df, cls):
+            return df
+        times = pd.to_datetime(df['Open time']).to_numpy(dtype='datetime64[ns]')
+        # Fancy indexing copies, so freezing the arrays never touches the caller's frame
+        order = np.argsort(times, kind='stable')
+        times = times[order]
+        columns = {column: df[column].to_numpy(dtype=float)[order]
+                   for column in cls.price_columns if column in df}
+        for values in [times, *columns.values()]:
+            values.flags.writeable = False
+        return cls(times, columns)
+
+    def __len__(self):
+        return len(self.times)
+
+    def __getitem__(self, column):
+        return self.columns[column]
+
+    @property
+    def close(self):
+        return self.columns['Close']
+
+    @property
+    def empty(self):
+        return len(self.times) == 0
+
+    def slice(self, start_date=None, end_date=None):
+        # Inclusive on both ends, like the 'Open time' masks it replaces
+        lo = 0 if start_date is None else int(
+            np.searchsorted(self.times, pd.to_datetime(start_date).to_datetime64(), side='left'))
+        hi = len(self.times) if end_date is None else int(
+            np.searchsorted(self.times, pd.to_datetime(end_date).to_datetime64(), side='right'))
+        if lo == 0 and hi == len(self.times):
+            return self
+        # Cached so repeated runs over the same dates share the caches of the slice
+        return self._derived_entry(('slice', lo, hi), lambda: PreparedSeries(
+            self.times[lo:hi], {column: values[lo:hi] for column, values in self.columns.items()}))
+
+    def _derived_entry(self, key, build):
+        # Least-recently-used cache of DERIVED_CACHE_SIZE entries; preview threads share it
+        with self._derived_lock:
+            if key in self._derived:
+                self._derived.move_to_end(key)
+                return self._derived[key]
+        value = build()
+        with self._derived_lock:
+            self._derived[key] = value
+            while len(self._derived) > DERIVED_CACHE_SIZE:
+                self._derived.popitem(last=False)
+        return value
+
+    def fingerprint(self):
+        # Identifies the exact candles a run saw, for comparing stored results
+        if 'fingerprint' not in self._cache:
+            digest = hashlib.blake2b(digest_size=16)
+            digest.update(np.ascontiguousarray(self.times).tobytes())
+            digest.update(np.ascontiguousarray(self.close).tobytes())
+            self._cache['fingerprint'] = digest.hexdigest()
+        return self._cache['fingerprint']
+
+    def between_prices(self, lower_limit, upper_limit):
+        # Bars whose Close lies within the limits. This is a copy, so it is cached per limits.
+        def build():
+            close = self.close
+            mask = (close >= lower_limit) & (close <= upper_limit)
+            if mask.all():
+                return self
+            times = self.times[mask]
+            times.flags.writeable = False
+            columns = {}
+            for column, values in self.columns.items():
+                columns[column] = values[mask]
+                columns[column].flags.writeable = False
+            return PreparedSeries(times, columns)
+        return self._derived_entry(('between_prices', lower_limit, upper_limit), build)
+
+    def range_index(self):
+        if 'range_index' not in self._cache:
+            self._cache['range_index'] = RangeIndex(self.close)
+        return self._cache['range_index']
+
+    @staticmethod
+    def _geometry_key(levels):
+        spacing = levels.grid_range if levels.grid_type == 'arithmetic' else levels.grid_ratio
+        return (levels.grid_type, levels.initial_price, spacing, levels.grid_levels)
+
+    def repeats_geometry(self, levels):
+        # True from the second run with this grid geometry on; counts the current run
+        key = ('geometry_runs', self._geometry_key(levels))
+        with self._derived_lock:  # Preview threads count runs on the same series
+            self._cache[key] = self._cache.get(key, 0) + 1
+            return self._cache[key] > 1 or ('crossing_events', self._geometry_key(levels)) in self._derived
+
+    def crossing_events(self, levels):
+        # Bars where Close moves across a level or closing target of this grid geometry, with the
+        # level counts (GridLevels.counts) there. Held positions can only change on these bars,
+        # so they are all a run needs; the index depends only on prices and geometry, not on
+        # capital, leverage or stop-losses, and is cached per geometry.
+        def build():
+            counts = np.stack(levels.counts(self.close))
+            changed = np.ones(len(self.times), dtype=bool)
+            changed[1:] = (counts[:, 1:] != counts[:, :-1]).any(axis=0)
+            bars = np.flatnonzero(changed)
+            events = (bars, *counts[:, bars])
+            for values in events:
+                values.flags.writeable = False
+            return events
+        return self._derived_entry(('crossing_events', self._geometry_key(levels)), build)
+
+    def to_frame(self):
+        df = pd.DataFrame({'Open time': self.times})
+        for column, values in self.columns.items():
+            df[column] = values
+        return df
 
 
-def grid_bot_strategy(df, start_date, end_date, initial_price, lower_limit, upper_limit,
+class GridLevels:
+    # Level prices of an arithmetic grid (constant spacing grid_range) or a geometric grid
+    # (constant ratio grid_ratio), each with grid_levels levels on both sides of the initial price.
+    # Buy positions close one level up and sell positions one level down. Looking up where a
+    # price sits is O(1): its depth in steps from the initial price is computed in linear or log
+    # space, then checked against the neighbouring level prices.
+    def __init__(self, initial_price, lower_limit, upper_limit, grid_levels, grid_type='arithmetic'):
+        self.initial_price = initial_price
+        self.grid_levels = grid_levels
+        self.grid_type = grid_type
+        steps = np.arange(1, grid_levels + 1)
+        if grid_type == 'arithmetic':
+            self.grid_range = (upper_limit - lower_limit) / grid_levels
+            self.buy_levels = initial_price - steps * self.grid_range
+            self.sell_levels = initial_price + steps * self.grid_range
+            self.buy_targets = self.buy_levels + self.grid_range
+            self.sell_targets = self.sell_levels - self.grid_range
+        elif grid_type == 'geometric':
+            if lower_limit <= 0 or upper_limit <= lower_limit:
+                raise ValueError("A geometric grid needs 0 < lower limit < upper limit.")
+            self.grid_ratio = (upper_limit / lower_limit) ** (1 / grid_levels)
+            self.log_ratio = np.log(self.grid_ratio)
+            self.buy_levels = initial_price / self.grid_ratio ** steps
+            self.sell_levels = initial_price * self.grid_ratio ** steps
+            self.buy_targets = self.buy_levels * self.grid_ratio
+            self.sell_targets = self.sell_levels / self.grid_ratio
+        else:
+            raise ValueError(f"Unknown grid type: {grid_type}")
+
+    def depth(self, prices):
+        # Steps below the initial price (negative above it), fractional between levels
+        if self.grid_type == 'arithmetic':
+            return (self.initial_price - prices) / self.grid_range
+        with np.errstate(divide='ignore', invalid='ignore'):
+            return np.log(self.initial_price / prices) / self.log_ratio
+
+    def _settle(self, count, holds):
+        # Nudges estimated counts of leading levels satisfying holds() onto the exact values
+        n = self.grid_levels
+        while True:
+            up = (count < n) & holds(np.minimum(count, n - 1))
+            down = (count > 0) & ~holds(np.maximum(count - 1, 0))
+            if not (up.any() or down.any()):
+                return count
+            count = count + up - down
+
+    def counts(self, prices):
+        # For every price: how many levels per side it opens and how many it lets stay open
+        prices = np.asarray(prices, dtype=float)
+        n = self.grid_levels
+        depth = self.depth(prices)
+        depth = np.nan_to_num(depth, nan=0.0, posinf=n + 1, neginf=-n - 1)
+        below = np.clip(np.floor(depth), 0, n).astype(np.int64)
+        above = np.clip(np.floor(-depth), 0, n).astype(np.int64)
+
+        buy_open = self._settle(below, lambda i: self.buy_levels[i] >= prices)
+        buy_open[prices >= self.initial_price] = 0
+        buy_keep = self._settle(np.minimum(below + 1, n), lambda i: self.buy_targets[i] > prices)
+        sell_open = self._settle(above, lambda i: self.sell_levels[i] <= prices)
+        sell_open[prices <= self.initial_price] = 0
+        sell_keep = self._settle(np.minimum(above + 1, n), lambda i: self.sell_targets[i] < prices)
+        return buy_open, buy_keep, sell_open, sell_keep
+
+
+class FeeTiers:
+    # Maker/taker fee rates by notional traded over a trailing window, the way exchanges tier
+    # them. tiers are (minimum rolling notional, maker rate, taker rate), e.g.
+    # [(0, 0.0002, 0.0005), (5_000_000, 0.00016, 0.0004)]. Grid orders rest at their levels, so
+    # they pay the maker rate unless liquidity='taker'.
+    def __init__(self, tiers, window='30D', liquidity='maker'):
+        if liquidity not in ('maker', 'taker'):
+            raise ValueError(f"Unknown liquidity: {liquidity}")
+        tiers = sorted(tiers)
+        if not tiers or tiers[0][0] > 0:
+            raise ValueError("Fee tiers must start at zero volume.")
+        self.thresholds = [tier[0] for tier in tiers]
+        self.rates = [tier[1] if liquidity == 'maker' else tier[2] for tier in tiers]
+        self.window = pd.Timedelta(window)
+
+    def rate(self, rolling_volume):
+        return self.rates[bisect.bisect_right(self.thresholds, rolling_volume) - 1]
+
+
+class FundingRates:
+    # Perpetual funding rates by funding time, from a local file such as an exchange's funding
+    # history export. Times may be epoch milliseconds or date strings.
+    time_columns = ['fundingTime', 'funding_time', 'calc_time', 'timestamp', 'time', 'Funding time']
+    rate_columns = ['fundingRate', 'funding_rate', 'last_funding_rate', 'rate', 'Funding rate']
+
+    def __init__(self, times, rates):
+        order = np.argsort(times, kind='stable')
+        self.times = times[order]
+        self.rates = rates[order]
+
+    @classmethod
+    def from_file(cls, path):
+        df = pd.read_parquet(path) if path.endswith('.parquet') else pd.read_csv(path)
+        return cls.from_frame(df)
+
+    @classmethod
+    def from_frame(cls, df):
+        time_column = next((column for column in cls.time_columns if column in df), None)
+        rate_column = next((column for column in cls.rate_columns if column in df), None)
+        if time_column is None or rate_column is None:
+            raise ValueError(f"Funding data needs a time and a rate column, got: {', '.join(map(str, df.columns))}")
+        times = df[time_column]
+        if pd.api.types.is_numeric_dtype(times):
+            times = pd.to_datetime(times, unit='ms')
+        else:
+            times = pd.to_datetime(times)
+            if times.dt.tz is not None:
+                times = times.dt.tz_convert(None)
+        return cls(times.to_numpy(dtype='datetime64[ns]'), df[rate_column].to_numpy(dtype=float))
+
+    def accrue(self, dates, close, net_quantity):
+        # Funding paid up to each bar (positive is paid, negative received), for all funding times
+        # at once: each is charged rate x net notional held after the last bar at or before it,
+        # marked at that bar's close, so longs pay when the rate is positive
+        lo = np.searchsorted(self.times, dates[0], side='left')
+        hi = np.searchsorted(self.times, dates[-1], side='right')
+        times = self.times[lo:hi]
+        bars = np.searchsorted(dates, times, side='right') - 1
+        payments = self.rates[lo:hi] * net_quantity[bars] * close[bars]
+        cumulative = np.r_[0.0, np.cumsum(payments)]
+        return cumulative[np.searchsorted(times, dates, side='right')]
+
+
+class GridPositionBook:
+    # Open grid positions per level, plus running totals of quantity and quantity x entry price
+    # for each side so unrealized PNL at any price is O(1). Open levels always form a contiguous
+    # run from the initial price outwards (closing removes the outermost ones, opening adds the
+    # innermost ones), so a count per side tells which levels are held.
+    def __init__(self, initial_price, lower_limit, upper_limit, grid_levels, initial_capital, leverage,
+                 trade_log=None, grid_type='arithmetic', fee_tiers=None):
+        self.initial_price = initial_price
+        self.grid_levels = grid_levels
+        self.levels = GridLevels(initial_price, lower_limit, upper_limit, grid_levels, grid_type)
+        self.buy_levels = self.levels.buy_levels.tolist()
+        self.sell_levels = self.levels.sell_levels.tolist()
+        self.buy_targets = self.levels.buy_targets.tolist()
+        self.sell_targets = self.levels.sell_targets.tolist()
+
+        self.buy_quantity = [0.0] * grid_levels
+        self.sell_quantity = [0.0] * grid_levels
+        self.buy_seq = [0] * grid_levels
+        self.sell_seq = [0] * grid_levels
+        self.open_buys = 0
+        self.open_sells = 0
+        self.seq = 0
+
+        self.long_quantity = 0.0
+        self.long_entry = 0.0
+        self.short_quantity = 0.0
+        self.short_entry = 0.0
+
+        self.total_pnl = 0
+        self.total_cost = 0
+        self.working_capital = initial_capital * leverage
+        self.trade_log = [] if trade_log is None else trade_log
+        self.fee_tiers = fee_tiers
+        self.recent_volume = deque()  # (date, notional) of trades inside the fee tier window
+        self.rolling_volume = 0.0
+
+    def fee_rate(self, date):
+        # The flat TRANSACTION_FEE_RATE, or the tier rate for the notional traded in the window
+        if self.fee_tiers is None:
+            return TRANSACTION_FEE_RATE
+        cutoff = date - self.fee_tiers.window
+        while self.recent_volume and self.recent_volume[0][0] <= cutoff:
+            self.rolling_volume -= self.recent_volume.popleft()[1]
+        return self.fee_tiers.rate(self.rolling_volume)
+
+    def record_volume(self, date, notional):
+        if self.fee_tiers is not None and notional:
+            self.recent_volume.append((date, notional))
+            self.rolling_volume += notional
+
+    def level_counts(self, prices):
+        return self.levels.counts(prices)
+
+    def target_counts(self, price):
+        # Levels held per side after this price, walked from the current counts with the same
+        # comparisons as GridLevels.counts (levels and targets are monotonic along each side)
+        n = self.grid_levels
+        buys = self.open_buys
+        while buys > 0 and self.buy_targets[buys - 1] <= price:
+            buys -= 1
+        if price < self.initial_price:
+            while buys < n and self.buy_levels[buys] >= price:
+                buys += 1
+        sells = self.open_sells
+        while sells > 0 and self.sell_targets[sells - 1] >= price:
+            sells -= 1
+        if price > self.initial_price:
+            while sells < n and self.sell_levels[sells] <= price:
+                sells += 1
+        return buys, sells
+
+    def band(self):
+        # Held levels change exactly when price reaches lower (next buy level or the outermost
+        # short's target) or upper (next sell level or the outermost long's target)
+        n = self.grid_levels
+        lower = max(self.buy_levels[self.open_buys] if self.open_buys < n else -np.inf,
+                    self.sell_targets[self.open_sells - 1] if self.open_sells else -np.inf)
+        upper = min(self.sell_levels[self.open_sells] if self.open_sells < n else np.inf,
+                    self.buy_targets[self.open_buys - 1] if self.open_buys else np.inf)
+        return lower, upper
+
+    def rebalance(self, date, price, open_buys, open_sells):
+        # Closes, then opens, positions so that open_buys/open_sells levels are held. Closings
+        # run in the order the positions were opened, like the open_positions list used to.
+        closing = [(self.buy_seq[i], 0, i) for i in range(open_buys, self.open_buys)] + \
+            [(self.sell_seq[j], 1, j) for j in range(open_sells, self.open_sells)]
+        if len(closing) > 1:
+            closing.sort()
+        fee_rate = self.fee_rate(date)
+        traded = 0.0
+
+        for _, side, i in closing:
+            if side == 0:
+                level = self.buy_levels[i]
+                quantity = self.buy_quantity[i]
+                pnl_current = (price - level) * quantity
+                self.long_quantity -= quantity
+                self.long_entry -= level * quantity
+                row = [date, price, 'Sell (Closing)', level, self.buy_targets[i]]
+            else:
+                level = self.sell_levels[i]
+                quantity = self.sell_quantity[i]
+                pnl_current = (level - price) * quantity
+                self.short_quantity -= quantity
+                self.short_entry -= level * quantity
+                row = [date, price, 'Buy (Closing)', self.sell_targets[i], level]
+            transaction_cost = fee_rate * price * quantity
+            traded += price * quantity
+            self.total_pnl += pnl_current
+            self.total_cost += transaction_cost
+            self.working_capital += pnl_current
+            self.trade_log.append(row + [round(pnl_current, 3), quantity, round(transaction_cost, 3)])
+
+        self.open_buys = min(self.open_buys, open_buys)
+        self.open_sells = min(self.open_sells, open_sells)
+        # Drop float residue once a side is flat
+        if self.open_buys == 0:
+            self.long_quantity = self.long_entry = 0.0
+        if self.open_sells == 0:
+            self.short_quantity = self.short_entry = 0.0
+
+        if open_buys > self.open_buys or open_sells > self.open_sells:
+            quantity = self.working_capital / price / (self.grid_levels / 2)
+            transaction_cost = fee_rate * price * quantity
+            rounded = round(quantity, 8)
+            traded += price * rounded * (open_buys - self.open_buys + open_sells - self.open_sells)
+            for i in range(self.open_buys, open_buys):
+                level = self.buy_levels[i]
+                self.seq += 1
+                self.buy_seq[i] = self.seq
+                self.buy_quantity[i] = rounded
+                self.long_quantity += rounded
+                self.long_entry += level * rounded
+                self.total_cost += transaction_cost
+                self.trade_log.append([date, price, 'Buy (Opening)', level, self.buy_targets[i], 0,
+                                       rounded, round(transaction_cost, 3)])
+            for j in range(self.open_sells, open_sells):
+                level = self.sell_levels[j]
+                self.seq += 1
+                self.sell_seq[j] = self.seq
+                self.sell_quantity[j] = rounded
+                self.short_quantity += rounded
+                self.short_entry += level * rounded
+                self.total_cost += transaction_cost
+                self.trade_log.append([date, price, 'Sell (Opening)', self.sell_targets[j], level, 0,
+                                       rounded, round(transaction_cost, 3)])
+            self.open_buys = max(self.open_buys, open_buys)
+            self.open_sells = max(self.open_sells, open_sells)
+        self.record_volume(date, traded)
+
+    def unrealized_pnl(self, price):
+        return price * (self.long_quantity - self.short_quantity) - self.long_entry + self.short_entry
+
+    def open_position_count(self):
+        return self.open_buys + self.open_sells
+
+    def mtm_value(self, price):
+        # Exact mark-to-market, summed position by position in opening order
+        positions = [(self.buy_seq[i], price - self.buy_levels[i], self.buy_quantity[i])
+                     for i in range(self.open_buys)] + \
+            [(self.sell_seq[j], self.sell_levels[j] - price, self.sell_quantity[j])
+             for j in range(self.open_sells)]
+        mtm_value = 0
+        for _, move, quantity in sorted(positions):
+            mtm_value += move * quantity
+        return mtm_value
+
+
+class VolumeLimitedBook(GridPositionBook):
+    # Position book whose orders fill against a per-bar capacity (a fraction of bar volume)
+    # instead of all at once. open_buys/open_sells are the levels the grid wants held and move
+    # exactly as in GridPositionBook; the orders that get there queue in the order they were
+    # placed and fill at each bar's close until that bar's capacity is used up, so a level can be
+    # partly held while the rest waits. Openings are sized when they first fill, after the
+    # closings queued ahead of them have added their PNL to the working capital, as
+    # GridPositionBook sizes them after its closings. Fills that leave part of an order unfilled
+    # are logged with a ', Partial' suffix.
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.buy_held = [0.0] * self.grid_levels
+        self.sell_held = [0.0] * self.grid_levels
+        # (side, level) -> [quantity left, opening, unrounded quantity the fee is charged on], in
+        # placing order; an opening not sized yet has None left
+        self.orders = {}
+        self.requested_quantity = 0.0
+        self.filled_quantity = 0.0
+        self.partial_fills = 0
+
+    def _place(self, side, i, quantity, opening):
+        self.orders[(side, i)] = [quantity, opening, quantity]
+        if quantity is not None:
+            self.requested_quantity += quantity
+
+    def rebalance(self, date, price, open_buys, open_sells):
+        # Queues the orders that take the wanted levels to open_buys/open_sells; fill() runs them.
+        # A level given up cancels the rest of its opening and sells what was filled; a level
+        # wanted again cancels the rest of its closing and only buys up to the new quantity.
+        closing = sorted([(self.buy_seq[i], 0, i) for i in range(open_buys, self.open_buys)] +
+                         [(self.sell_seq[j], 1, j) for j in range(open_sells, self.open_sells)])
+        for _, side, i in closing:
+            held = (self.buy_held if side == 0 else self.sell_held)[i]
+            self.orders.pop((side, i), None)
+            if held > 0:
+                self._place(side, i, held, False)
+        self.open_buys = min(self.open_buys, open_buys)
+        self.open_sells = min(self.open_sells, open_sells)
+
+        if open_buys > self.open_buys or open_sells > self.open_sells:
+            for side, seqs, start, stop in ((0, self.buy_seq, self.open_buys, open_buys),
+                                            (1, self.sell_seq, self.open_sells, open_sells)):
+                for i in range(start, stop):
+                    self.seq += 1
+                    seqs[i] = self.seq
+                    self.orders.pop((side, i), None)
+                    self._place(side, i, None, True)
+            self.open_buys = max(self.open_buys, open_buys)
+            self.open_sells = max(self.open_sells, open_sells)
+
+    def fill(self, date, price, capacity):
+        # Fills queued orders at price, oldest first, until capacity (base units) is used up
+        fee_rate = self.fee_rate(date)
+        traded = 0.0
+        for key in list(self.orders):
+            if capacity <= 0:
+                break
+            side, i = key
+            left, opening, fee_quantity = self.orders[key]
+            if left is None:
+                # Sized now: everything queued ahead of this order has filled
+                held = (self.buy_held if side == 0 else self.sell_held)[i]
+                unrounded = self.working_capital / price / (self.grid_levels / 2)
+                left = round(unrounded, 8) - held
+                if left <= 0:
+                    del self.orders[key]
+                    continue
+                fee_quantity = unrounded if held == 0 else left
+                self.orders[key] = [left, opening, fee_quantity]
+                self.requested_quantity += left
+            quantity = min(left, capacity)
+            capacity -= quantity
+            partial = quantity < left
+            if partial:
+                self.orders[key][0] = left - quantity
+                self.partial_fills += 1
+            else:
+                del self.orders[key]
+            self.filled_quantity += quantity
+
+            pnl_current = 0
+            if side == 0:
+                level = self.buy_levels[i]
+                if opening:
+                    self.buy_held[i] += quantity
+                    self.long_quantity += quantity
+                    self.long_entry += level * quantity
+                    label = 'Buy (Opening'
+                else:
+                    pnl_current = (price - level) * quantity
+                    self.buy_held[i] = self.buy_held[i] - quantity if partial else 0.0
+                    self.long_quantity -= quantity
+                    self.long_entry -= level * quantity
+                    label = 'Sell (Closing'
+                row = [date, price, label + (', Partial)' if partial else ')'), level, self.buy_targets[i]]
+            else:
+                level = self.sell_levels[i]
+                if opening:
+                    self.sell_held[i] += quantity
+                    self.short_quantity += quantity
+                    self.short_entry += level * quantity
+                    label = 'Sell (Opening'
+                else:
+                    pnl_current = (level - price) * quantity
+                    self.sell_held[i] = self.sell_held[i] - quantity if partial else 0.0
+                    self.short_quantity -= quantity
+                    self.short_entry -= level * quantity
+                    label = 'Buy (Closing'
+                row = [date, price, label + (', Partial)' if partial else ')'), self.sell_targets[i], level]
+            # A whole order pays its fee on the unrounded quantity, like GridPositionBook's openings
+            transaction_cost = fee_rate * price * (fee_quantity if quantity == left else quantity)
+            traded += price * quantity
+            self.total_pnl += pnl_current
+            self.total_cost += transaction_cost
+            self.working_capital += pnl_current
+            self.trade_log.append(row + [round(pnl_current, 3), quantity, round(transaction_cost, 3)])
+        self.record_volume(date, traded)
+
+        # Drop float residue once a side is flat
+        if not any(self.buy_held):
+            self.long_quantity = self.long_entry = 0.0
+        if not any(self.sell_held):
+            self.short_quantity = self.short_entry = 0.0
+
+    def open_position_count(self):
+        return sum(held > 0 for held in self.buy_held) + sum(held > 0 for held in self.sell_held)
+
+    def mtm_value(self, price):
+        positions = [(self.buy_seq[i], price - self.buy_levels[i], held)
+                     for i, held in enumerate(self.buy_held) if held > 0] + \
+            [(self.sell_seq[j], self.sell_levels[j] - price, held)
+             for j, held in enumerate(self.sell_held) if held > 0]
+        mtm_value = 0
+        for _, move, quantity in sorted(positions):
+            mtm_value += move * quantity
+        return mtm_value
+
+
+TRADE_LOG_COLUMNS = ['Date', 'Price', 'B/S', 'Entry_Level', 'Target_Level',
+                     'PNL_Current', 'Quantity', 'Transaction_Cost']
+
+
+def build_trade_log_df(trade_log):
+    trade_log_df = pd.DataFrame(trade_log, columns=TRADE_LOG_COLUMNS)
+    trade_log_df.insert(0, 'Seq', range(1, len(trade_log_df) + 1))
+    trade_log_df['Cumulative_PNL'] = trade_log_df['PNL_Current'].cumsum()
+    trade_log_df['Cumulative_Cost'] = trade_log_df['Transaction_Cost'].cumsum()
+    trade_log_df['Net_PNL'] = trade_log_df['Cumulative_PNL'] - \
+        trade_log_df['Cumulative_Cost']
+    return trade_log_df
+
+
+class TradeCounter:
+    # Stands in for the trade log in summary-only runs: counts trades without keeping rows
+    def __init__(self):
+        self.count = 0
+
+    def __len__(self):
+        return self.count
+
+    def append(self, row):
+        self.count += 1
+
+
+class TradeLogWriter:
+    # Streams trade log rows to a CSV or Parquet file (chosen by extension), writing a chunk or
+    # row group every flush_every trades. Seq and the cumulative PNL/cost columns are kept as
+    # running sums, so memory stays flat however many trades a run produces.
+    columns = ['Seq'] + TRADE_LOG_COLUMNS + ['Cumulative_PNL', 'Cumulative_Cost', 'Net_PNL']
+    float_columns = ['Price', 'Entry_Level', 'Target_Level', 'PNL_Current', 'Quantity', 'Transaction_Cost',
+                     'Cumulative_PNL', 'Cumulative_Cost', 'Net_PNL']
+
+    def __init__(self, path, flush_every=10000):
+        self.path = path
+        self.flush_every = flush_every
+        self.parquet = str(path).endswith('.parquet')
+        if self.parquet:
+            try:
+                import pyarrow
+                import pyarrow.parquet
+            except ImportError:
+                raise ImportError("pyarrow is required to stream trade logs to Parquet; use a .csv path instead.")
+            self.pyarrow = pyarrow
+            self.parquet_writer = None
+        self.rows = []
+        self.count = 0
+        self.cumulative_pnl = 0
+        self.cumulative_cost = 0
+        self.header_written = False
+
+    def __len__(self):
+        return self.count
+
+    def append(self, row):
+        self.count += 1
+        self.cumulative_pnl += row[5]
+        self.cumulative_cost += row[7]
+        self.rows.append([self.count] + row + [self.cumulative_pnl, self.cumulative_cost,
+                                               self.cumulative_pnl - self.cumulative_cost])
+        if len(self.rows) >= self.flush_every:
+            self.flush()
+
+    def flush(self):
+        if not self.rows and (self.header_written or self.count):
+            return
+        chunk = pd.DataFrame(self.rows, columns=self.columns)
+        chunk = chunk.astype({column: float for column in self.float_columns})
+        chunk['Date'] = pd.to_datetime(chunk['Date']).astype('datetime64[ns]')
+        self.rows = []
+        if self.parquet:
+            table = self.pyarrow.Table.from_pandas(chunk, preserve_index=False)
+            if self.parquet_writer is None:
+                self.parquet_writer = self.pyarrow.parquet.ParquetWriter(self.path, table.schema)
+            self.parquet_writer.write_table(table)
+        else:
+            chunk.to_csv(self.path, mode='a' if self.header_written else 'w',
+                         header=not self.header_written, index=False)
+        self.header_written = True
+
+    def close(self):
+        self.flush()
+        if self.parquet and self.parquet_writer is not None:
+            self.parquet_writer.close()
+            self.parquet_writer = None
+
+
+class BacktestCancelled(Exception):
+    pass
+
+
+def grid_bot_backtest(df, start_date, end_date, initial_price, lower_limit, upper_limit,
                       grid_levels, initial_capital, leverage, lower_stop_loss, upper_stop_loss,
-                      stop_loss_enabled):
-    df['Open time'] = pd.to_datetime(df['Open time'])
-    df = df[(df['Open time'] >= pd.to_datetime(start_date))
-            & (df['Open time'] <= pd.to_datetime(end_date))]
-    df = df.sort_values(by='Open time')
-
-    grid_range = (upper_limit - lower_limit) / grid_levels
-    buy_levels = [initial_price - i *
-                  grid_range for i in range(1, grid_levels + 1)]
-    sell_levels = [initial_price + i *
-                   grid_range for i in range(1, grid_levels + 1)]
-
-    trade_log = []
-    total_pnl = 0
-    total_cost = 0
-    working_capital = initial_capital * leverage
-
-    open_positions = []
-    stop_loss_triggered = False
-    stop_loss_trigger_date = None
-    stop_loss_trigger_price = None
-    mtm_value = 0
-
-    for _, row in df.iterrows():
-        price = row['Close']
-        date = row['Open time']
-
-        # Monitor stop-loss triggers
-        if stop_loss_enabled:
-            if price >= upper_stop_loss:
-                stop_loss_triggered = True
-                stop_loss_trigger_date = date
-                stop_loss_trigger_price = price
-                break  # Stop trading if upper stop-loss is hit
-
-            if price <= lower_stop_loss:
-                stop_loss_triggered = True
-                stop_loss_trigger_date = date
-                stop_loss_trigger_price = price
-                break  # Stop trading if lower stop-loss is hit
-
-        # Manage existing positions
-        for pos in open_positions[:]:
-            if pos['type'] == 'Buy' and price >= pos['target_sell_level']:
-                pnl_current = (price - pos['price']) * pos['quantity']
-                transaction_cost = 0.0003 * price * pos['quantity']
-                total_pnl += pnl_current
-                total_cost += transaction_cost
-                working_capital += pnl_current
-                trade_log.append([date, price, 'Sell (Closing)', pos['price'], pos['target_sell_level'],
-                                  round(pnl_current, 3), pos['quantity'], round(transaction_cost, 3)])
-                open_positions.remove(pos)
-
-            elif pos['type'] == 'Sell' and price <= pos['target_buy_level']:
-                pnl_current = (pos['price'] - price) * pos['quantity']
-                transaction_cost = 0.0003 * price * pos['quantity']
-                total_pnl += pnl_current
-                total_cost += transaction_cost
-                working_capital += pnl_current
-                trade_log.append([date, price, 'Buy (Closing)', pos['target_buy_level'], pos['price'],
-                                  round(pnl_current, 3), pos['quantity'], round(transaction_cost, 3)])
-                open_positions.remove(pos)
-
-        # Grid strategy logic (Buy/Sell levels management)
-        eligible_buy_levels = [level for level in buy_levels if price <= level]
-        eligible_sell_levels = [
-            level for level in sell_levels if price >= level]
-
-        if price < initial_price and eligible_buy_levels:
-            for buy_level in eligible_buy_levels:
-                if not any(p['price'] == buy_level for p in open_positions):
-                    quantity = working_capital / price / (grid_levels / 2)
-                    target_sell_level = buy_level + grid_range
-                    transaction_cost = 0.0003 * price * quantity
-                    total_cost += transaction_cost
-                    open_positions.append({'type': 'Buy', 'price': buy_level, 'target_sell_level': target_sell_level,
-                                           'quantity': round(quantity, 8)})
-                    trade_log.append([date, price, 'Buy (Opening)', buy_level, target_sell_level, 0,
-                                      round(quantity, 8), round(transaction_cost, 3)])
-
-        elif price > initial_price and eligible_sell_levels:
-            for sell_level in eligible_sell_levels:
-                if not any(p['price'] == sell_level for p in open_positions):
-                    quantity = working_capital / price / (grid_levels / 2)
-                    target_buy_level = sell_level - grid_range
-                    transaction_cost = 0.0003 * price * quantity
-                    total_cost += transaction_cost
-                    open_positions.append({'type': 'Sell', 'price': sell_level, 'target_buy_level': target_buy_level,
-                                           'quantity': round(quantity, 8)})
-                    trade_log.append([date, price, 'Sell (Opening)', target_buy_level, sell_level, 0,
-                                      round(quantity, 8), round(transaction_cost, 3)])
+                      stop_loss_enabled, grid_type='arithmetic', equity_every=1, maintenance_margin=0.005,
+                      trade_log_path=None, flush_every=10000, summary_only=False, volume_fraction=None,
+                      cancel=None, fee_tiers=None, funding_rates=None):
+    # df may be a DataFrame or a PreparedSeries; caller data is never modified. With
+    # trade_log_path the trade log is streamed to that file instead of returned as a DataFrame;
+    # with summary_only no trade log or equity curve is built, only scalar metrics and counts.
+    # With volume_fraction each bar fills at most that fraction of its Volume (VolumeLimitedBook).
+    # cancel is a threading.Event checked between events; once it is set the run raises
+    # BacktestCancelled, so a background run whose result is no longer wanted stops early.
+    # fee_tiers (FeeTiers) replaces the flat fee with volume-tiered rates; funding_rates
+    # (FundingRates) charges perpetual funding on the net position, reported as total_funding.
+    cancelled = (lambda: False) if cancel is None else cancel.is_set
+    series = PreparedSeries.from_frame(df).slice(start_date, end_date)
+    close = series.close
+    dates = series.times
+    if summary_only:
+        trade_log = TradeCounter()
+    elif trade_log_path is not None:
+        trade_log = TradeLogWriter(trade_log_path, flush_every)
+    else:
+        trade_log = []
+    if volume_fraction is None:
+        book = GridPositionBook(initial_price, lower_limit, upper_limit, grid_levels,
+                                initial_capital, leverage, trade_log, grid_type, fee_tiers)
+    else:
+        if 'Volume' not in series.columns:
+            raise ValueError("Volume-limited fills need a Volume column.")
+        if volume_fraction <= 0:
+            raise ValueError("Volume fraction must be positive.")
+        book = VolumeLimitedBook(initial_price, lower_limit, upper_limit, grid_levels,
+                                 initial_capital, leverage, trade_log, grid_type, fee_tiers)
+
+    # Trading stops at the first close beyond either stop-loss
+    n_bars = len(close)
+    stop_bar = n_bars
+    if stop_loss_enabled:
+        stop_bar = series.range_index().first_outside(0, lower_stop_loss, upper_stop_loss)
+    stop_loss_triggered = stop_bar < n_bars
+    stop_loss_trigger_date = pd.Timestamp(dates[stop_bar]) if stop_loss_triggered else None
+    stop_loss_trigger_price = close[stop_bar] if stop_loss_triggered else None
+
+    # Only crossing events can change the held levels; between them the clamp into each bar's
+    # [open, keep] counts is a no-op, so the loop visits events before the stop-loss bar only.
+    # The first run of a geometry instead jumps from one change to the next with the range
+    # index, so one-off geometries (optimizer candidates) never compute counts for every bar.
+    segment_bars = [0]
+    segment_totals = [(book.total_pnl, book.total_cost, book.long_quantity, book.long_entry,
+                       book.short_quantity, book.short_entry)]
+    skip_ahead = volume_fraction is None and not series.repeats_geometry(book.levels)
+    if skip_ahead:
+        range_index = series.range_index()
+        i = range_index.first_outside(0, *book.band())
+        while i < stop_bar:
+            if cancelled():
+                raise BacktestCancelled()
+            open_buys, open_sells = book.target_counts(float(close[i]))
+            book.rebalance(pd.Timestamp(dates[i]), float(close[i]), open_buys, open_sells)
+            segment_bars.append(i)
+            segment_totals.append((book.total_pnl, book.total_cost, book.long_quantity, book.long_entry,
+                                   book.short_quantity, book.short_entry))
+            i = range_index.first_outside(i + 1, *book.band())
+    else:
+        event_bars, buy_open, buy_keep, sell_open, sell_keep = series.crossing_events(book.levels)
+        n_events = int(np.searchsorted(event_bars, stop_bar))
+        if volume_fraction is None:
+            for i, b_open, b_keep, s_open, s_keep in zip(
+                    event_bars[:n_events].tolist(), buy_open[:n_events].tolist(), buy_keep[:n_events].tolist(),
+                    sell_open[:n_events].tolist(), sell_keep[:n_events].tolist()):
+                if cancelled():
+                    raise BacktestCancelled()
+                open_buys = max(min(book.open_buys, b_keep), b_open)
+                open_sells = max(min(book.open_sells, s_keep), s_open)
+                if open_buys != book.open_buys or open_sells != book.open_sells:
+                    book.rebalance(pd.Timestamp(dates[i]), float(close[i]), open_buys, open_sells)
+                    segment_bars.append(i)
+                    segment_totals.append((book.total_pnl, book.total_cost, book.long_quantity, book.long_entry,
+                                           book.short_quantity, book.short_entry))
+        else:
+            # Orders left unfilled carry over, so bars are visited one by one while any are queued
+            capacity = volume_fraction * series['Volume']
+            k = 0
+            i = int(event_bars[0]) if n_events else stop_bar
+            while i < stop_bar:
+                if cancelled():
+                    raise BacktestCancelled()
+                if k < n_events and event_bars[k] == i:
+                    open_buys = max(min(book.open_buys, int(buy_keep[k])), int(buy_open[k]))
+                    open_sells = max(min(book.open_sells, int(sell_keep[k])), int(sell_open[k]))
+                    if open_buys != book.open_buys or open_sells != book.open_sells:
+                        book.rebalance(pd.Timestamp(dates[i]), float(close[i]), open_buys, open_sells)
+                    k += 1
+                if book.orders:
+                    book.fill(pd.Timestamp(dates[i]), float(close[i]), float(capacity[i]))
+                    segment_bars.append(i)
+                    segment_totals.append((book.total_pnl, book.total_cost, book.long_quantity, book.long_entry,
+                                           book.short_quantity, book.short_entry))
+                if book.orders:
+                    i += 1
+                elif k < n_events:
+                    i = int(event_bars[k])
+                else:
+                    break
+
+    if cancelled():
+        raise BacktestCancelled()
+
+    # Equity is marked every bar (including the stop-loss bar) from the running totals of the
+    # segment the bar falls in, all bars at once
+    buying_power = initial_capital * leverage
+    last_bar = min(stop_bar, n_bars - 1)
+    marked = close[:last_bar + 1]
+    segment = np.searchsorted(segment_bars, np.arange(last_bar + 1), side='right') - 1
+    pnl, cost, long_quantity, long_entry, short_quantity, short_entry = (
+        np.array(totals, dtype=float)[segment] for totals in zip(*segment_totals))
+    equity = initial_capital + pnl - cost + (marked * (long_quantity - short_quantity) - long_entry + short_entry)
+    exposure = marked * (long_quantity + short_quantity)
+    funding = None
+    if funding_rates is not None and last_bar >= 0:
+        funding = funding_rates.accrue(dates[:last_bar + 1], marked, long_quantity - short_quantity)
+        equity = equity - funding
+    total_funding = funding[-1] if funding is not None else 0.0
+    peak = np.maximum.accumulate(np.r_[initial_capital, equity])[1:]
+    drawdown = peak - equity
+    max_drawdown = max(0.0, drawdown.max()) if len(drawdown) else 0.0
+    positive = peak > 0
+    max_drawdown_pct = max(0.0, (drawdown[positive] / peak[positive]).max()) if positive.any() else 0.0
+    max_exposure = max(0.0, exposure.max()) if len(exposure) else 0.0
+    liquidated = equity <= maintenance_margin * exposure
+    liquidation_bar = int(liquidated.argmax()) if liquidated.any() else None
+
+    if isinstance(trade_log, TradeLogWriter):
+        trade_log.close()
 
     # Calculate MTM value
     if stop_loss_triggered:
         mtm_price = stop_loss_trigger_price
-    elif not df.empty:
-        mtm_price = df.iloc[-1]['Close']
+    elif n_bars:
+        mtm_price = close[-1]
     else:
         mtm_price = initial_price
+    mtm_value = book.mtm_value(mtm_price)
 
-    for pos in open_positions:
-        if pos['type'] == 'Buy':
-            mtm_value += (mtm_price - pos['price']) * pos['quantity']
-        elif pos['type'] == 'Sell':
-            mtm_value += (pos['price'] - mtm_price) * pos['quantity']
-
-    total_mtm = total_pnl + mtm_value - total_cost
+    total_pnl = book.total_pnl
+    total_cost = book.total_cost
+    total_mtm = total_pnl + mtm_value - total_cost - total_funding
     roi = (total_mtm) / initial_capital * 100
 
-    # Create DataFrame for the trade log
-    trade_log_df = pd.DataFrame(trade_log, columns=['Date', 'Price', 'B/S', 'Entry_Level', 'Target_Level',
-                                                    'PNL_Current', 'Quantity', 'Transaction_Cost'])
-    trade_log_df.insert(0, 'Seq', range(1, len(trade_log_df) + 1))
-    trade_log_df['Cumulative_PNL'] = trade_log_df['PNL_Current'].cumsum()
-    trade_log_df['Cumulative_Cost'] = trade_log_df['Transaction_Cost'].cumsum()
-    trade_log_df['Net_PNL'] = trade_log_df['Cumulative_PNL'] - \
-        trade_log_df['Cumulative_Cost']
+    equity_curve = None
+    if not summary_only:
+        equity_index = np.arange(0, last_bar + 1, equity_every)
+        if last_bar >= 0 and (len(equity_index) == 0 or equity_index[-1] != last_bar):
+            equity_index = np.r_[equity_index, last_bar]
+        equity_curve = pd.DataFrame({'Date': dates[equity_index], 'Price': close[equity_index],
+                                     'Equity': equity[equity_index], 'Drawdown': drawdown[equity_index]})
+
+    return {
+        'total_current_pnl': total_pnl,
+        'mtm_value': mtm_value,
+        'total_mtm': total_mtm,
+        'total_cost': total_cost,
+        'roi': roi,
+        'open_trades': book.open_position_count(),
+        'stop_loss_triggered': stop_loss_triggered,
+        'stop_loss_trigger_date': stop_loss_trigger_date,
+        'stop_loss_trigger_price': stop_loss_trigger_price,
+        'trade_log_df': build_trade_log_df(trade_log) if isinstance(trade_log, list) else None,
+        'trade_log_path': trade_log_path,
+        'total_trades': len(trade_log),
+        'equity_curve': equity_curve,
+        'max_drawdown': max_drawdown,
+        'max_drawdown_pct': max_drawdown_pct * 100,
+        'max_exposure': max_exposure,
+        'max_margin_usage': max_exposure / buying_power * 100 if buying_power else 0.0,
+        'liquidated': liquidation_bar is not None,
+        'liquidation_date': pd.Timestamp(dates[liquidation_bar]) if liquidation_bar is not None else None,
+        'liquidation_price': close[liquidation_bar] if liquidation_bar is not None else None,
+        'fill_ratio': (book.filled_quantity / book.requested_quantity if volume_fraction is not None
+                       and book.requested_quantity else 1.0),
+        'partial_fills': book.partial_fills if volume_fraction is not None else 0,
+        'total_funding': total_funding,
+    }
+
+
+def grid_bot_strategy(df, start_date, end_date, initial_price, lower_limit, upper_limit,
+                      grid_levels, initial_capital, leverage, lower_stop_loss, upper_stop_loss,
+                      stop_loss_enabled, grid_type='arithmetic'):
+    results = grid_bot_backtest(df, start_date, end_date, initial_price, lower_limit, upper_limit,
+                                grid_levels, initial_capital, leverage, lower_stop_loss, upper_stop_loss,
+                                stop_loss_enabled, grid_type)
+    return results['trade_log_df'], results['total_current_pnl'], results['mtm_value'], results['total_mtm'], \
+        results['total_cost'], results['roi'], results['open_trades'], results['stop_loss_triggered'], \
+        results['stop_loss_trigger_date'], results['stop_loss_trigger_price']
+
+
+def stop_loss_bars(close, lower_stop_losses, upper_stop_losses):
+    # First bar at/below each lower or at/above each upper stop-loss (len(close) if never), for
+    # all pairs at once: the running min only falls and the running max only rises, so each
+    # first crossing is a binary search
+    close = np.asarray(close, dtype=float)
+    if len(close) == 0:
+        return np.zeros(len(lower_stop_losses), dtype=np.int64)
+    running_min = np.minimum.accumulate(close)
+    running_max = np.maximum.accumulate(close)
+    lower_bars = np.searchsorted(-running_min, -np.asarray(lower_stop_losses, dtype=float), side='left')
+    upper_bars = np.searchsorted(running_max, np.asarray(upper_stop_losses, dtype=float), side='left')
+    return np.minimum(lower_bars, upper_bars)
+
+
+def stop_loss_sweep(df, start_date, end_date, initial_price, lower_limit, upper_limit, grid_levels,
+                    initial_capital, leverage, stop_losses, grid_type='arithmetic', maintenance_margin=0.005,
+                    fee_tiers=None, funding_rates=None):
+    # Summary results (as grid_bot_backtest with summary_only) for every (lower_stop_loss,
+    # upper_stop_loss) pair in stop_losses, from one run of the grid. A stopped run is the
+    # unstopped run cut at its first bar beyond a stop-loss, so the grid runs once up to the
+    # latest such bar and each pair is settled on the shared book as the run reaches its stop
+    # bar, before that bar's own trades. Per-bar metrics come from running maxima of the
+    # shared equity curve plus the stop bar, marked at the stopped pair's positions.
+    series = PreparedSeries.from_frame(df).slice(start_date, end_date)
+    close = series.close
+    dates = series.times
+    n_bars = len(close)
+    stop_losses = [(float(lower), float(upper)) for lower, upper in stop_losses]
+    stop_bars = stop_loss_bars(close, [lower for lower, _ in stop_losses], [upper for _, upper in stop_losses])
+    limit = int(stop_bars.max()) if len(stop_bars) else 0
+
+    trade_log = TradeCounter()
+    book = GridPositionBook(initial_price, lower_limit, upper_limit, grid_levels,
+                            initial_capital, leverage, trade_log, grid_type, fee_tiers)
+
+    settled = [None] * len(stop_losses)
+    order = np.argsort(stop_bars, kind='stable').tolist()
+    pending = 0
+
+    def settle(upto):
+        # Pairs stopping at or before bar upto see the book as it is now
+        nonlocal pending
+        while pending < len(order) and stop_bars[order[pending]] <= upto:
+            p = order[pending]
+            stop_bar = int(stop_bars[p])
+            if stop_bar < n_bars:
+                mtm_price = close[stop_bar]
+            elif n_bars:
+                mtm_price = close[-1]
+            else:
+                mtm_price = initial_price
+            settled[p] = {
+                'totals': (book.total_pnl, book.total_cost, book.long_quantity, book.long_entry,
+                           book.short_quantity, book.short_entry),
+                'mtm_value': book.mtm_value(mtm_price),
+                'open_trades': book.open_position_count(),
+                'total_trades': len(trade_log),
+            }
+            pending += 1
+
+    segment_bars = [0]
+    segment_totals = [(book.total_pnl, book.total_cost, book.long_quantity, book.long_entry,
+                       book.short_quantity, book.short_entry)]
+    range_index = series.range_index()
+    i = range_index.first_outside(0, *book.band())
+    while i < limit:
+        settle(i)
+        open_buys, open_sells = book.target_counts(float(close[i]))
+        book.rebalance(pd.Timestamp(dates[i]), float(close[i]), open_buys, open_sells)
+        segment_bars.append(i)
+        segment_totals.append((book.total_pnl, book.total_cost, book.long_quantity, book.long_entry,
+                               book.short_quantity, book.short_entry))
+        i = range_index.first_outside(i + 1, *book.band())
+    settle(n_bars)
+
+    # The shared equity curve over bars before the latest stop, and its running maxima
+    marked = close[:limit]
+    segment = np.searchsorted(segment_bars, np.arange(limit), side='right') - 1
+    pnl, cost, long_quantity, long_entry, short_quantity, short_entry = (
+        np.array(totals, dtype=float)[segment] for totals in zip(*segment_totals))
+    equity = initial_capital + pnl - cost + (marked * (long_quantity - short_quantity) - long_entry + short_entry)
+    exposure = marked * (long_quantity + short_quantity)
+    funding = np.zeros(limit)
+    funding_times = np.array([], dtype='datetime64[ns]')
+    if funding_rates is not None and n_bars:
+        lo = np.searchsorted(funding_rates.times, dates[0], side='left')
+        hi = np.searchsorted(funding_rates.times, dates[min(limit, n_bars - 1)], side='right')
+        funding_times = funding_rates.times[lo:hi]
+        funding_rates_used = funding_rates.rates[lo:hi]
+        funding_bars = np.searchsorted(dates, funding_times, side='right') - 1
+        shared = funding_bars < limit
+        net_quantity = long_quantity - short_quantity
+        payments = funding_rates_used[shared] * net_quantity[funding_bars[shared]] * close[funding_bars[shared]]
+        paid = np.r_[0.0, np.cumsum(payments)]
+        if limit:
+            funding = paid[np.searchsorted(funding_times[shared], dates[:limit], side='right')]
+            equity = equity - funding
+    peak = np.maximum.accumulate(np.r_[initial_capital, equity])
+    drawdown = peak[1:] - equity
+    max_drawdown = np.maximum.accumulate(np.r_[-np.inf, drawdown])
+    positive = peak[1:] > 0
+    ratio = np.full(limit, -np.inf)
+    ratio[positive] = drawdown[positive] / peak[1:][positive]
+    max_ratio = np.maximum.accumulate(np.r_[-np.inf, ratio])
+    max_exposure = np.maximum.accumulate(np.r_[-np.inf, exposure])
+    liquidated = np.flatnonzero(equity <= maintenance_margin * exposure)
+    first_liquidation = int(liquidated[0]) if len(liquidated) else None
+
+    buying_power = initial_capital * leverage
+    results = []
+    for p, stop_bar in enumerate(stop_bars.tolist()):
+        state = settled[p]
+        total_pnl, total_cost, long_q, long_e, short_q, short_e = state['totals']
+        bar_peak, bar_drawdown, bar_ratio, bar_exposure = peak[stop_bar], max_drawdown[stop_bar], \
+            max_ratio[stop_bar], max_exposure[stop_bar]
+        liquidation_bar = first_liquidation if first_liquidation is not None and first_liquidation < stop_bar \
+            else None
+        total_funding = funding[stop_bar - 1] if stop_bar else 0.0
+        stop_loss_triggered = stop_bar < n_bars
+        if stop_loss_triggered:
+            # The stop bar itself, marked with the positions held going into it
+            price = close[stop_bar]
+            stop_equity = initial_capital + float(total_pnl) - float(total_cost) + (
+                price * (float(long_q) - float(short_q)) - float(long_e) + float(short_e))
+            stop_exposure = price * (float(long_q) + float(short_q))
+            if funding_rates is not None:
+                funding_paid = float(paid[np.searchsorted(funding_times[shared], dates[stop_bar], side='left')])
+                for rate in funding_rates_used[funding_times == dates[stop_bar]].tolist():
+                    funding_paid += rate * (float(long_q) - float(short_q)) * price
+                total_funding = funding_paid
+                stop_equity = stop_equity - funding_paid
+            bar_peak = max(bar_peak, stop_equity)
+            bar_drawdown = max(bar_drawdown, bar_peak - stop_equity)
+            if bar_peak > 0:
+                bar_ratio = max(bar_ratio, (bar_peak - stop_equity) / bar_peak)
+            bar_exposure = max(bar_exposure, stop_exposure)
+            if liquidation_bar is None and stop_equity <= maintenance_margin * stop_exposure:
+                liquidation_bar = stop_bar
+        marked_bars = stop_bar + 1 if stop_loss_triggered else stop_bar
+        total_mtm = total_pnl + state['mtm_value'] - total_cost - total_funding
+        results.append({
+            'total_current_pnl': total_pnl,
+            'mtm_value': state['mtm_value'],
+            'total_mtm': total_mtm,
+            'total_cost': total_cost,
+            'roi': total_mtm / initial_capital * 100,
+            'open_trades': state['open_trades'],
+            'stop_loss_triggered': stop_loss_triggered,
+            'stop_loss_trigger_date': pd.Timestamp(dates[stop_bar]) if stop_loss_triggered else None,
+            'stop_loss_trigger_price': close[stop_bar] if stop_loss_triggered else None,
+            'trade_log_df': None,
+            'trade_log_path': None,
+            'total_trades': state['total_trades'],
+            'equity_curve': None,
+            'max_drawdown': max(0.0, bar_drawdown) if marked_bars else 0.0,
+            'max_drawdown_pct': max(0.0, bar_ratio) * 100 if np.isfinite(bar_ratio) else 0.0,
+            'max_exposure': max(0.0, bar_exposure) if marked_bars else 0.0,
+            'max_margin_usage': max(0.0, bar_exposure) / buying_power * 100 if buying_power and marked_bars else 0.0,
+            'liquidated': liquidation_bar is not None,
+            'liquidation_date': pd.Timestamp(dates[liquidation_bar]) if liquidation_bar is not None else None,
+            'liquidation_price': close[liquidation_bar] if liquidation_bar is not None else None,
+            'fill_ratio': 1.0,
+            'partial_fills': 0,
+            'total_funding': total_funding,
+            'lower_stop_loss': stop_losses[p][0],
+            'upper_stop_loss': stop_losses[p][1],
+        })
+    return results
+
+
+def generate_price_paths(close, n_paths, n_bars, method='bootstrap', block_size=24, chunk_bars=256,
+                         seed=None):
+    # Yields (n_paths, chunk) blocks of synthetic closes starting from close[0], so a whole
+    # batch of paths never has to sit in memory at once
+    close = np.asarray(close, dtype=float)
+    log_returns = np.diff(np.log(close))
+    log_returns = log_returns[np.isfinite(log_returns)]
+    if len(log_returns) < 2:
+        raise ValueError("Need at least three candles to generate synthetic paths.")
+    if method not in ('bootstrap', 'gbm'):
+        raise ValueError(f"Unknown path generation method: {method}")
+
+    rng = np.random.default_rng(seed)
+    block_size = max(1, min(int(block_size), len(log_returns)))
+    mu = log_returns.mean()
+    sigma = log_returns.std()
+
+    last_price = np.full(n_paths, close[0])
+    # Block bootstrap state carried across chunks: current block start and offset inside it
+    block_start = rng.integers(0, len(log_returns) - block_size + 1, n_paths)
+    block_offset = np.zeros(n_paths, dtype=np.int64)
+
+    done = 0
+    while done < n_bars:
+        size = min(chunk_bars, n_bars - done)
+        if method == 'gbm':
+            returns = rng.normal(mu, sigma, (n_paths, size))
+        else:
+            position = block_offset[:, None] + np.arange(size)
+            n_blocks = int(position[:, -1].max()) // block_size + 1
+            starts = rng.integers(0, len(log_returns) - block_size + 1, (n_paths, n_blocks))
+            starts[:, 0] = block_start
+            block_index = position // block_size
+            returns = log_returns[np.take_along_axis(starts, block_index, axis=1)
+                                  + position % block_size]
+            block_index = (block_offset + size) // block_size
+            block_start = np.where(block_index < n_blocks,
+                                   starts[np.arange(n_paths), np.minimum(block_index, n_blocks - 1)],
+                                   rng.integers(0, len(log_returns) - block_size + 1, n_paths))
+            block_offset = (block_offset + size) % block_size
+
+        prices = last_price[:, None] * np.exp(np.cumsum(returns, axis=1))
+        last_price = prices[:, -1].copy()
+        done += size
+        yield prices
+
+
+def simulate_grid_batch(price_chunks, initial_price, lower_limit, upper_limit, grid_levels,
+                        initial_capital, leverage, lower_stop_loss, upper_stop_loss, stop_loss_enabled,
+                        grid_type='arithmetic'):
+    # Runs the grid_bot_strategy rules over many price paths at once. Open positions always form a
+    # contiguous run of levels from the initial price outwards, so each path only needs an open-level
+    # count per side plus the quantity held at each level. Like the other engines, bars whose price
+    # is outside [lower_limit, upper_limit] are skipped: they neither trade nor trigger a stop-loss.
+    levels = GridLevels(initial_price, lower_limit, upper_limit, grid_levels, grid_type)
+    buy_levels = levels.buy_levels
+    sell_levels = levels.sell_levels
+    level_index = np.arange(grid_levels)
+
+    n_paths = None
+    for prices in price_chunks:
+        prices = np.atleast_2d(np.asarray(prices, dtype=float))
+        if n_paths is None:
+            n_paths = prices.shape[0]
+            open_buys = np.zeros(n_paths, dtype=np.int64)
+            open_sells = np.zeros(n_paths, dtype=np.int64)
+            buy_quantity = np.zeros((n_paths, grid_levels))
+            sell_quantity = np.zeros((n_paths, grid_levels))
+            total_pnl = np.zeros(n_paths)
+            total_cost = np.zeros(n_paths)
+            working_capital = np.full(n_paths, float(initial_capital * leverage))
+            trades = np.zeros(n_paths, dtype=np.int64)
+            max_open = np.zeros(n_paths, dtype=np.int64)
+            stopped = np.zeros(n_paths, dtype=bool)
+            stop_price = np.full(n_paths, np.nan)
+            last_price = np.full(n_paths, float(initial_price))
+
+        n_chunk = prices.shape[1]
+        if n_chunk == 0:
+            continue
+
+        # How many levels each bar opens (price at or through the level) and lets stay open
+        # (closing target not reached), computed for the whole chunk in one pass
+        buy_open, buy_keep, sell_open, sell_keep = levels.counts(prices)
+        inside = (prices >= lower_limit) & (prices <= upper_limit)
+
+        stop_bar = np.full(n_paths, n_chunk)
+        if stop_loss_enabled:
+            hit = ((prices >= upper_stop_loss) | (prices <= lower_stop_loss)) & inside
+            newly_hit = hit.any(axis=1) & ~stopped
+            first_hit = hit.argmax(axis=1)
+            stop_bar[newly_hit] = first_hit[newly_hit]
+            stop_price[newly_hit] = prices[newly_hit, first_hit[newly_hit]]
+        stop_bar[stopped] = 0
+
+        for t in range(n_chunk):
+            live = (stop_bar > t) & inside[:, t]
+            price = prices[:, t]
+            new_buys = np.where(live, np.maximum(np.minimum(open_buys, buy_keep[:, t]), buy_open[:, t]),
+                                open_buys)
+            new_sells = np.where(live, np.maximum(np.minimum(open_sells, sell_keep[:, t]), sell_open[:, t]),
+                                 open_sells)
+            changed = np.flatnonzero((new_buys != open_buys) | (new_sells != open_sells))
+            if len(changed):
+                p = price[changed][:, None]
+                old_b, new_b = open_buys[changed][:, None], new_buys[changed][:, None]
+                old_s, new_s = open_sells[changed][:, None], new_sells[changed][:, None]
+                qb = buy_quantity[changed]
+                qs = sell_quantity[changed]
+
+                # Closing trades first, their PNL feeds the capital used by this bar's openings
+                close_b = (level_index >= new_b) & (level_index < old_b)
+                close_s = (level_index >= new_s) & (level_index < old_s)
+                closed_qb = np.where(close_b, qb, 0.0)
+                closed_qs = np.where(close_s, qs, 0.0)
+                pnl = ((p - buy_levels) * closed_qb).sum(axis=1) + ((sell_levels - p) * closed_qs).sum(axis=1)
+                cost = TRANSACTION_FEE_RATE * p[:, 0] * (closed_qb.sum(axis=1) + closed_qs.sum(axis=1))
+                total_pnl[changed] += pnl
+                working_capital[changed] += pnl
+
+                quantity = working_capital[changed] / p[:, 0] / (grid_levels / 2)
+                open_b = (level_index >= old_b) & (level_index < new_b)
+                open_s = (level_index >= old_s) & (level_index < new_s)
+                n_opened = open_b.sum(axis=1) + open_s.sum(axis=1)
+                cost += TRANSACTION_FEE_RATE * p[:, 0] * quantity * n_opened
+                rounded = np.round(quantity, 8)[:, None]
+                buy_quantity[changed] = np.where(open_b, rounded, qb)
+                sell_quantity[changed] = np.where(open_s, rounded, qs)
+                total_cost[changed] += cost
+                trades[changed] += close_b.sum(axis=1) + close_s.sum(axis=1) + n_opened
+
+                open_buys[changed] = new_buys[changed]
+                open_sells[changed] = new_sells[changed]
+                np.maximum(max_open, open_buys + open_sells, out=max_open)
+
+        # Last bar each path traded on in this chunk: inside the limits and before its stop
+        traded = inside & (np.arange(n_chunk) < stop_bar[:, None])
+        last_bar = np.where(traded, np.arange(n_chunk), -1).max(axis=1)
+        last_price = np.where(last_bar >= 0, prices[np.arange(n_paths), np.maximum(last_bar, 0)], last_price)
+        stopped |= stop_bar < n_chunk
+
+    if n_paths is None:
+        raise ValueError("No price data supplied to the batch simulation.")
+
+    # Stopped paths are marked at the stop-loss price, the rest at their last close
+    mtm_price = np.where(stopped, stop_price, last_price)[:, None]
+    held_b = level_index < open_buys[:, None]
+    held_s = level_index < open_sells[:, None]
+    mtm_value = ((mtm_price - buy_levels) * np.where(held_b, buy_quantity, 0.0)).sum(axis=1) + \
+        ((sell_levels - mtm_price) * np.where(held_s, sell_quantity, 0.0)).sum(axis=1)
+    total_mtm = total_pnl + mtm_value - total_cost
 
-    return trade_log_df, total_pnl, mtm_value, total_mtm, total_cost, roi, len(open_positions), \
-        stop_loss_triggered, stop_loss_trigger_date, stop_loss_trigger_price
+    return pd.DataFrame({
+        'total_current_pnl': total_pnl,
+        'mtm_value': mtm_value,
+        'total_mtm': total_mtm,
+        'total_cost': total_cost,
+        'roi': total_mtm / initial_capital * 100,
+        'total_trades': trades,
+        'open_trades': open_buys + open_sells,
+        'max_open_positions': max_open,
+        'stop_loss_triggered': stopped,
+        'stop_loss_trigger_price': stop_price,
+    })
+
+
+def monte_carlo_grid_strategy(df, n_paths, initial_price, lower_limit, upper_limit, grid_levels,
+                              initial_capital, leverage, lower_stop_loss, upper_stop_loss, stop_loss_enabled,
+                              grid_type='arithmetic', n_bars=None, method='bootstrap', block_size=24,
+                              chunk_bars=256, seed=None):
+    close = PreparedSeries.from_frame(df).close
+    if n_bars is None:
+        n_bars = len(close)
+
+    paths_df = simulate_grid_batch(
+        generate_price_paths(close, n_paths, n_bars, method=method, block_size=block_size,
+                             chunk_bars=chunk_bars, seed=seed),
+        initial_price, lower_limit, upper_limit, grid_levels, initial_capital, leverage,
+        lower_stop_loss, upper_stop_loss, stop_loss_enabled, grid_type)
+
+    percentiles = [5, 25, 50, 75, 95]
+    summary = {'n_paths': n_paths, 'n_bars': n_bars, 'method': method,
+               'stop_loss_hit_rate': paths_df['stop_loss_triggered'].mean()}
+    for column in ['total_mtm', 'roi', 'max_open_positions']:
+        values = paths_df[column].to_numpy(dtype=float)
+        summary[column] = {'mean': values.mean(), 'std': values.std(),
+                           **{f'p{q}': v for q, v in zip(percentiles, np.percentile(values, percentiles))}}
+    return summary, paths_df
 
 
 class GridBotGUI:
@@ -136,6 +1286,8 @@ class GridBotGUI:
         self.root.title("Grid Bot Strategy")
         self.root.geometry("1200x800")
         self.root.configure(bg='#2c3e50')
+        self.results_store = ResultsStore()
+        self.candle_store = CandleStore()
 
         title_font = ("Arial", 14, "bold")
         label_font = ("Arial", 12)
@@ -311,6 +1463,46 @@ class GridBotGUI:
         self.leverage.insert(0, '10')
         self.leverage.grid(row=14, column=1, padx=5, pady=5)
 
+        # Monte Carlo Paths
+        tk.Label(self.params_frame, text="MC Paths:", font=label_font, fg="#ecf0f1",
+                 bg="#34495e").grid(row=15, column=0, sticky='e', padx=5, pady=5)
+        self.mc_paths = tk.Entry(
+            self.params_frame, bg=entry_bg, fg=entry_fg, width=entry_width)
+        self.mc_paths.insert(0, '1000')
+        self.mc_paths.grid(row=15, column=1, padx=5, pady=5)
+
+        # Grid Type
+        tk.Label(self.params_frame, text="Grid Type:", font=label_font, fg="#ecf0f1",
+                 bg="#34495e").grid(row=16, column=0, sticky='e', padx=5, pady=5)
+        self.grid_type = tk.StringVar(value="arithmetic")
+        tk.Radiobutton(self.params_frame, text="Arithmetic", variable=self.grid_type, value="arithmetic",
+                       bg="#34495e", fg="#ecf0f1", command=self.update_grid_levels).grid(row=16, column=1, padx=5, pady=5)
+        tk.Radiobutton(self.params_frame, text="Geometric", variable=self.grid_type, value="geometric",
+                       bg="#34495e", fg="#ecf0f1", command=self.update_grid_levels).grid(row=16, column=2, padx=5, pady=5)
+
+        # Volume cap per bar, blank for unlimited fills
+        tk.Label(self.params_frame, text="Max Fill % of Volume:", font=label_font, fg="#ecf0f1",
+                 bg="#34495e").grid(row=17, column=0, sticky='e', padx=5, pady=5)
+        self.volume_percentage = tk.Entry(
+            self.params_frame, bg=entry_bg, fg=entry_fg, width=entry_width)
+        self.volume_percentage.grid(row=17, column=1, padx=5, pady=5)
+
+        # Live preview: re-run the summary in the background whenever a parameter changes
+        tk.Label(self.params_frame, text="Live Preview:", font=label_font, fg="#ecf0f1",
+                 bg="#34495e").grid(row=18, column=0, sticky='e', padx=5, pady=5)
+        self.live_preview = tk.BooleanVar(value=False)
+        self.live_preview_checkbox = tk.Checkbutton(
+            self.params_frame, variable=self.live_preview, bg="#34495e", command=self.schedule_preview)
+        self.live_preview_checkbox.grid(row=18, column=1, padx=5, pady=5)
+
+        # Optimize also over upper limits around the entered one (off: grid levels only)
+        tk.Label(self.params_frame, text="Sweep Upper Limit:", font=label_font, fg="#ecf0f1",
+                 bg="#34495e").grid(row=19, column=0, sticky='e', padx=5, pady=5)
+        self.sweep_upper_limit = tk.BooleanVar(value=False)
+        self.sweep_upper_limit_checkbox = tk.Checkbutton(
+            self.params_frame, variable=self.sweep_upper_limit, bg="#34495e")
+        self.sweep_upper_limit_checkbox.grid(row=19, column=1, padx=5, pady=5)
+
         # Status Label
         self.status_label = tk.Label(
             root, text="", font=label_font, fg="#ecf0f1", bg="#2c3e50")
@@ -330,6 +1522,10 @@ class GridBotGUI:
             "Arial", 12, "bold"), bd=2, relief='raised', padx=10, pady=5)
         self.optimize_button.pack(side=tk.TOP, pady=20)
 
+        self.monte_carlo_button = tk.Button(root, text="Monte Carlo", command=self.run_monte_carlo, bg="#8e44ad", fg="#ecf0f1", font=(
+            "Arial", 12, "bold"), bd=2, relief='raised', padx=10, pady=5)
+        self.monte_carlo_button.pack(side=tk.TOP, pady=20)
+
         # Summary Labels
         self.summary_label = tk.Label(self.summary_frame, text="Summary", font=(
             "Arial", 16, "bold"), fg="#ecf0f1", bg="#2c3e50")
@@ -400,6 +1596,27 @@ class GridBotGUI:
         self.stop_loss_trigger_price_label.grid(
             row=10, column=1, sticky='w', padx=5, pady=5)
 
+        tk.Label(self.summary_frame, text="Max Drawdown:", font=label_font,
+                 fg="#ecf0f1", bg="#2c3e50").grid(row=11, column=0, sticky='e', padx=5, pady=5)
+        self.max_drawdown_label = tk.Label(
+            self.summary_frame, text="", font=self.summary_font, fg="#ecf0f1", bg="#2c3e50")
+        self.max_drawdown_label.grid(
+            row=11, column=1, sticky='w', padx=5, pady=5)
+
+        tk.Label(self.summary_frame, text="Liquidated:", font=label_font,
+                 fg="#ecf0f1", bg="#2c3e50").grid(row=12, column=0, sticky='e', padx=5, pady=5)
+        self.liquidation_label = tk.Label(
+            self.summary_frame, text="No", font=self.summary_font, fg="#ecf0f1", bg="#2c3e50")
+        self.liquidation_label.grid(
+            row=12, column=1, sticky='w', padx=5, pady=5)
+
+        tk.Label(self.summary_frame, text="Fill Ratio:", font=label_font,
+                 fg="#ecf0f1", bg="#2c3e50").grid(row=13, column=0, sticky='e', padx=5, pady=5)
+        self.fill_ratio_label = tk.Label(
+            self.summary_frame, text="", font=self.summary_font, fg="#ecf0f1", bg="#2c3e50")
+        self.fill_ratio_label.grid(
+            row=13, column=1, sticky='w', padx=5, pady=5)
+
         # Optimized Summary Labels
         self.optimized_summary_label = tk.Label(self.optimized_summary_frame, text="Optimized Summary", font=(
             "Arial", 16, "bold"), fg="#ecf0f1", bg="#34495e")
@@ -413,75 +1630,82 @@ class GridBotGUI:
         self.optimized_grid_levels_label.grid(
             row=1, column=1, sticky='w', padx=5, pady=5)
 
-        tk.Label(self.optimized_summary_frame, text="Total Current PNL:", font=label_font,
+        tk.Label(self.optimized_summary_frame, text="Best Upper Limit:", font=label_font,
                  fg="#ecf0f1", bg="#34495e").grid(row=2, column=0, sticky='e', padx=5, pady=5)
+        self.optimized_upper_limit_label = tk.Label(
+            self.optimized_summary_frame, text="", font=self.summary_font, fg="#ecf0f1", bg="#34495e")
+        self.optimized_upper_limit_label.grid(
+            row=2, column=1, sticky='w', padx=5, pady=5)
+
+        tk.Label(self.optimized_summary_frame, text="Total Current PNL:", font=label_font,
+                 fg="#ecf0f1", bg="#34495e").grid(row=3, column=0, sticky='e', padx=5, pady=5)
         self.optimized_total_pnl_label = tk.Label(
             self.optimized_summary_frame, text="", font=self.summary_font, fg="#ecf0f1", bg="#34495e")
         self.optimized_total_pnl_label.grid(
-            row=2, column=1, sticky='w', padx=5, pady=5)
+            row=3, column=1, sticky='w', padx=5, pady=5)
 
         tk.Label(self.optimized_summary_frame, text="MTM Value of Open Positions:", font=label_font,
-                 fg="#ecf0f1", bg="#34495e").grid(row=3, column=0, sticky='e', padx=5, pady=5)
+                 fg="#ecf0f1", bg="#34495e").grid(row=4, column=0, sticky='e', padx=5, pady=5)
         self.optimized_mtm_value_label = tk.Label(
             self.optimized_summary_frame, text="", font=self.summary_font, fg="#ecf0f1", bg="#34495e")
         self.optimized_mtm_value_label.grid(
-            row=3, column=1, sticky='w', padx=5, pady=5)
+            row=4, column=1, sticky='w', padx=5, pady=5)
 
         tk.Label(self.optimized_summary_frame, text="Number of Total Trades:", font=label_font,
-                 fg="#ecf0f1", bg="#34495e").grid(row=4, column=0, sticky='e', padx=5, pady=5)
+                 fg="#ecf0f1", bg="#34495e").grid(row=5, column=0, sticky='e', padx=5, pady=5)
         self.optimized_total_trades_label = tk.Label(
             self.optimized_summary_frame, text="", font=self.summary_font, fg="#ecf0f1", bg="#34495e")
         self.optimized_total_trades_label.grid(
-            row=4, column=1, sticky='w', padx=5, pady=5)
+            row=5, column=1, sticky='w', padx=5, pady=5)
 
         tk.Label(self.optimized_summary_frame, text="Open Trades:", font=label_font,
-                 fg="#ecf0f1", bg="#34495e").grid(row=5, column=0, sticky='e', padx=5, pady=5)
+                 fg="#ecf0f1", bg="#34495e").grid(row=6, column=0, sticky='e', padx=5, pady=5)
         self.optimized_open_trades_label = tk.Label(
             self.optimized_summary_frame, text="", font=self.summary_font, fg="#ecf0f1", bg="#34495e")
         self.optimized_open_trades_label.grid(
-            row=5, column=1, sticky='w', padx=5, pady=5)
+            row=6, column=1, sticky='w', padx=5, pady=5)
 
         tk.Label(self.optimized_summary_frame, text="Total Transaction Costs:", font=label_font,
-                 fg="#ecf0f1", bg="#34495e").grid(row=6, column=0, sticky='e', padx=5, pady=5)
+                 fg="#ecf0f1", bg="#34495e").grid(row=7, column=0, sticky='e', padx=5, pady=5)
         self.optimized_total_cost_label = tk.Label(
             self.optimized_summary_frame, text="", font=self.summary_font, fg="#ecf0f1", bg="#34495e")
         self.optimized_total_cost_label.grid(
-            row=6, column=1, sticky='w', padx=5, pady=5)
+            row=7, column=1, sticky='w', padx=5, pady=5)
 
         tk.Label(self.optimized_summary_frame, text="Net PNL After Costs:", font=label_font,
-                 fg="#ecf0f1", bg="#34495e").grid(row=7, column=0, sticky='e', padx=5, pady=5)
+                 fg="#ecf0f1", bg="#34495e").grid(row=8, column=0, sticky='e', padx=5, pady=5)
         self.optimized_net_pnl_label = tk.Label(
             self.optimized_summary_frame, text="", font=self.summary_font, fg="#ecf0f1", bg="#34495e")
         self.optimized_net_pnl_label.grid(
-            row=7, column=1, sticky='w', padx=5, pady=5)
+            row=8, column=1, sticky='w', padx=5, pady=5)
 
         tk.Label(self.optimized_summary_frame, text="ROI:", font=label_font,
-                 fg="#ecf0f1", bg="#34495e").grid(row=8, column=0, sticky='e', padx=5, pady=5)
+                 fg="#ecf0f1", bg="#34495e").grid(row=9, column=0, sticky='e', padx=5, pady=5)
         self.optimized_roi_label = tk.Label(
             self.optimized_summary_frame, text="", font=self.summary_font, fg="#ecf0f1", bg="#34495e")
         self.optimized_roi_label.grid(
-            row=8, column=1, sticky='w', padx=5, pady=5)
+            row=9, column=1, sticky='w', padx=5, pady=5)
 
         tk.Label(self.optimized_summary_frame, text="Stop Loss Triggered:", font=label_font,
-                 fg="#ecf0f1", bg="#34495e").grid(row=9, column=0, sticky='e', padx=5, pady=5)
+                 fg="#ecf0f1", bg="#34495e").grid(row=10, column=0, sticky='e', padx=5, pady=5)
         self.optimized_stop_loss_triggered_label = tk.Label(
             self.optimized_summary_frame, text="No", font=self.summary_font, fg="#ecf0f1", bg="#34495e")
         self.optimized_stop_loss_triggered_label.grid(
-            row=9, column=1, sticky='w', padx=5, pady=5)
+            row=10, column=1, sticky='w', padx=5, pady=5)
 
         tk.Label(self.optimized_summary_frame, text="SL Trigger Date:", font=label_font,
-                 fg="#ecf0f1", bg="#34495e").grid(row=10, column=0, sticky='e', padx=5, pady=5)
+                 fg="#ecf0f1", bg="#34495e").grid(row=11, column=0, sticky='e', padx=5, pady=5)
         self.optimized_stop_loss_trigger_date_label = tk.Label(
             self.optimized_summary_frame, text="", font=self.summary_font, fg="#ecf0f1", bg="#34495e")
         self.optimized_stop_loss_trigger_date_label.grid(
-            row=10, column=1, sticky='w', padx=5, pady=5)
+            row=11, column=1, sticky='w', padx=5, pady=5)
 
         tk.Label(self.optimized_summary_frame, text="SL Trigger Price:", font=label_font,
-                 fg="#ecf0f1", bg="#34495e").grid(row=11, column=0, sticky='e', padx=5, pady=5)
+                 fg="#ecf0f1", bg="#34495e").grid(row=12, column=0, sticky='e', padx=5, pady=5)
         self.optimized_stop_loss_trigger_price_label = tk.Label(
             self.optimized_summary_frame, text="", font=self.summary_font, fg="#ecf0f1", bg="#34495e")
         self.optimized_stop_loss_trigger_price_label.grid(
-            row=11, column=1, sticky='w', padx=5, pady=5)
+            row=12, column=1, sticky='w', padx=5, pady=5)
 
         # Add a Notebook widget to create tabs for trade logs
         self.notebook = ttk.Notebook(root)
@@ -499,6 +1723,10 @@ class GridBotGUI:
         self.notebook.add(self.optimized_log_frame,
                           text="Optimized Trade Logs")
 
+        # Sweep landscape: ROI of every optimizer candidate, click a cell to load it
+        self.heatmap = SweepHeatmap(self.notebook, on_select=self.load_configuration, bg='#34495e')
+        self.notebook.add(self.heatmap, text="Sweep Heatmap")
+
         # Default Trade Log Frame (ttk.Treeview)
         columns = ['Seq', 'Date', 'Price', 'B/S', 'Entry_Level', 'Target_Level',
                    'PNL_Current', 'Quantity', 'Transaction_Cost', 'Net_PNL']
@@ -535,19 +1763,32 @@ class GridBotGUI:
             yscrollcommand=self.scrollbar_optimized.set)
         self.scrollbar_optimized.pack(side=tk.RIGHT, fill=tk.Y)
 
+        # Every parameter edit (re)schedules the live preview
+        self.preview_after_id = None
+        self.preview_poll_id = None
+        self.preview_cancel = None
+        self.preview_generation = 0
+        self.preview_results = queue.Queue()
+        for entry in [self.initial_price_absolute, self.lower_limit_absolute, self.lower_limit_percentage,
+                      self.upper_limit_absolute, self.upper_limit_percentage, self.lower_stop_loss_absolute,
+                      self.lower_stop_loss_percentage, self.upper_stop_loss_absolute,
+                      self.upper_stop_loss_percentage, self.grid_levels_absolute, self.grid_levels_percentage,
+                      self.initial_capital, self.leverage, self.volume_percentage]:
+            entry.bind("<KeyRelease>", self.schedule_preview, add='+')
+        for variable in [self.initial_price_mode, self.lower_limit_mode, self.upper_limit_mode,
+                         self.lower_stop_loss_mode, self.upper_stop_loss_mode, self.stop_loss_enabled,
+                         self.grid_levels_mode, self.grid_type]:
+            variable.trace_add('write', lambda *args: self.schedule_preview())
+        for date_entry in [self.start_date, self.end_date]:
+            date_entry.bind("<<DateEntrySelected>>", self.schedule_preview, add='+')
+
     def update_initial_price(self, event=None):
+        # First Close of the same candles a run uses, so the price matches the series it starts;
+        # the range fetched here stays in the candle store for the run
         try:
-            exchange_name = self.exchange_entry.get()
-            symbol = self.symbol_entry.get()
-            timeframe = self.timeframe_entry.get()
-            start_date = self.start_date.get()
-            exchange_class = getattr(ccxt, exchange_name)()
-            start_timestamp = int(pd.to_datetime(
-                start_date).timestamp() * 1000)
-            ohlcv = exchange_class.fetch_ohlcv(
-                symbol, timeframe, since=start_timestamp, limit=1)
-            if ohlcv:
-                initial_price = ohlcv[0][4]  # Close price
+            df = self.fetch_data()
+            if len(df):
+                initial_price = float(df['Close'].iloc[0])
                 self.initial_price_absolute.delete(0, tk.END)
                 self.initial_price_absolute.insert(0, f"{initial_price:.2f}")
                 self.status_label.config(
@@ -625,19 +1866,27 @@ class GridBotGUI:
         try:
             initial_price = float(self.initial_price_absolute.get())
 
+            lower_limit = float(self.lower_limit_absolute.get())
+            upper_limit = float(self.upper_limit_absolute.get())
+
+            # A geometric grid's percentage is the step ratio between neighbouring levels
             if self.grid_levels_mode.get() == "absolute":
                 grid_levels = int(self.grid_levels_absolute.get())
-                grid_range = (float(self.upper_limit_absolute.get()) -
-                              float(self.lower_limit_absolute.get())) / grid_levels
-                percentage = grid_range / initial_price * 100
+                if self.grid_type.get() == "geometric":
+                    percentage = ((upper_limit / lower_limit) ** (1 / grid_levels) - 1) * 100
+                else:
+                    grid_range = (upper_limit - lower_limit) / grid_levels
+                    percentage = grid_range / initial_price * 100
                 self.grid_levels_percentage.delete(0, tk.END)
                 self.grid_levels_percentage.insert(0, f"{percentage:.2f}%")
             else:
                 percentage = float(
                     self.grid_levels_percentage.get().strip('%'))
-                grid_range = initial_price * (percentage / 100)
-                grid_levels = int((float(self.upper_limit_absolute.get(
-                )) - float(self.lower_limit_absolute.get())) / grid_range)
+                if self.grid_type.get() == "geometric":
+                    grid_levels = int(np.log(upper_limit / lower_limit) / np.log(1 + percentage / 100))
+                else:
+                    grid_range = initial_price * (percentage / 100)
+                    grid_levels = int((upper_limit - lower_limit) / grid_range)
                 self.grid_levels_absolute.delete(0, tk.END)
                 self.grid_levels_absolute.insert(0, f"{grid_levels}")
 
@@ -645,6 +1894,8 @@ class GridBotGUI:
             pass
 
     def fetch_data(self):
+        # 1m candles are fetched once per range and kept in the candle store; every other
+        # timeframe is resampled from them locally, so switching timeframe needs no network
         exchange_name = self.exchange_entry.get()
         symbol = self.symbol_entry.get()
         timeframe = self.timeframe_entry.get()
@@ -652,13 +1903,22 @@ class GridBotGUI:
         end_date = self.end_date.get()
         start_timestamp = int(pd.to_datetime(start_date).timestamp() * 1000)
         end_timestamp = int(pd.to_datetime(end_date).timestamp() * 1000)
+        # Exchanges ccxt does not know, like 'local' for ingested archives, come from the store only
+        if hasattr(ccxt, exchange_name):
+            self.candle_store.ensure_range(
+                exchange_name, symbol, start_timestamp, end_timestamp,
+                lambda since, until: self.fetch_ohlcv(exchange_name, symbol, since, until))
+        return self.candle_store.candles(exchange_name, symbol, timeframe, start_date, end_date)
+
+    def fetch_ohlcv(self, exchange_name, symbol, since, until):
+        # Pages base-timeframe candles from the exchange; also returns how far the fetch got so a
+        # failed request is not recorded as fetched
         exchange_class = getattr(ccxt, exchange_name)()
-        since = start_timestamp
         all_ohlcv = []
-        while since < end_timestamp:
+        while since < until:
             try:
                 ohlcv = exchange_class.fetch_ohlcv(
-                    symbol, timeframe, since=since, limit=1000)
+                    symbol, self.candle_store.base_timeframe, since=since, limit=1000)
                 if not ohlcv:
                     break
                 last_timestamp = ohlcv[-1][0]
@@ -667,127 +1927,136 @@ class GridBotGUI:
                 since = last_timestamp + 1
                 all_ohlcv.extend(ohlcv)
             except Exception as e:
-                break  # Handle exceptions
-        df = pd.DataFrame(all_ohlcv, columns=[
-                          'Open time', 'Open', 'High', 'Low', 'Close', 'Volume'])
-        df['Open time'] = pd.to_datetime(df['Open time'], unit='ms')
-        df = df[(df['Open time'] >= pd.to_datetime(start_date))
-                & (df['Open time'] <= pd.to_datetime(end_date))]
-        return df
+                return all_ohlcv, since
+        return all_ohlcv, until
+
+    def load_data(self):
+        # Fetch once and keep a prepared copy that every run and optimizer candidate shares
+        self.df = self.fetch_data()
+        self.series = PreparedSeries.from_frame(self.df)
+
+    def persist_run(self, series, params, results, elapsed, kind='run', sweep_id=None, trade_log_df=None):
+        self.results_store.add_run(
+            params, results,
+            exchange=self.exchange_entry.get(),
+            symbol=self.symbol_entry.get(),
+            timeframe=self.timeframe_entry.get(),
+            start_date=self.start_date.get(),
+            end_date=self.end_date.get(),
+            data_fingerprint=series.fingerprint(),
+            elapsed=elapsed,
+            kind=kind,
+            sweep_id=sweep_id,
+            trade_log_df=trade_log_df
+        )
+
+    def read_parameters(self):
+        # Determine initial price
+        if self.initial_price_mode.get() == "absolute":
+            initial_price = float(self.initial_price_absolute.get())
+        else:
+            df_on_start_date = self.df[self.df['Open time'].dt.date == pd.to_datetime(
+                self.start_date.get()).date()]
+            if df_on_start_date.empty:
+                raise ValueError(f"No data available for the selected start date: {
+                                 self.start_date.get()}")
+            initial_price = df_on_start_date['Close'].iloc[0]
+
+        # Determine lower limit
+        if self.lower_limit_mode.get() == "absolute":
+            lower_limit = float(self.lower_limit_absolute.get())
+        else:
+            lower_limit = initial_price * \
+                (1 - float(self.lower_limit_percentage.get().strip('%')) / 100)
+
+        # Determine upper limit
+        if self.upper_limit_mode.get() == "absolute":
+            upper_limit = float(self.upper_limit_absolute.get())
+        else:
+            upper_limit = initial_price * \
+                (1 + float(self.upper_limit_percentage.get().strip('%')) / 100)
+
+        # Determine lower stop loss
+        if self.lower_stop_loss_mode.get() == "absolute":
+            lower_stop_loss = float(self.lower_stop_loss_absolute.get())
+        else:
+            lower_stop_loss = initial_price * \
+                (1 - float(self.lower_stop_loss_percentage.get().strip('%')) / 100)
+
+        # Determine upper stop loss
+        if self.upper_stop_loss_mode.get() == "absolute":
+            upper_stop_loss = float(self.upper_stop_loss_absolute.get())
+        else:
+            upper_stop_loss = initial_price * \
+                (1 + float(self.upper_stop_loss_percentage.get().strip('%')) / 100)
+
+        # Determine grid levels
+        grid_type = self.grid_type.get()
+        if self.grid_levels_mode.get() == "absolute":
+            grid_levels = int(self.grid_levels_absolute.get())
+        elif grid_type == "geometric":
+            grid_levels = round(np.log(upper_limit / lower_limit) / np.log(
+                1 + float(self.grid_levels_percentage.get().strip('%')) / 100))
+        else:
+            grid_levels = round((upper_limit - lower_limit) / (
+                initial_price * float(self.grid_levels_percentage.get().strip('%')) / 100))
+
+        return {
+            'initial_price': initial_price,
+            'lower_limit': lower_limit,
+            'upper_limit': upper_limit,
+            'grid_levels': grid_levels,
+            'initial_capital': float(self.initial_capital.get()),
+            'leverage': float(self.leverage.get()),
+            'lower_stop_loss': lower_stop_loss,
+            'upper_stop_loss': upper_stop_loss,
+            'stop_loss_enabled': self.stop_loss_enabled.get(),
+            'grid_type': grid_type,
+            'volume_fraction': self.read_volume_fraction()
+        }
+
+    def read_volume_fraction(self):
+        # Blank means fills are not limited by volume
+        percentage = self.volume_percentage.get().strip().strip('%')
+        if not percentage:
+            return None
+        return float(percentage) / 100
 
     def run_strategy(self):
+        self.cancel_preview()
         self.status_label.config(text="Running Strategy...", fg="#f39c12")
         self.progress_bar.start()
         try:
-            self.df = self.fetch_data()  # Store data in self.df for later use
-
-            # Determine initial price
-            if self.initial_price_mode.get() == "absolute":
-                initial_price = float(self.initial_price_absolute.get())
-            else:
-                df_on_start_date = self.df[self.df['Open time'].dt.date == pd.to_datetime(
-                    self.start_date.get()).date()]
-                if df_on_start_date.empty:
-                    raise ValueError(f"No data available for the selected start date: {
-                                     self.start_date.get()}")
-                initial_price = df_on_start_date['Close'].iloc[0]
-
-            # Determine lower limit
-            if self.lower_limit_mode.get() == "absolute":
-                lower_limit = float(self.lower_limit_absolute.get())
-            else:
-                lower_limit = initial_price * \
-                    (1 - float(self.lower_limit_percentage.get().strip('%')) / 100)
-
-            # Determine upper limit
-            if self.upper_limit_mode.get() == "absolute":
-                upper_limit = float(self.upper_limit_absolute.get())
-            else:
-                upper_limit = initial_price * \
-                    (1 + float(self.upper_limit_percentage.get().strip('%')) / 100)
-
-            # Determine lower stop loss
-            if self.lower_stop_loss_mode.get() == "absolute":
-                lower_stop_loss = float(self.lower_stop_loss_absolute.get())
-            else:
-                lower_stop_loss = initial_price * \
-                    (1 - float(self.lower_stop_loss_percentage.get().strip('%')) / 100)
-
-            # Determine upper stop loss
-            if self.upper_stop_loss_mode.get() == "absolute":
-                upper_stop_loss = float(self.upper_stop_loss_absolute.get())
-            else:
-                upper_stop_loss = initial_price * \
-                    (1 + float(self.upper_stop_loss_percentage.get().strip('%')) / 100)
-
-            # Determine grid levels
-            if self.grid_levels_mode.get() == "absolute":
-                grid_levels = int(self.grid_levels_absolute.get())
-            else:
-                grid_levels = round((upper_limit - lower_limit) / (
-                    initial_price * float(self.grid_levels_percentage.get().strip('%')) / 100))
+            self.load_data()  # Store data in self.df/self.series for later use
+            params = self.read_parameters()
+            lower_limit = params['lower_limit']
+            upper_limit = params['upper_limit']
 
             # Filter the data and run the strategy
-            df = self.df[(self.df['Open time'] >= pd.to_datetime(self.start_date.get())) & (
-                self.df['Open time'] <= pd.to_datetime(self.end_date.get()))]
-            df = df[(df['Close'] >= lower_limit) &
-                    (df['Close'] <= upper_limit)]
+            series = self.series.slice(self.start_date.get(), self.end_date.get()).between_prices(
+                lower_limit, upper_limit)
 
-            if df.empty:
+            if series.empty:
                 raise ValueError(
                     "No data available for the given parameters after filtering. Adjust your limits or date range.")
 
-            # Run the strategy
-            self.trade_log_df_default, total_current_pnl, mtm_value, total_mtm, total_cost, roi, open_trades, \
-                stop_loss_triggered, stop_loss_trigger_date, stop_loss_trigger_price = grid_bot_strategy(
-                    df,
-                    start_date=self.start_date.get(),
-                    end_date=self.end_date.get(),
-                    initial_price=initial_price,
-                    lower_limit=lower_limit,
-                    upper_limit=upper_limit,
-                    grid_levels=grid_levels,
-                    initial_capital=float(self.initial_capital.get()),
-                    leverage=float(self.leverage.get()),
-                    lower_stop_loss=lower_stop_loss,
-                    upper_stop_loss=upper_stop_loss,
-                    stop_loss_enabled=self.stop_loss_enabled.get()
-                )
-
-            # Store default results for comparison
-            self.default_results = {
-                'total_current_pnl': total_current_pnl,
-                'mtm_value': mtm_value,
-                'total_mtm': total_mtm,
-                'total_cost': total_cost,
-                'roi': roi,
-                'open_trades': open_trades,
-                'stop_loss_triggered': stop_loss_triggered,
-                'stop_loss_trigger_date': stop_loss_trigger_date,
-                'stop_loss_trigger_price': stop_loss_trigger_price,
-                'trade_log_df': self.trade_log_df_default
-            }
+            # Run the strategy and store default results for comparison
+            started = time.perf_counter()
+            self.default_results = grid_bot_backtest(
+                series,
+                start_date=self.start_date.get(),
+                end_date=self.end_date.get(),
+                **params
+            )
+            results = self.default_results
+            self.trade_log_df_default = results['trade_log_df']
+            self.persist_run(series, params, results, time.perf_counter() - started,
+                             trade_log_df=self.trade_log_df_default)
+            self.results_store.flush()
 
             # Update the summary
-            self.total_pnl_label.config(text=f"{total_current_pnl:.3f}")
-            self.mtm_value_label.config(text=f"{mtm_value:.3f}")
-            self.total_trades_label.config(
-                text=f"{len(self.trade_log_df_default)}")
-            self.open_trades_label.config(text=f"{open_trades}")
-            self.total_cost_label.config(text=f"{total_cost:.3f}")
-            self.net_pnl_label.config(text=f"{total_mtm:.3f}")
-            self.roi_label.config(text=f"{roi:.2f}%")
-
-            if stop_loss_triggered:
-                self.stop_loss_triggered_label.config(text="Yes", fg="#e74c3c")
-                self.stop_loss_trigger_date_label.config(
-                    text=stop_loss_trigger_date)
-                self.stop_loss_trigger_price_label.config(
-                    text=f"{stop_loss_trigger_price:.2f}")
-            else:
-                self.stop_loss_triggered_label.config(text="No", fg="#2ecc71")
-                self.stop_loss_trigger_date_label.config(text="")
-                self.stop_loss_trigger_price_label.config(text="")
+            self.summary_label.config(text="Summary")
+            self.show_summary(results)
 
             # Clear the Treeview before inserting new logs
             for item in self.trade_log_tree_default.get_children():
@@ -806,14 +2075,145 @@ class GridBotGUI:
         finally:
             self.progress_bar.stop()
 
+    def show_summary(self, results):
+        self.total_pnl_label.config(text=f"{results['total_current_pnl']:.3f}")
+        self.mtm_value_label.config(text=f"{results['mtm_value']:.3f}")
+        self.total_trades_label.config(
+            text=f"{results['total_trades']}")
+        self.open_trades_label.config(text=f"{results['open_trades']}")
+        self.total_cost_label.config(text=f"{results['total_cost']:.3f}")
+        self.net_pnl_label.config(text=f"{results['total_mtm']:.3f}")
+        self.roi_label.config(text=f"{results['roi']:.2f}%")
+        self.max_drawdown_label.config(
+            text=f"{results['max_drawdown']:.3f} ({results['max_drawdown_pct']:.2f}%)")
+
+        if results['stop_loss_triggered']:
+            self.stop_loss_triggered_label.config(text="Yes", fg="#e74c3c")
+            self.stop_loss_trigger_date_label.config(
+                text=results['stop_loss_trigger_date'])
+            self.stop_loss_trigger_price_label.config(
+                text=f"{results['stop_loss_trigger_price']:.2f}")
+        else:
+            self.stop_loss_triggered_label.config(text="No", fg="#2ecc71")
+            self.stop_loss_trigger_date_label.config(text="")
+            self.stop_loss_trigger_price_label.config(text="")
+
+        if results['liquidated']:
+            self.liquidation_label.config(
+                text=f"{results['liquidation_date']} @ {results['liquidation_price']:.2f}", fg="#e74c3c")
+        else:
+            self.liquidation_label.config(text="No", fg="#2ecc71")
+        self.fill_ratio_label.config(
+            text=f"{results['fill_ratio'] * 100:.2f}% ({results['partial_fills']} partial)")
+
+    def cancel_preview(self):
+        # Drops a scheduled preview and stops the one running, whose result is now stale
+        if self.preview_after_id is not None:
+            self.root.after_cancel(self.preview_after_id)
+            self.preview_after_id = None
+        if self.preview_cancel is not None:
+            self.preview_cancel.set()
+            self.preview_cancel = None
+
+    def schedule_preview(self, event=None):
+        # Debounced: the preview starts PREVIEW_DELAY_MS after the last edit
+        self.cancel_preview()
+        if self.live_preview.get():
+            self.preview_after_id = self.root.after(PREVIEW_DELAY_MS, self.start_preview)
+
+    def start_preview(self):
+        # Runs against the data loaded by the last Run; nothing is fetched or stored
+        self.preview_after_id = None
+        if not hasattr(self, 'series'):
+            self.status_label.config(text="Run the strategy once to load data for the preview", fg="#f39c12")
+            return
+        try:
+            params = self.read_parameters()
+            series = self.series.slice(self.start_date.get(), self.end_date.get()).between_prices(
+                params['lower_limit'], params['upper_limit'])
+        except (ValueError, ZeroDivisionError, OverflowError):
+            return  # A field is mid-edit; the next keystroke schedules another preview
+        if series.empty:
+            self.status_label.config(text="Preview: no data between the limits", fg="#e74c3c")
+            return
+
+        self.preview_generation += 1
+        self.preview_cancel = threading.Event()
+        threading.Thread(target=self.preview_worker, daemon=True,
+                         args=(self.preview_generation, series, params, self.preview_cancel)).start()
+        if self.preview_poll_id is None:
+            self.preview_poll_id = self.root.after(PREVIEW_POLL_MS, self.poll_preview)
+
+    def preview_worker(self, generation, series, params, cancel):
+        # Background thread: every started preview posts exactly one message, even when cancelled
+        started = time.perf_counter()
+        try:
+            results = grid_bot_backtest(series, None, None, summary_only=True, cancel=cancel, **params)
+        except BacktestCancelled:
+            results = None
+        except Exception as e:
+            # Mid-edit values (zero levels or capital) fail in many ways; report them all
+            results = e
+        self.preview_results.put((generation, results, time.perf_counter() - started))
+
+    def poll_preview(self):
+        # Tk widgets are only touched here, on the Tk thread; results of superseded runs are dropped
+        self.preview_poll_id = None
+        finished = 0
+        while True:
+            try:
+                generation, results, elapsed = self.preview_results.get_nowait()
+            except queue.Empty:
+                break
+            finished = max(finished, generation)
+            if generation != self.preview_generation or results is None:
+                continue
+            if isinstance(results, Exception):
+                self.summary_label.config(text="Summary (Preview out of date)")
+                self.status_label.config(text=f"Preview: {str(results) or type(results).__name__}", fg="#e74c3c")
+                continue
+            self.summary_label.config(text="Summary (Preview)")
+            self.show_summary(results)
+            self.status_label.config(text=f"Preview updated in {elapsed * 1000:.0f} ms", fg="#2ecc71")
+        if finished < self.preview_generation or not self.preview_results.empty():
+            self.preview_poll_id = self.root.after(PREVIEW_POLL_MS, self.poll_preview)
+
+    def load_configuration(self, params):
+        # Puts a swept configuration (e.g. a clicked heatmap cell) into the parameter entries as
+        # absolute values, then refreshes the derived percentages and the preview
+        fields = {
+            'initial_price': (self.initial_price_absolute, self.initial_price_mode),
+            'lower_limit': (self.lower_limit_absolute, self.lower_limit_mode),
+            'upper_limit': (self.upper_limit_absolute, self.upper_limit_mode),
+            'lower_stop_loss': (self.lower_stop_loss_absolute, self.lower_stop_loss_mode),
+            'upper_stop_loss': (self.upper_stop_loss_absolute, self.upper_stop_loss_mode),
+            'grid_levels': (self.grid_levels_absolute, self.grid_levels_mode),
+            'initial_capital': (self.initial_capital, None),
+            'leverage': (self.leverage, None),
+        }
+        for name, value in params.items():
+            if name not in fields:
+                continue
+            entry, mode = fields[name]
+            entry.delete(0, tk.END)
+            entry.insert(0, f"{int(value)}" if name == 'grid_levels' else f"{float(value):.2f}")
+            if mode is not None:
+                mode.set("absolute")
+        self.update_limits()
+        self.update_grid_levels()
+        self.schedule_preview()
+        self.status_label.config(text="Loaded " + ", ".join(
+            f"{name} = {value}" for name, value in params.items()), fg="#2ecc71")
+
     def optimize_strategy(self):
+        self.cancel_preview()
         self.status_label.config(text="Optimizing Strategy...", fg="#f39c12")
         self.progress_bar.start()
 
         try:
             # Ensure that the default data is available
-            if not hasattr(self, 'df'):
-                self.df = self.fetch_data()
+            if not hasattr(self, 'series'):
+                self.load_data()
 
             initial_price = float(self.initial_price_absolute.get())
 
@@ -839,6 +2239,7 @@ class GridBotGUI:
 
             # Variables to store the best results
             best_grid_levels = 0
+            best_params = None
             best_pnl = -float('inf')
             best_trade_log_df = None
             best_roi = 0
@@ -850,53 +2251,89 @@ class GridBotGUI:
             best_stop_loss_trigger_date = None
             best_stop_loss_trigger_price = None
 
-            # Range of grid levels to test
-            # Grid levels from 20 to 80 in intervals of 10
-            grid_levels_list = [20, 30, 40, 50, 60, 70, 80]
+            # Range of grid levels to test, against upper limits around the entered one when asked
+            grid_levels_list = SWEEP_GRID_LEVELS
+            upper_limits = [upper_limit]
+            if self.sweep_upper_limit.get():
+                upper_limits = [round(initial_price + (upper_limit - initial_price) * scale, 2)
+                                for scale in SWEEP_UPPER_LIMIT_SCALES]
+                upper_limits[SWEEP_UPPER_LIMIT_SCALES.index(1.0)] = upper_limit
+            best_upper_limit = upper_limit
 
             # Filter the data based on the date range and price limits
-            df_filtered = self.df[(self.df['Open time'] >= pd.to_datetime(self.start_date.get())) & (
-                self.df['Open time'] <= pd.to_datetime(self.end_date.get()))]
-            df_filtered = df_filtered[(df_filtered['Close'] >= lower_limit) & (
-                df_filtered['Close'] <= upper_limit)]
+            dated = self.series.slice(self.start_date.get(), self.end_date.get())
+            series = dated.between_prices(lower_limit, upper_limit)
 
-            if df_filtered.empty:
+            if series.empty:
                 raise ValueError(
                     "No data available for the given parameters after filtering. Adjust your limits or date range.")
 
-            for grid_levels in grid_levels_list:
-                # Run strategy with current grid levels
-                trade_log_df, total_current_pnl, mtm_value, total_mtm, total_cost, roi, open_trades, \
-                    stop_loss_triggered, stop_loss_trigger_date, stop_loss_trigger_price = grid_bot_strategy(
-                        df_filtered,
+            # Each result is painted into the heatmap as it comes in
+            self.heatmap.set_axes('grid_levels', grid_levels_list, 'upper_limit', upper_limits, 'roi')
+            sweep_id = self.results_store.new_sweep_id()
+            for row, candidate_upper_limit in enumerate(upper_limits):
+                if candidate_upper_limit <= lower_limit:
+                    continue
+                candidate_series = dated.between_prices(lower_limit, candidate_upper_limit)
+                if candidate_series.empty:
+                    continue
+                for column, grid_levels in enumerate(grid_levels_list):
+                    # Run strategy with current grid levels
+                    params = {
+                        'initial_price': initial_price,
+                        'lower_limit': lower_limit,
+                        'upper_limit': candidate_upper_limit,
+                        'grid_levels': grid_levels,
+                        'initial_capital': initial_capital,
+                        'leverage': leverage,
+                        'lower_stop_loss': lower_stop_loss,
+                        'upper_stop_loss': upper_stop_loss,
+                        'stop_loss_enabled': stop_loss_enabled,
+                        'grid_type': self.grid_type.get(),
+                        'volume_fraction': self.read_volume_fraction()
+                    }
+                    # Candidates only need the summary; the winner is re-run in full below
+                    started = time.perf_counter()
+                    results = grid_bot_backtest(
+                        candidate_series,
                         start_date=self.start_date.get(),
                         end_date=self.end_date.get(),
-                        initial_price=initial_price,
-                        lower_limit=lower_limit,
-                        upper_limit=upper_limit,
-                        grid_levels=grid_levels,
-                        initial_capital=initial_capital,
-                        leverage=leverage,
-                        lower_stop_loss=lower_stop_loss,
-                        upper_stop_loss=upper_stop_loss,
-                        stop_loss_enabled=stop_loss_enabled
+                        summary_only=True,
+                        **params
                     )
-
-                pnl = total_mtm
-
-                # Check if this is the best result
-                if pnl > best_pnl:
-                    best_pnl = pnl
-                    best_grid_levels = grid_levels
-                    best_trade_log_df = trade_log_df.copy()
-                    best_roi = roi
-                    best_total_current_pnl = total_current_pnl
-                    best_mtm_value = mtm_value
-                    best_total_cost = total_cost
-                    best_open_trades = open_trades
-                    best_stop_loss_triggered = stop_loss_triggered
-                    best_stop_loss_trigger_date = stop_loss_trigger_date
-                    best_stop_loss_trigger_price = stop_loss_trigger_price
+                    self.persist_run(candidate_series, params, results, time.perf_counter() - started,
+                                     kind='sweep', sweep_id=sweep_id)
+                    self.heatmap.update_cell(row, column, results['roi'])
+                    self.root.update_idletasks()
+
+                    total_current_pnl = results['total_current_pnl']
+                    mtm_value = results['mtm_value']
+                    total_mtm = results['total_mtm']
+                    total_cost = results['total_cost']
+                    roi = results['roi']
+                    open_trades = results['open_trades']
+                    stop_loss_triggered = results['stop_loss_triggered']
+                    stop_loss_trigger_date = results['stop_loss_trigger_date']
+                    stop_loss_trigger_price = results['stop_loss_trigger_price']
+
+                    pnl = total_mtm
+
+                    # Check if this is the best result
+                    if pnl > best_pnl:
+                        best_pnl = pnl
+                        best_grid_levels = grid_levels
+                        best_upper_limit = candidate_upper_limit
+                        best_params = params
+                        best_roi = roi
+                        best_total_current_pnl = total_current_pnl
+                        best_mtm_value = mtm_value
+                        best_total_cost = total_cost
+                        best_open_trades = open_trades
+                        best_stop_loss_triggered = stop_loss_triggered
+                        best_stop_loss_trigger_date = stop_loss_trigger_date
+                        best_stop_loss_trigger_price = stop_loss_trigger_price
+
+            self.results_store.flush()
 
             # Ensure optimized result is better than or equal to default
             if not hasattr(self, 'default_results'):
@@ -908,6 +2345,7 @@ class GridBotGUI:
                 # If optimized result is worse, use default
                 best_pnl = self.default_results['total_mtm']
                 best_grid_levels = int(self.grid_levels_absolute.get())
+                best_upper_limit = upper_limit
                 best_trade_log_df = self.default_results['trade_log_df']
                 best_roi = self.default_results['roi']
                 best_total_current_pnl = self.default_results['total_current_pnl']
@@ -917,9 +2355,17 @@ class GridBotGUI:
                 best_stop_loss_triggered = self.default_results['stop_loss_triggered']
                 best_stop_loss_trigger_date = self.default_results['stop_loss_trigger_date']
                 best_stop_loss_trigger_price = self.default_results['stop_loss_trigger_price']
+            else:
+                best_trade_log_df = grid_bot_backtest(
+                    dated.between_prices(lower_limit, best_upper_limit),
+                    start_date=self.start_date.get(),
+                    end_date=self.end_date.get(),
+                    **best_params
+                )['trade_log_df']
 
             # Update the optimized summary
             self.optimized_grid_levels_label.config(text=f"{best_grid_levels}")
+            self.optimized_upper_limit_label.config(text=f"{best_upper_limit:.2f}")
             self.optimized_total_pnl_label.config(
                 text=f"{best_total_current_pnl:.3f}")
             self.optimized_mtm_value_label.config(text=f"{best_mtm_value:.3f}")
@@ -954,7 +2400,7 @@ class GridBotGUI:
                     "", "end", values=list(row))
 
             self.status_label.config(text=f"Optimization Completed. Best Grid Levels: {
-                                     best_grid_levels}", fg="#2ecc71")
+                                     best_grid_levels}, Upper Limit: {best_upper_limit:.2f}", fg="#2ecc71")
 
         except Exception as e:
             messagebox.showerror("Error", str(e))
@@ -963,6 +2409,43 @@ class GridBotGUI:
         finally:
             self.progress_bar.stop()
 
+    def run_monte_carlo(self):
+        self.status_label.config(text="Running Monte Carlo...", fg="#f39c12")
+        self.progress_bar.start()
+        try:
+            if not hasattr(self, 'series'):
+                self.load_data()
+            params = self.read_parameters()
+            n_paths = int(self.mc_paths.get())
+            # Synthetic paths carry no volume, so fills cannot be limited by it
+            volume_fraction = params.pop('volume_fraction')
+            if volume_fraction is not None and volume_fraction != 1:
+                raise ValueError("Monte Carlo paths have no volume; clear Max Fill % of Volume to run them.")
+
+            series = self.series.slice(self.start_date.get(), self.end_date.get())
+            if len(series) < 3:
+                raise ValueError(
+                    "Not enough data in the selected date range for Monte Carlo paths.")
+
+            summary, _ = monte_carlo_grid_strategy(series, n_paths, **params)
+
+            lines = [f"Paths: {summary['n_paths']} x {summary['n_bars']} bars ({summary['method']})",
+                     f"Stop-loss hit rate: {summary['stop_loss_hit_rate'] * 100:.1f}%"]
+            for key, title in [('total_mtm', 'Net PNL'), ('roi', 'ROI %'),
+                               ('max_open_positions', 'Max Open Positions')]:
+                stats = summary[key]
+                lines.append(f"{title}: mean {stats['mean']:.2f}, p5 {stats['p5']:.2f}, "
+                             f"median {stats['p50']:.2f}, p95 {stats['p95']:.2f}")
+            messagebox.showinfo("Monte Carlo Summary", "\n".join(lines))
+            self.status_label.config(text="Monte Carlo Completed", fg="#2ecc71")
+
+        except ValueError as ve:
+            messagebox.showerror("Error", str(ve))
+            self.status_label.config(
+                text="Error running Monte Carlo", fg="#e74c3c")
+        finally:
+            self.progress_bar.stop()
+
 
 if __name__ == "__main__":
     root = tk.Tk()
@@ -0,0 +1,269 @@
+import argparse
+import fnmatch
+import hashlib
+import io
+import json
+import os
+import zipfile
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from Grid_candle_store import CandleStore
+
+
+# Archives are matched by name when a directory is given
+ARCHIVE_PATTERNS = ['*.zip', '*.csv', '*.csv.gz']
+MANIFEST_NAME = 'ingested.json'
+# Gap ranges listed per symbol in the report; the minute count covers all of them
+MAX_REPORTED_GAPS = 20
+
+
+def file_checksum(path):
+    digest = hashlib.blake2b(digest_size=16)
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def discover_archives(paths, patterns=ARCHIVE_PATTERNS):
+    # Files as given, plus every matching file under given directories, in name order
+    found = []
+    for path in paths:
+        if os.path.isdir(path):
+            for directory, _, names in os.walk(path):
+                found.extend(os.path.join(directory, name) for name in names
+                             if any(fnmatch.fnmatch(name, pattern) for pattern in patterns))
+        else:
+            found.append(path)
+    return sorted(set(found))
+
+
+def _epoch_ms(values):
+    # Unix columns hold seconds in older exports and milliseconds in newer ones
+    values = np.asarray(values, dtype=np.int64)
+    if len(values) and abs(int(values[0])) < 10 ** 11:
+        return values * 1000
+    return values
+
+
+def _read_csv_text(text):
+    # CryptoDataDownload-style files (the BTC-2017min.csv layout) start with a URL line above the header
+    first_line = text[:text.find('\n')].lower()
+    skip = 0 if 'close' in first_line else 1
+    return pd.read_csv(io.StringIO(text), skiprows=skip)
+
+
+def _read_archive(path):
+    if path.endswith('.zip'):
+        with zipfile.ZipFile(path) as archive:
+            members = sorted(name for name in archive.namelist() if name.lower().endswith('.csv'))
+            return pd.concat([_read_csv_text(archive.read(name).decode()) for name in members], ignore_index=True)
+    if path.endswith('.gz'):
+        import gzip
+        with gzip.open(path, 'rt') as f:
+            return _read_csv_text(f.read())
+    with open(path) as f:
+        return _read_csv_text(f.read())
+
+
+def _candle_columns(df, path):
+    # (times in epoch ms, open, high, low, close, volume) from a file's own column names
+    columns = {column.lower().strip(): column for column in df.columns}
+    if 'unix' in columns:
+        times = _epoch_ms(df[columns['unix']].to_numpy())
+    elif 'date' in columns:
+        times = pd.to_datetime(df[columns['date']]).to_numpy(dtype='datetime64[ms]').astype(np.int64)
+    else:
+        raise ValueError(f"{path}: no 'unix' or 'date' column")
+    values = []
+    for name in ['open', 'high', 'low', 'close']:
+        if name not in columns:
+            raise ValueError(f"{path}: no '{name}' column")
+        values.append(df[columns[name]].to_numpy(dtype=float))
+    # The first volume column is in the base asset ('Volume BTC' before 'Volume USD')
+    volume = next((column for key, column in columns.items() if key.startswith('volume')), None)
+    values.append(df[volume].to_numpy(dtype=float) if volume is not None else np.zeros(len(df)))
+    return times, values
+
+
+def covered_ranges(times, base_ms=60_000):
+    # [first, last + base_ms) ms ranges of consecutive candles in sorted times; gaps stay uncovered
+    times = np.asarray(times, dtype=np.int64)
+    if not len(times):
+        return np.zeros((0, 2), dtype=np.int64)
+    breaks = np.flatnonzero(np.diff(times) > base_ms)
+    return np.column_stack([times[np.r_[0, breaks + 1]], times[np.r_[breaks, len(times) - 1]] + base_ms])
+
+
+def parse_archive(path, known_checksum=None, base_ms=60_000):
+    # Worker: reads one archive into rows sorted by time and reports what was wrong with it.
+    # Returns early, without parsing, when the file still has the checksum it was ingested with,
+    # and with an error instead of rows when the file is empty or cannot be read as candles.
+    checksum = file_checksum(path)
+    if checksum == known_checksum:
+        return {'path': path, 'checksum': checksum, 'unchanged': True}
+    try:
+        df = _read_archive(path)
+        times, values = _candle_columns(df, path)
+    except (ValueError, zipfile.BadZipFile) as e:
+        return {'path': path, 'checksum': checksum, 'unchanged': False, 'error': str(e) or type(e).__name__}
+    if not len(times):
+        return {'path': path, 'checksum': checksum, 'unchanged': False, 'error': f"{path}: no candle rows"}
+    symbols = df['symbol'].dropna().unique().tolist() if 'symbol' in df else []
+
+    # Exports run either way in time; steps against the file's main direction are out of order
+    steps = np.diff(times)
+    descending = (steps < 0).sum() > (steps > 0).sum()
+    out_of_order = int((steps > 0).sum() if descending else (steps < 0).sum())
+
+    order = np.argsort(times, kind='stable')
+    times = times[order]
+    values = [column[order] for column in values]
+    repeated = np.r_[False, times[1:] == times[:-1]]
+    stacked = np.column_stack(values)
+    conflicts = int((repeated[1:] & (stacked[1:] != stacked[:-1]).any(axis=1)).sum()) if len(times) else 0
+    # Keep the last row of a repeated timestamp, as the store does on merging
+    last = np.r_[times[1:] != times[:-1], True] if len(times) else np.array([], dtype=bool)
+    times = times[last]
+    stacked = stacked[last]
+
+    gaps = np.diff(times)
+    return {
+        'path': path,
+        'checksum': checksum,
+        'unchanged': False,
+        'error': None,
+        'symbols': symbols,
+        'rows': np.column_stack([times.astype(float), stacked]),
+        'covered': covered_ranges(times, base_ms),
+        'first': int(times[0]),
+        'last': int(times[-1]),
+        'out_of_order': out_of_order,
+        'duplicates': int(repeated.sum()),
+        'conflicting_duplicates': conflicts,
+        'misaligned': int((times % base_ms != 0).sum()),
+        'missing_minutes': int((gaps[gaps > base_ms] // base_ms - 1).sum()),
+    }
+
+
+def missing_minutes(times, base_ms=60_000, start=None, end=None):
+    # Number of absent base candles between start and end (default: first and last stored),
+    # and the (first missing, last missing) ms ranges, found with one diff over the sorted times
+    times = np.asarray(times, dtype=np.int64)
+    if start is not None:
+        times = times[times >= start]
+    if end is not None:
+        times = times[times <= end]
+    if len(times) < 2:
+        return 0, []
+    steps = np.diff(times)
+    gap = np.flatnonzero(steps > base_ms)
+    ranges = list(zip((times[gap] + base_ms).tolist(), (times[gap + 1] - base_ms).tolist()))
+    return int((steps[gap] // base_ms - 1).sum()), ranges
+
+
+def load_manifest(root):
+    path = os.path.join(root, MANIFEST_NAME)
+    if not os.path.exists(path):
+        return {}
+    with open(path) as f:
+        return json.load(f)
+
+
+def save_manifest(root, manifest):
+    path = os.path.join(root, MANIFEST_NAME)
+    temporary = f"{path}.{os.getpid()}.tmp"
+    with open(temporary, 'w') as f:
+        json.dump(manifest, f, indent=1, sort_keys=True)
+    os.replace(temporary, path)
+
+
+def ingest_archives(paths, exchange='local', symbol=None, store=None, workers=None):
+    # Parses archive files (or every archive under directories) in a process pool and merges
+    # them into the candle store, one write per symbol. Files are keyed by absolute path in the
+    # store's manifest with their checksum, so re-running skips files that have not changed.
+    # symbol overrides the files' own 'symbol' column. Empty or unreadable files are listed under
+    # 'failed' and recorded with their error, so they too are skipped until they change. Returns a
+    # report of what was ingested and of ordering, duplicate and missing-minute problems.
+    store = store or CandleStore()
+    os.makedirs(store.root, exist_ok=True)
+    manifest = load_manifest(store.root)
+    files = [os.path.abspath(path) for path in discover_archives(paths)]
+
+    with ProcessPoolExecutor(workers) as pool:
+        futures = [pool.submit(parse_archive, path, manifest.get(path, {}).get('checksum'), store.base_ms)
+                   for path in files]
+        parsed = [future.result() for future in futures]
+
+    report = {'files': [], 'skipped': [], 'failed': [], 'symbols': {}}
+    by_symbol = {}
+    for result in parsed:
+        if result['unchanged']:
+            report['skipped'].append(result['path'])
+            continue
+        if result['error'] is not None:
+            report['failed'].append({'path': result['path'], 'error': result['error']})
+            manifest[result['path']] = {'checksum': result['checksum'], 'error': result['error']}
+            continue
+        file_symbol = symbol or (result['symbols'][0] if len(result['symbols']) == 1 else None)
+        if file_symbol is None:
+            raise ValueError(f"{result['path']}: give a symbol, the file names {len(result['symbols'])} symbols")
+        by_symbol.setdefault(file_symbol, []).append(result)
+
+    for file_symbol, results in by_symbol.items():
+        rows = np.concatenate([result['rows'] for result in results])
+        times = rows[:, 0].astype(np.int64)
+        overlapping = len(times) - len(np.unique(times))
+        start, end = int(times.min()), int(times.max())
+        # Covered where the files hold candles, so gaps inside a file can still be fetched
+        covered = np.concatenate([result['covered'] for result in results])
+        base = store.extend(exchange, file_symbol, rows, covered=covered)
+        missing, gaps = missing_minutes(base['times'], store.base_ms, start, end)
+        report['symbols'][file_symbol] = {
+            'files': len(results),
+            'rows': len(rows),
+            'overlapping_rows': overlapping,
+            'stored_rows': len(base['times']),
+            'start': pd.to_datetime(start, unit='ms'),
+            'end': pd.to_datetime(end, unit='ms'),
+            'missing_minutes': missing,
+            'gaps': [(pd.to_datetime(a, unit='ms'), pd.to_datetime(b, unit='ms')) for a, b in gaps[:MAX_REPORTED_GAPS]],
+        }
+        for result in results:
+            manifest[result['path']] = {'checksum': result['checksum'], 'exchange': exchange, 'symbol': file_symbol,
+                                        'rows': len(result['rows'])}
+            report['files'].append({key: result[key] for key in
+                                    ['path', 'out_of_order', 'duplicates', 'conflicting_duplicates',
+                                     'misaligned', 'missing_minutes']})
+        # Recorded per symbol, so files merged before a later failure are not parsed again
+        save_manifest(store.root, manifest)
+    if report['failed']:
+        save_manifest(store.root, manifest)
+    return report
+
+
+if __name__ == "__main__":
+    # python Grid_candle_ingest.py ARCHIVES_DIR [MORE ...] --exchange local --symbol BTC/USD
+    parser = argparse.ArgumentParser(description="Ingest minute-candle archives into the candle store")
+    parser.add_argument('paths', nargs='+')
+    parser.add_argument('--exchange', default='local')
+    parser.add_argument('--symbol', default=None)
+    parser.add_argument('--candle-root', default='candle_store')
+    parser.add_argument('--workers', type=int, default=None)
+    args = parser.parse_args()
+    report = ingest_archives(args.paths, args.exchange, args.symbol, CandleStore(args.candle_root), args.workers)
+    print(f"Ingested {len(report['files'])} files, skipped {len(report['skipped'])} unchanged")
+    for entry in report['failed']:
+        print(f"  failed {entry['path']}: {entry['error']}")
+    for entry in report['files']:
+        problems = {key: value for key, value in entry.items() if key != 'path' and value}
+        if problems:
+            print(f"  {entry['path']}: {problems}")
+    for name, summary in report['symbols'].items():
+        print(f"{name}: {summary['stored_rows']} candles stored, {summary['start']} to {summary['end']}, "
+              f"{summary['missing_minutes']} missing minutes")
+        for first, last in summary['gaps']:
+            print(f"  missing {first} .. {last}")
@@ -0,0 +1,206 @@
+import os
+import time
+
+import numpy as np
+import pandas as pd
+
+
+OHLCV_COLUMNS = ['Open', 'High', 'Low', 'Close', 'Volume']
+TIMEFRAME_UNITS_MS = {'m': 60_000, 'h': 3_600_000, 'd': 86_400_000, 'w': 604_800_000}
+# Calendar months have no fixed length, so they are bucketed by month rather than by milliseconds
+MONTH_UNIT = 'M'
+# Epoch day 0 is a Thursday; weekly candles open on Monday like exchange weeklies
+WEEK_OFFSET_MS = 4 * 86_400_000
+
+
+def parse_timeframe(timeframe):
+    # '15m' -> (15, 'm'); units are m, h, d, w and M (calendar months)
+    number, unit = timeframe[:-1], timeframe[-1:]
+    if (unit not in TIMEFRAME_UNITS_MS and unit != MONTH_UNIT) or not number.isdigit() or int(number) <= 0:
+        raise ValueError(f"Unsupported timeframe: {timeframe}. Use a count followed by m (minutes), h (hours), "
+                         f"d (days), w (weeks) or M (calendar months), e.g. 15m, 4h, 1d, 1w, 1M.")
+    return int(number), unit
+
+
+def timeframe_to_ms(timeframe):
+    # '1m', '15m', '4h', '1d', '1w' -> milliseconds
+    number, unit = parse_timeframe(timeframe)
+    if unit == MONTH_UNIT:
+        raise ValueError(f"Timeframe {timeframe} is in calendar months, which have no fixed length in milliseconds.")
+    return number * TIMEFRAME_UNITS_MS[unit]
+
+
+def resample_ohlcv(times, opens, highs, lows, closes, volumes, timeframe_ms, months=0):
+    # Aggregates sorted candles (times in epoch ms) into timeframe_ms buckets, or into buckets of
+    # that many calendar months when months is given: first open, max high, min low, last close,
+    # summed volume
+    if len(times) == 0:
+        empty = np.array([], dtype=float)
+        return np.array([], dtype=np.int64), empty, empty, empty, empty, empty
+    if months:
+        buckets = times.astype('datetime64[ms]').astype('datetime64[M]').astype(np.int64) // months
+        bucket_starts = (buckets * months).astype('datetime64[M]').astype('datetime64[ms]').astype(np.int64)
+    else:
+        offset = WEEK_OFFSET_MS if timeframe_ms % TIMEFRAME_UNITS_MS['w'] == 0 else 0
+        buckets = (times - offset) // timeframe_ms
+        bucket_starts = buckets * timeframe_ms + offset
+    starts = np.flatnonzero(np.r_[True, buckets[1:] != buckets[:-1]])
+    ends = np.r_[starts[1:], len(times)] - 1
+    return (bucket_starts[starts],
+            opens[starts],
+            np.maximum.reduceat(highs, starts),
+            np.minimum.reduceat(lows, starts),
+            closes[ends],
+            np.add.reduceat(volumes, starts))
+
+
+def candles_to_frame(times, opens, highs, lows, closes, volumes):
+    return pd.DataFrame({'Open time': pd.to_datetime(times, unit='ms'), 'Open': opens, 'High': highs,
+                         'Low': lows, 'Close': closes, 'Volume': volumes})
+
+
+class CandleStore:
+    # Keeps the finest candles (base_timeframe, 1m by default) per exchange and symbol on disk and
+    # derives every coarser timeframe locally. Derived series are cached in memory and next to the
+    # base file, tagged with the base revision, so they are rebuilt only after the base is extended.
+    def __init__(self, root='candle_store', base_timeframe='1m'):
+        self.root = root
+        self.base_timeframe = base_timeframe
+        self.base_ms = timeframe_to_ms(base_timeframe)
+        self.base = {}
+        self.derived = {}
+
+    def _path(self, exchange, symbol, timeframe):
+        directory = os.path.join(self.root, exchange)
+        os.makedirs(directory, exist_ok=True)
+        # '1M' and '1m' would share a file on case-insensitive file systems
+        if timeframe.endswith(MONTH_UNIT):
+            timeframe = timeframe[:-1] + 'mo'
+        return os.path.join(directory, f"{symbol.replace('/', '-')}_{timeframe}.npz")
+
+    @staticmethod
+    def _save(path, arrays):
+        # Write then rename, so processes sharing the store never read a half-written file
+        temporary = f"{path}.{os.getpid()}.tmp"
+        with open(temporary, 'wb') as f:
+            np.savez(f, **arrays)
+        os.replace(temporary, path)
+
+    def load_base(self, exchange, symbol):
+        key = (exchange, symbol)
+        if key not in self.base:
+            path = self._path(exchange, symbol, self.base_timeframe)
+            if os.path.exists(path):
+                with np.load(path) as data:
+                    self.base[key] = {name: data[name] for name in data.files}
+            else:
+                self.base[key] = {'times': np.array([], dtype=np.int64),
+                                  **{column: np.array([], dtype=float) for column in OHLCV_COLUMNS},
+                                  'revision': np.array(0), 'covered': np.zeros((0, 2), dtype=np.int64)}
+            # Coverage is a list of disjoint [start, end) ranges; older files hold a single one
+            covered = self.base[key]['covered'].reshape(-1, 2)
+            self.base[key]['covered'] = covered[covered[:, 1] > covered[:, 0]]
+        return self.base[key]
+
+    @staticmethod
+    def _merge_covered(covered, added):
+        # Adds [start, end) ranges to the sorted disjoint ones, joining only ranges that overlap or touch
+        ranges = sorted(covered.tolist() + added.tolist())
+        merged = [ranges[0]]
+        for first, last in ranges[1:]:
+            if first <= merged[-1][1]:
+                merged[-1][1] = max(merged[-1][1], last)
+            else:
+                merged.append([first, last])
+        return np.array(merged, dtype=np.int64)
+
+    def extend(self, exchange, symbol, ohlcv, covered=None):
+        # Merges [timestamp, open, high, low, close, volume] rows into the base series. Newer rows
+        # win on duplicate timestamps. covered is the [start, end) ms range the rows were fetched for,
+        # or a list of such ranges.
+        base = self.load_base(exchange, symbol)
+        rows = np.asarray(ohlcv, dtype=float).reshape(-1, 6)
+        times = np.r_[base['times'], rows[:, 0].astype(np.int64)]
+        values = {column: np.r_[base[column], rows[:, i + 1]] for i, column in enumerate(OHLCV_COLUMNS)}
+
+        # Keep the last occurrence of each timestamp (the freshly fetched one), in time order
+        order = np.argsort(times[::-1], kind='stable')
+        reversed_times = times[::-1][order]
+        keep = np.r_[True, reversed_times[1:] != reversed_times[:-1]]
+        index = (len(times) - 1 - order)[keep]
+        updated = {'times': times[index], **{column: values[column][index] for column in OHLCV_COLUMNS},
+                   'revision': np.array(int(base['revision']) + 1), 'covered': base['covered'].copy()}
+        if covered is not None:
+            added = np.asarray(covered, dtype=np.int64).reshape(-1, 2)
+            added = added[added[:, 1] > added[:, 0]]
+            if len(added):
+                updated['covered'] = self._merge_covered(updated['covered'], added)
+
+        self._save(self._path(exchange, symbol, self.base_timeframe), updated)
+        self.base[(exchange, symbol)] = updated
+        return updated
+
+    def missing_ranges(self, exchange, symbol, start_ms, end_ms):
+        # Parts of [start_ms, end_ms) not fetched yet: the gaps between covered ranges
+        missing = []
+        position = start_ms
+        for start, end in self.load_base(exchange, symbol)['covered'].tolist():
+            if end <= position:
+                continue
+            if start >= end_ms:
+                break
+            if start > position:
+                missing.append((position, start))
+            position = max(position, end)
+        if position < end_ms:
+            missing.append((position, end_ms))
+        return missing
+
+    def ensure_range(self, exchange, symbol, start_ms, end_ms, fetcher):
+        # fetcher(since, until) returns (ohlcv rows at the base timeframe, ms it fetched up to); it is
+        # only called for ranges that are not stored yet. Ranges reaching past now stay open for the next call.
+        now_ms = int(time.time() * 1000)
+        for since, until in self.missing_ranges(exchange, symbol, start_ms, end_ms):
+            ohlcv, fetched_until = fetcher(since, until)
+            covered_until = min(fetched_until, until, now_ms - self.base_ms)
+            self.extend(exchange, symbol, ohlcv, covered=(since, covered_until) if covered_until > since else None)
+
+    def candles(self, exchange, symbol, timeframe, start_date=None, end_date=None):
+        # Candles at any multiple of the base timeframe or in calendar months, from the cache when the base is unchanged
+        base = self.load_base(exchange, symbol)
+        number, unit = parse_timeframe(timeframe)
+        months = number if unit == MONTH_UNIT else 0
+        timeframe_ms = None if months else timeframe_to_ms(timeframe)
+        if not months and timeframe_ms % self.base_ms:
+            raise ValueError(f"Timeframe {timeframe} is not a multiple of the stored {self.base_timeframe} candles.")
+
+        if timeframe_ms == self.base_ms:
+            series = base
+        else:
+            key = (exchange, symbol, timeframe)
+            series = self.derived.get(key)
+            if series is None or series['revision'] != base['revision']:
+                path = self._path(exchange, symbol, timeframe)
+                series = None
+                try:
+                    with np.load(path) as data:
+                        if data['revision'] == base['revision']:
+                            series = {name: data[name] for name in data.files}
+                except (OSError, ValueError, EOFError):
+                    pass  # Not derived yet, or unreadable: rebuild it
+                if series is None:
+                    resampled = resample_ohlcv(base['times'], *(base[column] for column in OHLCV_COLUMNS),
+                                               timeframe_ms, months)
+                    series = {'times': resampled[0],
+                              **{column: values for column, values in zip(OHLCV_COLUMNS, resampled[1:])},
+                              'revision': base['revision']}
+                    self._save(path, series)
+                self.derived[key] = series
+
+        times = series['times']
+        lo, hi = 0, len(times)
+        if start_date is not None:
+            lo = np.searchsorted(times, pd.to_datetime(start_date).value // 1_000_000, side='left')
+        if end_date is not None:
+            hi = np.searchsorted(times, pd.to_datetime(end_date).value // 1_000_000, side='right')
+        return candles_to_frame(times[lo:hi], *(series[column][lo:hi] for column in OHLCV_COLUMNS))
@@ -0,0 +1,132 @@
+import numpy as np
+import tkinter as tk
+
+
+# Diverging scale for signed metrics (ROI): losses red, break-even pale, gains green
+NEGATIVE_COLOR = (231, 76, 60)
+NEUTRAL_COLOR = (236, 240, 241)
+POSITIVE_COLOR = (46, 204, 113)
+# Cells not computed yet (or without a result) take the panel background
+PENDING_COLOR = (44, 62, 80)
+COLOR_STEPS = 256
+
+
+def diverging_colors(steps=COLOR_STEPS):
+    # (steps + 1, 3) uint8 lookup table: rows 0..steps-1 run red -> pale -> green, the last row
+    # is the pending color
+    t = np.linspace(-1.0, 1.0, steps)[:, None]
+    negative, neutral, positive = (np.array(color, dtype=float) for color in
+                                   [NEGATIVE_COLOR, NEUTRAL_COLOR, POSITIVE_COLOR])
+    table = np.where(t < 0, neutral + (negative - neutral) * -t, neutral + (positive - neutral) * t)
+    return np.vstack([np.round(table), PENDING_COLOR]).astype(np.uint8)
+
+
+def color_indexes(values, limit, steps=COLOR_STEPS):
+    # Row of the lookup table for every value, symmetric around zero up to +/- limit;
+    # NaN maps to the pending row
+    scaled = np.clip(values / limit if limit > 0 else np.zeros_like(values), -1.0, 1.0)
+    indexes = np.round((scaled + 1.0) * 0.5 * (steps - 1))
+    return np.where(np.isnan(values), steps, indexes).astype(np.intp)
+
+
+def pixel_cells(pixels, cells):
+    # Cell shown at every pixel along one axis when cells are stretched (or squeezed) to fit
+    return np.arange(pixels) * cells // pixels
+
+
+def ppm_image(rgb):
+    # Binary PPM (P6) bytes of an (height, width, 3) uint8 array, which Tk's photo image reads
+    # directly, so a whole frame goes to Tk in one call
+    height, width, _ = rgb.shape
+    return b'P6 %d %d 255\n' % (width, height) + np.ascontiguousarray(rgb).tobytes()
+
+
+class SweepHeatmap(tk.Frame):
+    # Sweep results (one metric over two swept parameters) drawn as one photo image, not as
+    # per-cell widgets: values live in a (rows, columns) array, every pixel knows its cell,
+    # and a redraw is one table lookup plus one image upload. Cells filled while a sweep runs
+    # are painted on their own unless they widen the color scale. Hovering shows a cell's
+    # parameters and value; clicking one passes its parameters to on_select.
+    def __init__(self, parent, width=640, height=360, on_select=None, **kwargs):
+        super().__init__(parent, **kwargs)
+        self.width = width
+        self.height = height
+        self.on_select = on_select
+        self.table = diverging_colors()
+        self.canvas = tk.Canvas(self, width=width, height=height, bg='#2c3e50', highlightthickness=0,
+                                cursor='crosshair')
+        self.canvas.pack(side=tk.TOP)
+        self.photo = tk.PhotoImage(width=width, height=height)
+        self.canvas.create_image(0, 0, image=self.photo, anchor='nw')
+        self.readout = tk.Label(self, text="", font=("Helvetica", 11), fg="#ecf0f1", bg=kwargs.get('bg', '#34495e'),
+                                anchor='w')
+        self.readout.pack(side=tk.TOP, fill=tk.X)
+        self.canvas.bind("<Motion>", self.hover)
+        self.canvas.bind("<Leave>", lambda event: self.readout.config(text=self.caption()))
+        self.canvas.bind("<Button-1>", self.click)
+        self.set_axes('x', [], 'y', [], 'value')
+
+    def set_axes(self, x_name, x_values, y_name, y_values, value_name):
+        # Starts an empty sweep: x_values across, y_values down (first row at the top)
+        self.x_name, self.y_name, self.value_name = x_name, y_name, value_name
+        self.x_values = list(x_values)
+        self.y_values = list(y_values)
+        self.values = np.full((len(self.y_values), len(self.x_values)), np.nan)
+        self.pixel_rows = pixel_cells(self.height, max(1, len(self.y_values)))
+        self.pixel_columns = pixel_cells(self.width, max(1, len(self.x_values)))
+        self.limit = 0.0
+        self.redraw()
+
+    def redraw(self):
+        finite = np.abs(self.values[np.isfinite(self.values)])
+        self.limit = float(finite.max()) if len(finite) else 0.0
+        if self.values.size == 0:
+            self.photo.blank()
+            self.readout.config(text=self.caption())
+            return
+        indexes = color_indexes(self.values, self.limit)
+        rgb = self.table[indexes[self.pixel_rows[:, None], self.pixel_columns[None, :]]]
+        self.photo.configure(data=ppm_image(rgb), format='PPM')
+        self.readout.config(text=self.caption())
+
+    def update_cell(self, row, column, value):
+        # One streamed result: repaints just the cell's pixels while the color scale holds
+        self.values[row, column] = value
+        if not np.isfinite(value) or abs(value) > self.limit:
+            self.redraw()
+            return
+        top, bottom = np.searchsorted(self.pixel_rows, [row, row + 1])
+        left, right = np.searchsorted(self.pixel_columns, [column, column + 1])
+        if top < bottom and left < right:
+            color = self.table[color_indexes(np.array([value]), self.limit)[0]]
+            self.photo.put('#%02x%02x%02x' % tuple(color), to=(int(left), int(top), int(right), int(bottom)))
+
+    def cell_at(self, x, y):
+        if self.values.size == 0 or not (0 <= x < self.width and 0 <= y < self.height):
+            return None
+        return int(self.pixel_rows[y]), int(self.pixel_columns[x])
+
+    def caption(self):
+        if not self.x_values or not self.y_values:
+            return "No sweep results yet"
+        done = int(np.isfinite(self.values).sum())
+        return (f"{self.value_name} by {self.x_name} ({self.x_values[0]} .. {self.x_values[-1]}) across and "
+                f"{self.y_name} ({self.y_values[0]} .. {self.y_values[-1]}) down, "
+                f"{done}/{self.values.size} done, scale +/-{self.limit:.2f}")
+
+    def hover(self, event):
+        cell = self.cell_at(event.x, event.y)
+        if cell is None:
+            return
+        row, column = cell
+        value = self.values[row, column]
+        shown = "pending" if np.isnan(value) else f"{value:.2f}"
+        self.readout.config(text=f"{self.x_name} = {self.x_values[column]}, {self.y_name} = "
+                                 f"{self.y_values[row]}: {self.value_name} {shown}")
+
+    def click(self, event):
+        cell = self.cell_at(event.x, event.y)
+        if cell is None or self.on_select is None:
+            return
+        row, column = cell
+        self.on_select({self.x_name: self.x_values[column], self.y_name: self.y_values[row]})
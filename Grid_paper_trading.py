@@ -0,0 +1,196 @@
+import asyncio
+import inspect
+import time
+from collections import deque
+
+import numpy as np
+import pandas as pd
+
+from Grid_bot_backtesting import GridPositionBook, PreparedSeries, build_trade_log_df
+
+
+class PaperGrid:
+    # One symbol's grid traded forward tick by tick with the backtest rules: prices outside the
+    # grid limits are ignored, a price beyond either stop-loss stops trading, and positions
+    # open/close through the same GridPositionBook (levels, targets, sizing, 0.0003 fees).
+    # Most ticks cross no level, so they are decided with two float comparisons against the
+    # book's band (next level to open or outermost open position's target on each side), which
+    # is only recomputed after orders.
+    def __init__(self, initial_price, lower_limit, upper_limit, grid_levels, initial_capital, leverage,
+                 lower_stop_loss, upper_stop_loss, stop_loss_enabled, grid_type='arithmetic'):
+        self.initial_price = initial_price
+        self.lower_limit = lower_limit
+        self.upper_limit = upper_limit
+        self.initial_capital = initial_capital
+        self.lower_stop_loss = lower_stop_loss
+        self.upper_stop_loss = upper_stop_loss
+        self.stop_loss_enabled = stop_loss_enabled
+        self.book = GridPositionBook(initial_price, lower_limit, upper_limit, grid_levels,
+                                     initial_capital, leverage, [], grid_type)
+        self.total_trades = 0
+        self.last_price = None
+        self.stop_loss_triggered = False
+        self.stop_loss_trigger_date = None
+        self.stop_loss_trigger_price = None
+        self.lower, self.upper = self.book.band()
+
+    def on_price(self, date, price):
+        # Returns the simulated orders (trade log rows) this tick produces
+        if self.stop_loss_triggered or price < self.lower_limit or price > self.upper_limit:
+            return []
+        self.last_price = price
+        if self.stop_loss_enabled and (price >= self.upper_stop_loss or price <= self.lower_stop_loss):
+            self.stop_loss_triggered = True
+            self.stop_loss_trigger_date = pd.Timestamp(date)
+            self.stop_loss_trigger_price = price
+            return []
+        if self.lower < price < self.upper:
+            return []
+        book = self.book
+        open_buys, open_sells = book.target_counts(price)
+        if open_buys == book.open_buys and open_sells == book.open_sells:
+            return []
+
+        book.rebalance(pd.Timestamp(date), price, open_buys, open_sells)
+        self.lower, self.upper = book.band()
+        orders = book.trade_log[:]
+        book.trade_log.clear()
+        self.total_trades += len(orders)
+        return orders
+
+    def summary(self):
+        book = self.book
+        mtm_price = self.last_price if self.last_price is not None else self.initial_price
+        mtm_value = book.mtm_value(mtm_price)
+        total_mtm = book.total_pnl + mtm_value - book.total_cost
+        return {
+            'total_current_pnl': book.total_pnl,
+            'mtm_value': mtm_value,
+            'total_mtm': total_mtm,
+            'total_cost': book.total_cost,
+            'roi': total_mtm / self.initial_capital * 100,
+            'open_trades': book.open_buys + book.open_sells,
+            'total_trades': self.total_trades,
+            'stop_loss_triggered': self.stop_loss_triggered,
+            'stop_loss_trigger_date': self.stop_loss_trigger_date,
+            'stop_loss_trigger_price': self.stop_loss_trigger_price,
+        }
+
+
+class ReplayFeed:
+    # Plays stored candles of one or more symbols in time order as (symbol, date, price, received_ns)
+    # ticks. speed is candle time per wall-clock time (60 plays 1m candles once a second);
+    # None replays as fast as possible, yielding to the event loop every batch_size ticks.
+    def __init__(self, candles, speed=None, price_column='Close', batch_size=1000):
+        symbols, times, prices = [], [], []
+        for symbol, df in candles.items():
+            series = PreparedSeries.from_frame(df)
+            symbols.append(np.full(len(series), len(symbols)))
+            times.append(series.times)
+            prices.append(series[price_column])
+        self.names = list(candles)
+        times = np.concatenate(times) if times else np.array([], dtype='datetime64[ns]')
+        order = np.argsort(times, kind='stable')
+        self.times = times[order]
+        self.symbols = np.concatenate(symbols)[order] if symbols else np.array([], dtype=np.int64)
+        self.prices = np.concatenate(prices)[order] if prices else np.array([], dtype=float)
+        self.speed = speed
+        self.batch_size = batch_size
+
+    def __len__(self):
+        return len(self.times)
+
+    async def __aiter__(self):
+        names = self.names
+        symbols = self.symbols.tolist()
+        prices = self.prices.tolist()
+        times = self.times
+        elapsed = (times - times[0]).astype('timedelta64[ns]').astype(np.int64) if len(times) else times
+        started = time.perf_counter_ns()
+        for i in range(len(times)):
+            if self.speed:
+                delay = (elapsed[i] / self.speed - (time.perf_counter_ns() - started)) / 1e9
+                if delay > 0:
+                    await asyncio.sleep(delay)
+            elif i % self.batch_size == 0:
+                await asyncio.sleep(0)
+            yield names[symbols[i]], times[i], prices[i], time.perf_counter_ns()
+
+
+class QueueFeed:
+    # Feed for live sources: a websocket or polling task calls push() for every tick and close()
+    # when it stops; the runner consumes them in arrival order.
+    def __init__(self, maxsize=0):
+        self.queue = asyncio.Queue(maxsize)
+
+    def push(self, symbol, date, price):
+        self.queue.put_nowait((symbol, date, price, time.perf_counter_ns()))
+
+    def close(self):
+        self.queue.put_nowait(None)
+
+    async def __aiter__(self):
+        while True:
+            tick = await self.queue.get()
+            if tick is None:
+                return
+            yield tick
+
+
+class PaperTradingRunner:
+    # Routes ticks from a feed to each symbol's PaperGrid and hands the resulting orders to
+    # on_order(symbol, orders), which may be a plain function or a coroutine. Tick-to-decision
+    # latency (feed timestamp to orders decided) is kept for the last latency_window ticks.
+    def __init__(self, grids, feed, on_order=None, latency_window=1_000_000):
+        self.grids = grids
+        self.feed = feed
+        self.on_order = on_order
+        self.latencies = deque(maxlen=latency_window)
+        self.ticks = 0
+
+    async def run(self):
+        grids = self.grids
+        latencies = self.latencies
+        async for symbol, date, price, received_ns in self.feed:
+            grid = grids.get(symbol)
+            if grid is None:
+                continue
+            orders = grid.on_price(date, price)
+            latencies.append(time.perf_counter_ns() - received_ns)
+            self.ticks += 1
+            if orders and self.on_order is not None:
+                handled = self.on_order(symbol, orders)
+                if inspect.isawaitable(handled):
+                    await handled
+        return self.summary()
+
+    def latency_summary(self):
+        # Decision latency in microseconds
+        if not self.latencies:
+            return {'ticks': self.ticks, 'latency_p50_us': None, 'latency_p99_us': None, 'latency_max_us': None}
+        latencies = np.fromiter(self.latencies, dtype=np.int64, count=len(self.latencies)) / 1000
+        p50, p99 = np.percentile(latencies, [50, 99])
+        return {'ticks': self.ticks, 'latency_p50_us': p50, 'latency_p99_us': p99,
+                'latency_max_us': latencies.max()}
+
+    def summary(self):
+        return {'symbols': {symbol: grid.summary() for symbol, grid in self.grids.items()},
+                **self.latency_summary()}
+
+
+def run_paper_trading(candles, params, speed=None, on_order=None):
+    # Replays candles ({symbol: DataFrame}) through one paper grid per symbol. params maps each
+    # symbol to the grid_bot_strategy parameters (initial_price ... stop_loss_enabled, grid_type).
+    # Returns the runner summary plus each symbol's trade log.
+    grids = {symbol: PaperGrid(**params[symbol]) for symbol in candles}
+    trade_logs = {symbol: [] for symbol in candles}
+
+    def record(symbol, orders):
+        trade_logs[symbol].extend(orders)
+        if on_order is not None:
+            return on_order(symbol, orders)
+
+    runner = PaperTradingRunner(grids, ReplayFeed(candles, speed), record)
+    summary = asyncio.run(runner.run())
+    summary['trade_logs'] = {symbol: build_trade_log_df(rows) for symbol, rows in trade_logs.items()}
+    return summary
@@ -0,0 +1,221 @@
+import heapq
+
+import numpy as np
+import pandas as pd
+
+from Grid_bot_backtesting import (TRANSACTION_FEE_RATE, GridPositionBook, PreparedSeries, TradeCounter,
+                                  build_trade_log_df)
+
+
+# Per-grid running totals kept in GridPortfolio.totals, one row per grid
+TOTAL_COLUMNS = ['pnl', 'cost', 'long_quantity', 'long_entry', 'short_quantity', 'short_entry']
+
+
+class GridPortfolio:
+    # Several grids on one symbol drawing on one margin account. Each grid keeps its own
+    # GridPositionBook (sized from its own initial_capital, like a single-grid run) and its rows
+    # of totals; the account sums them, so equity and exposure are O(1) at any price. A grid may
+    # only open levels while the account's exposure stays within equity x leverage; levels held
+    # back are retried on the next bar the grid sees.
+    def __init__(self, grids, initial_capital, leverage, trade_logs=None):
+        self.initial_capital = initial_capital
+        self.leverage = leverage
+        self.books = [GridPositionBook(grid['initial_price'], grid['lower_limit'], grid['upper_limit'],
+                                       grid['grid_levels'], grid['initial_capital'], leverage,
+                                       trade_logs[k] if trade_logs is not None else None,
+                                       grid.get('grid_type', 'arithmetic'))
+                      for k, grid in enumerate(grids)]
+        self.totals = np.zeros((len(grids), len(TOTAL_COLUMNS)))
+        self.account = np.zeros(len(TOTAL_COLUMNS))
+        self.margin_blocked = np.zeros(len(grids), dtype=np.int64)
+
+    def equity(self, price):
+        pnl, cost, long_quantity, long_entry, short_quantity, short_entry = self.account.tolist()
+        return self.initial_capital + pnl - cost + price * (long_quantity - short_quantity) - long_entry + short_entry
+
+    def exposure(self, price):
+        return price * (self.account[2] + self.account[4])
+
+    def _update(self, k, row):
+        row = np.asarray(row, dtype=float)
+        self.account += row - self.totals[k]
+        self.totals[k] = row
+
+    def _sync(self, k):
+        book = self.books[k]
+        self._update(k, (book.total_pnl, book.total_cost, book.long_quantity, book.long_entry,
+                         book.short_quantity, book.short_entry))
+
+    def rebalance(self, k, date, price):
+        # Moves grid k to the levels this price asks for: closings always go through, openings
+        # only as far as the account's margin allows
+        book = self.books[k]
+        open_buys, open_sells = book.target_counts(price)
+        keep_buys, keep_sells = min(open_buys, book.open_buys), min(open_sells, book.open_sells)
+        if keep_buys != book.open_buys or keep_sells != book.open_sells:
+            book.rebalance(date, price, keep_buys, keep_sells)
+            self._sync(k)
+
+        wanted = open_buys - book.open_buys + open_sells - book.open_sells
+        if wanted:
+            # Each opening adds price x quantity of exposure and costs its fee out of equity
+            notional = price * round(book.working_capital / price / (book.grid_levels / 2), 8)
+            headroom = self.equity(price) * self.leverage - self.exposure(price)
+            allowed = wanted
+            if notional > 0:
+                allowed = min(wanted, max(0, int(headroom // (notional * (1 + TRANSACTION_FEE_RATE * self.leverage)))))
+            if allowed < wanted:
+                self.margin_blocked[k] += 1
+            if allowed:
+                buys = min(open_buys, book.open_buys + allowed)
+                sells = min(open_sells, book.open_sells + allowed - (buys - book.open_buys))
+                book.rebalance(date, price, buys, sells)
+                self._sync(k)
+
+    def stop(self, k, price):
+        # A stopped grid is valued at its stop price from then on, like a single-grid run, and
+        # no longer uses margin
+        book = self.books[k]
+        self._update(k, (book.total_pnl + book.unrealized_pnl(price), book.total_cost, 0.0, 0.0, 0.0, 0.0))
+
+
+def grid_portfolio_backtest(df, start_date, end_date, grids, initial_capital, leverage, equity_every=1,
+                            maintenance_margin=0.005, summary_only=False):
+    # Runs K grids over one price series in a single pass. grids is a list of dicts with the
+    # grid_bot_backtest grid parameters (initial_price, lower_limit, upper_limit, grid_levels,
+    # initial_capital, lower_stop_loss, upper_stop_loss, stop_loss_enabled, grid_type); a grid's
+    # initial_capital only sizes its orders, while margin comes from the shared initial_capital x
+    # leverage account. Each grid sees only bars with Close inside its own limits and stops at
+    # its own stop-loss, exactly as a single-grid run on that grid's filtered bars would.
+    # Bars are visited only when some grid can change its held levels: every grid keeps its
+    # next change bar from the range index of its own bars, and a heap yields them in time order.
+    series = PreparedSeries.from_frame(df).slice(start_date, end_date)
+    close = series.close
+    dates = series.times
+    n_bars = len(close)
+    if not grids:
+        raise ValueError("A portfolio needs at least one grid.")
+
+    trade_logs = [TradeCounter() if summary_only else [] for _ in grids]
+    portfolio = GridPortfolio(grids, initial_capital, leverage, trade_logs)
+
+    # Each grid's own bars (Close within its limits) and where they sit in the full series
+    positions, range_indexes, stop_bars = [], [], []
+    for grid in grids:
+        own = series.between_prices(grid['lower_limit'], grid['upper_limit'])
+        positions.append(np.flatnonzero((close >= grid['lower_limit']) & (close <= grid['upper_limit'])))
+        range_indexes.append(own.range_index())
+        stop_bar = len(own)
+        if grid['stop_loss_enabled']:
+            stop_bar = own.range_index().first_outside(0, grid['lower_stop_loss'], grid['upper_stop_loss'])
+        stop_bars.append(stop_bar)
+
+    def next_event(k, start):
+        j = min(range_indexes[k].first_outside(start, *portfolio.books[k].band()), stop_bars[k])
+        if j < len(positions[k]):
+            heapq.heappush(events, (int(positions[k][j]), k, j))
+
+    events = []
+    for k in range(len(grids)):
+        next_event(k, 0)
+
+    segment_bars = [0]
+    segment_totals = [portfolio.account.tolist()]
+    held = [([0], [0.0]) for _ in grids]  # Per grid: bars where its quantity changed, and the quantity
+    while events:
+        i, k, j = heapq.heappop(events)
+        price = float(close[i])
+        if j == stop_bars[k]:
+            portfolio.stop(k, price)
+        else:
+            portfolio.rebalance(k, pd.Timestamp(dates[i]), price)
+            next_event(k, j + 1)
+        segment_bars.append(i)
+        segment_totals.append(portfolio.account.tolist())
+        held[k][0].append(i)
+        held[k][1].append(portfolio.totals[k, 2] + portfolio.totals[k, 4])
+
+    # Account equity and exposure every bar, from the totals of the segment the bar falls in
+    buying_power = initial_capital * leverage
+    segment = np.searchsorted(segment_bars, np.arange(n_bars), side='right') - 1
+    pnl, cost, long_quantity, long_entry, short_quantity, short_entry = (
+        np.array(totals, dtype=float)[segment] for totals in zip(*segment_totals))
+    equity = initial_capital + pnl - cost + (close * (long_quantity - short_quantity) - long_entry + short_entry)
+    exposure = close * (long_quantity + short_quantity)
+    peak = np.maximum.accumulate(np.r_[initial_capital, equity])[1:]
+    drawdown = peak - equity
+    max_drawdown = max(0.0, drawdown.max()) if n_bars else 0.0
+    positive = peak > 0
+    max_drawdown_pct = max(0.0, (drawdown[positive] / peak[positive]).max()) if positive.any() else 0.0
+    max_exposure = max(0.0, exposure.max()) if n_bars else 0.0
+    liquidated = equity <= maintenance_margin * exposure
+    liquidation_bar = int(liquidated.argmax()) if liquidated.any() else None
+
+    # Per-grid results as a single-grid run reports them
+    grid_results = []
+    for k, (grid, book) in enumerate(zip(grids, portfolio.books)):
+        own_close = close[positions[k]]
+        stop_loss_triggered = stop_bars[k] < len(own_close)
+        if stop_loss_triggered:
+            mtm_price = own_close[stop_bars[k]]
+        elif len(own_close):
+            mtm_price = own_close[-1]
+        else:
+            mtm_price = grid['initial_price']
+        mtm_value = book.mtm_value(mtm_price)
+        total_mtm = book.total_pnl + mtm_value - book.total_cost
+        # Quantity is constant between a grid's events, so its peak exposure in each stretch is
+        # the quantity times the highest close there
+        bars, quantities = np.array(held[k][0]), np.array(held[k][1])
+        last = np.r_[bars[1:] != bars[:-1], True]
+        bars, quantities = bars[last], quantities[last]
+        grid_max_exposure = float((np.maximum.reduceat(close, bars) * quantities).max()) if n_bars else 0.0
+        grid_results.append({
+            'total_current_pnl': book.total_pnl,
+            'mtm_value': mtm_value,
+            'total_mtm': total_mtm,
+            'total_cost': book.total_cost,
+            'roi': total_mtm / grid['initial_capital'] * 100,
+            'open_trades': book.open_position_count(),
+            'total_trades': len(trade_logs[k]),
+            'exposure': quantities[-1] * close[-1] if n_bars else 0.0,
+            'max_exposure': grid_max_exposure,
+            'margin_blocked': int(portfolio.margin_blocked[k]),
+            'stop_loss_triggered': stop_loss_triggered,
+            'stop_loss_trigger_date': pd.Timestamp(dates[positions[k][stop_bars[k]]]) if stop_loss_triggered else None,
+            'stop_loss_trigger_price': own_close[stop_bars[k]] if stop_loss_triggered else None,
+            'trade_log_df': None if summary_only else build_trade_log_df(trade_logs[k]),
+        })
+
+    equity_curve = None
+    if not summary_only and n_bars:
+        equity_index = np.arange(0, n_bars, equity_every)
+        if equity_index[-1] != n_bars - 1:
+            equity_index = np.r_[equity_index, n_bars - 1]
+        equity_curve = pd.DataFrame({'Date': dates[equity_index], 'Price': close[equity_index],
+                                     'Equity': equity[equity_index], 'Drawdown': drawdown[equity_index],
+                                     'Exposure': exposure[equity_index]})
+
+    total_pnl = sum(result['total_current_pnl'] for result in grid_results)
+    total_cost = sum(result['total_cost'] for result in grid_results)
+    mtm_value = sum(result['mtm_value'] for result in grid_results)
+    total_mtm = total_pnl + mtm_value - total_cost
+    return {
+        'total_current_pnl': total_pnl,
+        'mtm_value': mtm_value,
+        'total_mtm': total_mtm,
+        'total_cost': total_cost,
+        'roi': total_mtm / initial_capital * 100,
+        'open_trades': sum(result['open_trades'] for result in grid_results),
+        'total_trades': sum(result['total_trades'] for result in grid_results),
+        'margin_blocked': int(portfolio.margin_blocked.sum()),
+        'equity_curve': equity_curve,
+        'max_drawdown': max_drawdown,
+        'max_drawdown_pct': max_drawdown_pct * 100,
+        'max_exposure': max_exposure,
+        'max_margin_usage': max_exposure / buying_power * 100 if buying_power else 0.0,
+        'liquidated': liquidation_bar is not None,
+        'liquidation_date': pd.Timestamp(dates[liquidation_bar]) if liquidation_bar is not None else None,
+        'liquidation_price': close[liquidation_bar] if liquidation_bar is not None else None,
+        'grids': grid_results,
+    }
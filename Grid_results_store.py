@@ -0,0 +1,219 @@
+import os
+import sqlite3
+import uuid
+from datetime import datetime
+from functools import lru_cache
+
+import pandas as pd
+
+
+PARAMETER_COLUMNS = ['initial_price', 'lower_limit', 'upper_limit', 'grid_levels', 'initial_capital',
+                     'leverage', 'lower_stop_loss', 'upper_stop_loss', 'stop_loss_enabled', 'grid_type',
+                     'volume_fraction']
+METRIC_COLUMNS = ['total_current_pnl', 'mtm_value', 'total_mtm', 'total_cost', 'roi', 'open_trades',
+                  'total_trades', 'max_drawdown', 'stop_loss_triggered', 'fill_ratio']
+RUN_COLUMNS = ['run_id', 'created_at', 'kind', 'sweep_id', 'exchange', 'symbol', 'timeframe', 'start_date',
+               'end_date', 'data_fingerprint'] + PARAMETER_COLUMNS + METRIC_COLUMNS + ['elapsed', 'trade_log_path']
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS runs (
+    run_id TEXT PRIMARY KEY,
+    created_at TEXT NOT NULL,
+    kind TEXT NOT NULL,
+    sweep_id TEXT,
+    exchange TEXT,
+    symbol TEXT,
+    timeframe TEXT,
+    start_date TEXT,
+    end_date TEXT,
+    data_fingerprint TEXT,
+    initial_price REAL,
+    lower_limit REAL,
+    upper_limit REAL,
+    grid_levels INTEGER,
+    initial_capital REAL,
+    leverage REAL,
+    lower_stop_loss REAL,
+    upper_stop_loss REAL,
+    stop_loss_enabled INTEGER,
+    grid_type TEXT,
+    volume_fraction REAL,
+    total_current_pnl REAL,
+    mtm_value REAL,
+    total_mtm REAL,
+    total_cost REAL,
+    roi REAL,
+    open_trades INTEGER,
+    total_trades INTEGER,
+    max_drawdown REAL,
+    stop_loss_triggered INTEGER,
+    fill_ratio REAL,
+    elapsed REAL,
+    trade_log_path TEXT
+);
+"""
+
+INDEXES = """
+CREATE INDEX IF NOT EXISTS runs_market ON runs (symbol, timeframe, start_date, end_date);
+CREATE INDEX IF NOT EXISTS runs_market_roi ON runs (symbol, timeframe, roi);
+CREATE INDEX IF NOT EXISTS runs_market_mtm ON runs (symbol, timeframe, total_mtm);
+CREATE INDEX IF NOT EXISTS runs_parameters ON runs (symbol, timeframe, grid_levels, lower_limit, upper_limit);
+CREATE INDEX IF NOT EXISTS runs_sweep ON runs (sweep_id);
+"""
+
+
+def _scalar(value):
+    # sqlite3 only binds plain Python scalars
+    if value is None:
+        return None
+    if isinstance(value, (pd.Timestamp, datetime)):
+        return value.isoformat()
+    if hasattr(value, 'item'):
+        value = value.item()
+    if isinstance(value, bool):
+        return int(value)
+    return value
+
+
+@lru_cache(maxsize=1024)
+def _parse_date_text(value):
+    return pd.to_datetime(value).strftime('%Y-%m-%d %H:%M:%S')
+
+
+def _date_text(value):
+    # Sweeps repeat the same few dates, so parsed strings are cached
+    if value is None or value == '':
+        return None
+    if isinstance(value, str):
+        return _parse_date_text(value)
+    return pd.to_datetime(value).strftime('%Y-%m-%d %H:%M:%S')
+
+
+class ResultsStore:
+    # Local store for run and sweep results: one SQLite table of parameters and summary metrics,
+    # with each trade log in its own Parquet (or CSV when pyarrow is missing) file. Inserts are
+    # buffered and written batch_size at a time in a single transaction.
+    def __init__(self, root='grid_results', batch_size=1000):
+        self.root = root
+        self.trade_log_dir = os.path.join(root, 'trade_logs')
+        os.makedirs(self.trade_log_dir, exist_ok=True)
+        self.batch_size = batch_size
+        self.pending = []
+        self.connection = sqlite3.connect(os.path.join(root, 'results.db'))
+        self.connection.execute('PRAGMA journal_mode=WAL')
+        self.connection.execute('PRAGMA synchronous=NORMAL')
+        self.connection.executescript(SCHEMA)
+        self.connection.executescript(INDEXES)
+        try:
+            import pyarrow  # noqa: F401
+            self.trade_log_format = 'parquet'
+        except ImportError:
+            self.trade_log_format = 'csv'
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    @staticmethod
+    def new_sweep_id():
+        return uuid.uuid4().hex
+
+    def add_run(self, params, results, exchange=None, symbol=None, timeframe=None, start_date=None,
+                end_date=None, data_fingerprint=None, elapsed=None, kind='run', sweep_id=None,
+                trade_log_df=None):
+        # Queues one run; returns its run_id straight away so callers can reference it
+        run_id = uuid.uuid4().hex
+        record = {
+            'run_id': run_id,
+            'created_at': datetime.now().isoformat(timespec='seconds'),
+            'kind': kind,
+            'sweep_id': sweep_id,
+            'exchange': exchange,
+            'symbol': symbol,
+            'timeframe': timeframe,
+            'start_date': _date_text(start_date),
+            'end_date': _date_text(end_date),
+            'data_fingerprint': data_fingerprint,
+            'elapsed': elapsed,
+            'trade_log_path': None,
+        }
+        for column in PARAMETER_COLUMNS:
+            record[column] = _scalar(params.get(column))
+        for column in METRIC_COLUMNS:
+            record[column] = _scalar(results.get(column))
+        if record['total_trades'] is None and results.get('trade_log_df') is not None:
+            record['total_trades'] = len(results['trade_log_df'])
+
+        if trade_log_df is not None:
+            record['trade_log_path'] = self._write_trade_log(run_id, trade_log_df)
+
+        self.pending.append(tuple(record[column] for column in RUN_COLUMNS))
+        if len(self.pending) >= self.batch_size:
+            self.flush()
+        return run_id
+
+    def _write_trade_log(self, run_id, trade_log_df):
+        path = os.path.join(self.trade_log_dir, f"{run_id}.{self.trade_log_format}")
+        if self.trade_log_format == 'parquet':
+            trade_log_df.to_parquet(path, index=False)
+        else:
+            trade_log_df.to_csv(path, index=False)
+        return path
+
+    def flush(self):
+        if not self.pending:
+            return
+        placeholders = ', '.join('?' * len(RUN_COLUMNS))
+        with self.connection:
+            self.connection.executemany(
+                f"INSERT INTO runs ({', '.join(RUN_COLUMNS)}) VALUES ({placeholders})", self.pending)
+        self.pending = []
+
+    def close(self):
+        self.flush()
+        self.connection.close()
+
+    def query(self, symbol=None, timeframe=None, start_date=None, end_date=None, sweep_id=None,
+              order_by='roi', limit=20, **parameters):
+        # Runs whose date range lies within [start_date, end_date], best first by order_by.
+        # Extra keyword arguments filter on parameter columns, e.g. grid_levels=40.
+        if order_by not in RUN_COLUMNS:
+            raise ValueError(f"Unknown column to order by: {order_by}")
+        self.flush()
+        clauses, values = [], []
+        for column, value in [('symbol', symbol), ('timeframe', timeframe), ('sweep_id', sweep_id)]:
+            if value is not None:
+                clauses.append(f"{column} = ?")
+                values.append(value)
+        if start_date is not None:
+            clauses.append("start_date >= ?")
+            values.append(_date_text(start_date))
+        if end_date is not None:
+            clauses.append("end_date <= ?")
+            values.append(_date_text(end_date))
+        for column, value in parameters.items():
+            if column not in PARAMETER_COLUMNS:
+                raise ValueError(f"Unknown parameter column: {column}")
+            clauses.append(f"{column} = ?")
+            values.append(_scalar(value))
+
+        sql = "SELECT * FROM runs"
+        if clauses:
+            sql += " WHERE " + " AND ".join(clauses)
+        sql += f" ORDER BY {order_by} DESC"
+        if limit is not None:
+            sql += " LIMIT ?"
+            values.append(int(limit))
+        return pd.read_sql_query(sql, self.connection, params=values)
+
+    def load_trade_log(self, run_id):
+        self.flush()
+        row = self.connection.execute(
+            "SELECT trade_log_path FROM runs WHERE run_id = ?", (run_id,)).fetchone()
+        if row is None or row[0] is None:
+            return None
+        if row[0].endswith('.parquet'):
+            return pd.read_parquet(row[0])
+        return pd.read_csv(row[0], parse_dates=['Date'])
@@ -0,0 +1,304 @@
+import argparse
+import hashlib
+import json
+import multiprocessing
+import os
+import socket
+import socketserver
+import threading
+import time
+import uuid
+
+import pandas as pd
+
+from Grid_bot_backtesting import PreparedSeries, grid_bot_backtest
+from Grid_candle_store import CandleStore
+from Grid_results_store import METRIC_COLUMNS, PARAMETER_COLUMNS, _scalar
+
+
+# Every row of a sweep table names its data and grid parameters; these may be left out
+SWEEP_COLUMNS = ['symbol', 'timeframe', 'start_date', 'end_date'] + PARAMETER_COLUMNS
+OPTIONAL_COLUMNS = {'grid_type': 'arithmetic', 'volume_fraction': None}
+
+
+def send_message(host, port, message, timeout=30):
+    # One request, one reply: a JSON line each way over a short-lived connection
+    with socket.create_connection((host, port), timeout=timeout) as connection:
+        connection.sendall(json.dumps(message).encode() + b'\n')
+        reply = connection.makefile('rb').readline()
+    if not reply:
+        raise ConnectionError("Coordinator closed the connection without replying.")
+    return json.loads(reply)
+
+
+class _Handler(socketserver.StreamRequestHandler):
+    def handle(self):
+        line = self.rfile.readline()
+        if not line:
+            return
+        reply = self.server.coordinator.handle_message(json.loads(line))
+        self.wfile.write(json.dumps(reply).encode() + b'\n')
+
+
+class _Server(socketserver.ThreadingTCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+
+class SweepCoordinator:
+    # Splits a sweep table into work units of unit_size rows and leases them to workers that ask.
+    # A lease not answered within lease_timeout seconds goes back to the queue, so units held by
+    # dead or hung workers are re-issued; once the queue is empty, idle workers also get a copy of
+    # any unit leased more than straggler_after seconds ago, and the first result back wins.
+    # Finished units are appended to checkpoint_path, so a restarted sweep skips them.
+    def __init__(self, params, unit_size=50, host='127.0.0.1', port=0, checkpoint_path=None,
+                 lease_timeout=300, straggler_after=60):
+        params = params.assign(**{column: default for column, default in OPTIONAL_COLUMNS.items()
+                                  if column not in params.columns})
+        missing = [column for column in SWEEP_COLUMNS if column not in params.columns]
+        if missing:
+            raise ValueError(f"Sweep table is missing columns: {', '.join(missing)}")
+        self.params = params.reset_index(drop=True)
+        self.unit_size = unit_size
+        self.lease_timeout = lease_timeout
+        self.straggler_after = straggler_after
+        self.checkpoint_path = checkpoint_path
+        self.units = [list(range(start, min(start + unit_size, len(self.params))))
+                      for start in range(0, len(self.params), unit_size)]
+        self.pending = list(range(len(self.units)))
+        self.leases = {}
+        self.results = {}
+        self.lock = threading.Lock()
+        self.finished = threading.Event()
+
+        table = self.params[SWEEP_COLUMNS].astype(str).to_json(orient='split')
+        self.table_hash = hashlib.blake2b(f"{unit_size}:{table}".encode(), digest_size=16).hexdigest()
+        if checkpoint_path is not None:
+            self._load_checkpoint()
+        if len(self.results) == len(self.units):
+            self.finished.set()
+
+        self.server = _Server((host, port), _Handler)
+        self.server.coordinator = self
+        self.host, self.port = self.server.server_address
+
+    def _load_checkpoint(self):
+        if not os.path.exists(self.checkpoint_path):
+            with open(self.checkpoint_path, 'w') as f:
+                f.write(json.dumps({'table': self.table_hash, 'units': len(self.units)}) + '\n')
+            return
+        with open(self.checkpoint_path, 'rb+') as f:
+            header = json.loads(f.readline())
+            if header.get('table') != self.table_hash:
+                raise ValueError("Checkpoint belongs to a different sweep table or unit size.")
+            while True:
+                start = f.tell()
+                line = f.readline()
+                if not line:
+                    break
+                try:
+                    entry = json.loads(line)
+                except json.JSONDecodeError:
+                    # Last line cut off by an interrupted write: drop it, so the next result
+                    # is appended on a line of its own
+                    f.truncate(start)
+                    break
+                if not line.endswith(b'\n'):
+                    f.write(b'\n')
+                self.results[entry['unit']] = entry['results']
+        self.pending = [unit for unit in self.pending if unit not in self.results]
+
+    def _next_unit(self, now):
+        for unit, (issued, _) in list(self.leases.items()):
+            if now - issued > self.lease_timeout:
+                del self.leases[unit]
+                # A unit finished or queued again in the meantime is not queued twice
+                if unit not in self.results and unit not in self.pending:
+                    self.pending.append(unit)
+        if self.pending:
+            return self.pending.pop(0)
+        stragglers = [(issued, unit) for unit, (issued, copies) in self.leases.items()
+                      if now - issued > self.straggler_after and copies < 2]
+        if stragglers:
+            return min(stragglers)[1]
+        return None
+
+    def handle_message(self, message):
+        with self.lock:
+            if message['type'] == 'request':
+                if self.finished.is_set():
+                    return {'type': 'done'}
+                now = time.monotonic()
+                unit = self._next_unit(now)
+                if unit is None:
+                    return {'type': 'wait'}
+                issued, copies = self.leases.get(unit, (now, 0))
+                self.leases[unit] = (issued, copies + 1)
+                rows = self.params.loc[self.units[unit], SWEEP_COLUMNS]
+                return {'type': 'unit', 'unit': unit,
+                        'rows': [{k: _scalar(v) for k, v in row.items()} for row in rows.to_dict('records')]}
+
+            if message['type'] == 'result':
+                unit = message['unit']
+                if unit not in self.results:
+                    self.results[unit] = message['results']
+                    self.leases.pop(unit, None)
+                    if unit in self.pending:
+                        self.pending.remove(unit)
+                    if self.checkpoint_path is not None:
+                        with open(self.checkpoint_path, 'a') as f:
+                            f.write(json.dumps({'unit': unit, 'results': message['results']}) + '\n')
+                            f.flush()
+                            os.fsync(f.fileno())
+                    if len(self.results) == len(self.units):
+                        self.finished.set()
+                return {'type': 'ok'}
+
+        return {'type': 'error', 'message': f"Unknown message type: {message['type']}"}
+
+    def progress(self):
+        with self.lock:
+            return len(self.results), len(self.units)
+
+    def run(self, timeout=None, workers=None, linger=2.0):
+        # Serves workers until every unit has a result; returns the sweep table with metrics.
+        # Afterwards it keeps answering 'done' until the given local worker processes exit, or
+        # for linger seconds so remote workers polling after a 'wait' stop cleanly.
+        thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        thread.start()
+        deadline = None if timeout is None else time.monotonic() + timeout
+        try:
+            while not self.finished.wait(1.0):
+                if workers is not None and not any(worker.is_alive() for worker in workers):
+                    raise RuntimeError("All sweep workers exited before the sweep finished.")
+                if deadline is not None and time.monotonic() > deadline:
+                    raise TimeoutError(f"Sweep unfinished: {self.progress()[0]} of {len(self.units)} units done.")
+            if workers is not None:
+                for worker in workers:
+                    worker.join(linger)
+            else:
+                time.sleep(linger)
+        finally:
+            self.server.shutdown()
+            self.server.server_close()
+        return self.results_frame()
+
+    def results_frame(self):
+        # Failed rows have NaN metrics and their message in the error column (missing otherwise)
+        rows = [row for unit in sorted(self.results) for row in self.results[unit]]
+        metrics = pd.DataFrame(rows, columns=METRIC_COLUMNS + ['error'])
+        metrics[METRIC_COLUMNS] = metrics[METRIC_COLUMNS].apply(pd.to_numeric)
+        return pd.concat([self.params.reset_index(drop=True), metrics], axis=1)
+
+
+class SweepWorker:
+    # Pulls work units from a coordinator and runs each row with grid_bot_backtest (summary
+    # only) on candles from the local candle store, the same data preparation as the GUI.
+    # A row that fails (missing candles, bad parameters) comes back with empty metrics and its
+    # error message, so the rest of the unit and the sweep still finish.
+    def __init__(self, host, port, exchange, candle_root='candle_store', name=None, poll_interval=0.5,
+                 connect_timeout=30):
+        self.host = host
+        self.port = port
+        self.exchange = exchange
+        self.candle_store = CandleStore(candle_root)
+        self.name = name or f"{socket.gethostname()}-{os.getpid()}-{uuid.uuid4().hex[:6]}"
+        self.poll_interval = poll_interval
+        self.connect_timeout = connect_timeout
+        self.series = {}
+
+    def _send(self, message):
+        # Retries while the coordinator is unreachable, for up to connect_timeout seconds
+        deadline = time.monotonic() + self.connect_timeout
+        while True:
+            try:
+                return send_message(self.host, self.port, message)
+            except OSError:
+                if time.monotonic() > deadline:
+                    raise
+                time.sleep(self.poll_interval)
+
+    def evaluate(self, row):
+        key = (row['symbol'], row['timeframe'])
+        if key not in self.series:
+            self.series[key] = PreparedSeries.from_frame(
+                self.candle_store.candles(self.exchange, row['symbol'], row['timeframe']))
+        volume_fraction = row.get('volume_fraction')
+        if volume_fraction is not None and volume_fraction != volume_fraction:
+            volume_fraction = None  # NaN from a partly filled column
+        series = self.series[key].slice(row['start_date'], row['end_date']).between_prices(
+            row['lower_limit'], row['upper_limit'])
+        results = grid_bot_backtest(
+            series, None, None, row['initial_price'], row['lower_limit'], row['upper_limit'],
+            int(row['grid_levels']), row['initial_capital'], row['leverage'], row['lower_stop_loss'],
+            row['upper_stop_loss'], bool(row['stop_loss_enabled']), row.get('grid_type') or 'arithmetic',
+            summary_only=True, volume_fraction=volume_fraction)
+        return [_scalar(results.get(column)) for column in METRIC_COLUMNS] + [None]
+
+    def evaluate_safely(self, row):
+        try:
+            return self.evaluate(row)
+        except Exception as e:
+            return [None] * len(METRIC_COLUMNS) + [str(e) or type(e).__name__]
+
+    def run(self):
+        # Returns the number of units completed once the coordinator reports the sweep done
+        completed = 0
+        while True:
+            try:
+                reply = self._send({'type': 'request', 'worker': self.name})
+            except OSError:
+                return completed  # Coordinator gone: the sweep finished or was stopped
+            if reply['type'] == 'done':
+                return completed
+            if reply['type'] == 'wait':
+                time.sleep(self.poll_interval)
+                continue
+            results = [self.evaluate_safely(row) for row in reply['rows']]
+            self._send({'type': 'result', 'unit': reply['unit'], 'worker': self.name, 'results': results})
+            completed += 1
+
+
+def _run_worker(host, port, exchange, candle_root):
+    SweepWorker(host, port, exchange, candle_root).run()
+
+
+def run_local_sweep(params, exchange, candle_root='candle_store', n_workers=None, unit_size=50,
+                    checkpoint_path=None, results_store=None, **coordinator_options):
+    # Runs a sweep with worker processes on this machine; with a ResultsStore the rows are
+    # also saved as one sweep there
+    coordinator = SweepCoordinator(params, unit_size, checkpoint_path=checkpoint_path, **coordinator_options)
+    workers = [multiprocessing.Process(target=_run_worker,
+                                       args=(coordinator.host, coordinator.port, exchange, candle_root))
+               for _ in range(n_workers or os.cpu_count() or 1)]
+    for worker in workers:
+        worker.start()
+    try:
+        results = coordinator.run(workers=workers)
+    finally:
+        for worker in workers:
+            if worker.is_alive():
+                worker.terminate()
+
+    if results_store is not None:
+        sweep_id = results_store.new_sweep_id()
+        for row in results.to_dict('records'):
+            if pd.notna(row['error']):
+                continue  # Failed rows have no metrics to store
+            results_store.add_run(row, row, exchange=exchange, symbol=row['symbol'], timeframe=row['timeframe'],
+                                  start_date=row['start_date'], end_date=row['end_date'], kind='sweep',
+                                  sweep_id=sweep_id)
+        results_store.flush()
+    return results
+
+
+if __name__ == "__main__":
+    # Worker entry point for other hosts: python Grid_sweep_coordinator.py HOST PORT EXCHANGE
+    parser = argparse.ArgumentParser(description="Grid sweep worker")
+    parser.add_argument('host')
+    parser.add_argument('port', type=int)
+    parser.add_argument('exchange')
+    parser.add_argument('--candle-root', default='candle_store')
+    args = parser.parse_args()
+    completed = SweepWorker(args.host, args.port, args.exchange, args.candle_root).run()
+    print(f"Completed {completed} work units")
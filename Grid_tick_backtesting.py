@@ -0,0 +1,218 @@
+import time
+import zipfile
+
+import numpy as np
+import pandas as pd
+
+from Grid_bot_backtesting import GridPositionBook, RangeIndex, TradeCounter, TradeLogWriter, build_trade_log_df
+
+
+# Binance public trade dumps have no header row
+BINANCE_TRADE_COLUMNS = ['id', 'price', 'qty', 'quote_qty', 'time', 'is_buyer_maker', 'is_best_match']
+BINANCE_AGG_TRADE_COLUMNS = ['agg_trade_id', 'price', 'qty', 'first_trade_id', 'last_trade_id', 'time',
+                             'is_buyer_maker', 'is_best_match']
+TIME_COLUMNS = ['time', 'timestamp', 'transact_time', 'Time']
+PRICE_COLUMNS = ['price', 'Price']
+SIZE_COLUMNS = ['qty', 'size', 'quantity', 'amount', 'Size']
+
+
+def epoch_to_datetime64(values):
+    # Trade dumps use seconds, milliseconds or microseconds since the epoch
+    values = np.asarray(values, dtype=np.int64)
+    if len(values) == 0:
+        return values.astype('datetime64[ns]')
+    magnitude = abs(int(values[0]))
+    unit = 'us' if magnitude > 10 ** 14 else 'ms' if magnitude > 10 ** 11 else 's'
+    return values.astype(f'datetime64[{unit}]').astype('datetime64[ns]')
+
+
+def _csv_layout(path):
+    # (header, names) for pd.read_csv: files whose first field is numeric have no header row
+    first = pd.read_csv(path, nrows=1, header=None)
+    try:
+        float(first.iloc[0, 0])
+    except ValueError:
+        return 0, None
+    if first.shape[1] == len(BINANCE_TRADE_COLUMNS):
+        return None, BINANCE_TRADE_COLUMNS
+    if first.shape[1] == len(BINANCE_AGG_TRADE_COLUMNS):
+        return None, BINANCE_AGG_TRADE_COLUMNS
+    raise ValueError(f"{path}: no header row and not a known trade dump layout")
+
+
+def _open_binary(path):
+    # Exchange dumps come zipped, one CSV per archive
+    if path.endswith('.zip'):
+        archive = zipfile.ZipFile(path)
+        return archive.open(archive.namelist()[0])
+    return open(path, 'rb')
+
+
+def _pick(columns, candidates, path):
+    for column in candidates:
+        if column in columns:
+            return column
+    raise ValueError(f"{path}: none of the columns {', '.join(candidates)} found")
+
+
+def read_trade_chunks(paths, chunk_size=1_000_000):
+    # Yields (times, prices, sizes) arrays of about chunk_size trade prints, file by file in the
+    # given order. CSV (also zipped, like exchange dumps) and Parquet files are read incrementally,
+    # so memory stays bounded by the chunk size however long the files are.
+    if isinstance(paths, str):
+        paths = [paths]
+    for path in paths:
+        if path.endswith('.parquet'):
+            import pyarrow.parquet as pq
+            parquet = pq.ParquetFile(path)
+            names = parquet.schema_arrow.names
+            columns = [_pick(names, TIME_COLUMNS, path), _pick(names, PRICE_COLUMNS, path),
+                       _pick(names, SIZE_COLUMNS, path)]
+            for batch in parquet.iter_batches(batch_size=chunk_size, columns=columns):
+                times, prices, sizes = (batch.column(i).to_numpy() for i in range(3))
+                if not np.issubdtype(times.dtype, np.datetime64):
+                    times = epoch_to_datetime64(times)
+                yield times.astype('datetime64[ns]'), prices.astype(float), sizes.astype(float)
+            continue
+
+        header, names = _csv_layout(path)
+        columns = names if names is not None else pd.read_csv(path, nrows=0).columns
+        usecols = [_pick(columns, TIME_COLUMNS, path), _pick(columns, PRICE_COLUMNS, path),
+                   _pick(columns, SIZE_COLUMNS, path)]
+        try:
+            import pyarrow as pa
+            import pyarrow.csv as pa_csv
+        except ImportError:
+            pa_csv = None
+        if pa_csv is not None:
+            # pyarrow's streaming reader parses in parallel, about twice as fast as pandas;
+            # blocks are sized in bytes, roughly chunk_size lines of a trade dump
+            source = _open_binary(path)
+            read_options = pa_csv.ReadOptions(column_names=names, block_size=chunk_size * 64)
+            if names is None:
+                read_options = pa_csv.ReadOptions(block_size=chunk_size * 64)
+            convert_options = pa_csv.ConvertOptions(
+                include_columns=usecols,
+                column_types={usecols[0]: pa.int64(), usecols[1]: pa.float64(), usecols[2]: pa.float64()})
+            with source:
+                for batch in pa_csv.open_csv(source, read_options=read_options, convert_options=convert_options):
+                    yield (epoch_to_datetime64(batch.column(usecols[0]).to_numpy()),
+                           batch.column(usecols[1]).to_numpy(), batch.column(usecols[2]).to_numpy())
+            continue
+
+        reader = pd.read_csv(path, header=header, names=names, usecols=usecols, chunksize=chunk_size,
+                             dtype={usecols[0]: np.int64, usecols[1]: float, usecols[2]: float})
+        for chunk in reader:
+            yield (epoch_to_datetime64(chunk[usecols[0]].to_numpy()), chunk[usecols[1]].to_numpy(),
+                   chunk[usecols[2]].to_numpy())
+
+
+def tick_grid_backtest(chunks, initial_price, lower_limit, upper_limit, grid_levels, initial_capital, leverage,
+                       lower_stop_loss, upper_stop_loss, stop_loss_enabled, grid_type='arithmetic',
+                       maintenance_margin=0.005, trade_log_path=None, flush_every=10000, summary_only=False,
+                       fee_tiers=None):
+    # Runs the grid on every trade print, in print order, with the candle engine's rules: the
+    # same GridPositionBook (levels, sizing, fees or fee_tiers), prints outside the grid limits
+    # ignored and trading stopped at the first print beyond a stop-loss. chunks yields
+    # (times, prices, sizes) arrays, e.g. read_trade_chunks(paths). Each chunk gets a range
+    # index, so the book jumps straight from one level change to the next; equity, drawdown,
+    # exposure and liquidation are marked on every print, chunk by chunk, with running maxima.
+    started = time.perf_counter()
+    if summary_only:
+        trade_log = TradeCounter()
+    elif trade_log_path is not None:
+        trade_log = TradeLogWriter(trade_log_path, flush_every)
+    else:
+        trade_log = []
+    book = GridPositionBook(initial_price, lower_limit, upper_limit, grid_levels,
+                            initial_capital, leverage, trade_log, grid_type, fee_tiers)
+
+    ticks = 0
+    last_price = None
+    peak = initial_capital
+    max_drawdown = max_drawdown_pct = max_exposure = 0.0
+    liquidation = None
+    stop_loss_trigger = None
+    for times, prices, _ in chunks:
+        ticks += len(prices)
+        inside = (prices >= lower_limit) & (prices <= upper_limit)
+        if not inside.all():
+            times, prices = times[inside], prices[inside]
+        if len(prices) == 0:
+            continue
+        range_index = RangeIndex(prices)
+        stop = len(prices)
+        if stop_loss_enabled:
+            stop = range_index.first_outside(0, lower_stop_loss, upper_stop_loss)
+
+        segment_ticks = [0]
+        segment_totals = [(book.total_pnl, book.total_cost, book.long_quantity, book.long_entry,
+                           book.short_quantity, book.short_entry)]
+        i = range_index.first_outside(0, *book.band())
+        while i < stop:
+            price = float(prices[i])
+            open_buys, open_sells = book.target_counts(price)
+            book.rebalance(pd.Timestamp(times[i]), price, open_buys, open_sells)
+            segment_ticks.append(i)
+            segment_totals.append((book.total_pnl, book.total_cost, book.long_quantity, book.long_entry,
+                                   book.short_quantity, book.short_entry))
+            i = range_index.first_outside(i + 1, *book.band())
+
+        # Mark every print up to and including a stop-loss print
+        last = min(stop, len(prices) - 1)
+        marked = prices[:last + 1]
+        segment = np.searchsorted(segment_ticks, np.arange(last + 1), side='right') - 1
+        pnl, cost, long_quantity, long_entry, short_quantity, short_entry = (
+            np.array(totals, dtype=float)[segment] for totals in zip(*segment_totals))
+        equity = initial_capital + pnl - cost + (marked * (long_quantity - short_quantity) - long_entry + short_entry)
+        exposure = marked * (long_quantity + short_quantity)
+        peaks = np.maximum.accumulate(np.r_[peak, equity])[1:]
+        drawdown = peaks - equity
+        peak = peaks[-1]
+        max_drawdown = max(max_drawdown, drawdown.max())
+        positive = peaks > 0
+        if positive.any():
+            max_drawdown_pct = max(max_drawdown_pct, (drawdown[positive] / peaks[positive]).max())
+        max_exposure = max(max_exposure, exposure.max())
+        if liquidation is None:
+            liquidated = equity <= maintenance_margin * exposure
+            if liquidated.any():
+                first = int(liquidated.argmax())
+                liquidation = (pd.Timestamp(times[first]), marked[first])
+
+        last_price = marked[-1]
+        if stop < len(prices):
+            stop_loss_trigger = (pd.Timestamp(times[stop]), prices[stop])
+            break
+
+    if isinstance(trade_log, TradeLogWriter):
+        trade_log.close()
+
+    mtm_value = book.mtm_value(last_price if last_price is not None else initial_price)
+    total_mtm = book.total_pnl + mtm_value - book.total_cost
+    buying_power = initial_capital * leverage
+    elapsed = time.perf_counter() - started
+    return {
+        'total_current_pnl': book.total_pnl,
+        'mtm_value': mtm_value,
+        'total_mtm': total_mtm,
+        'total_cost': book.total_cost,
+        'roi': total_mtm / initial_capital * 100,
+        'open_trades': book.open_position_count(),
+        'stop_loss_triggered': stop_loss_trigger is not None,
+        'stop_loss_trigger_date': stop_loss_trigger[0] if stop_loss_trigger else None,
+        'stop_loss_trigger_price': stop_loss_trigger[1] if stop_loss_trigger else None,
+        'trade_log_df': build_trade_log_df(trade_log) if isinstance(trade_log, list) else None,
+        'trade_log_path': trade_log_path,
+        'total_trades': len(trade_log),
+        'max_drawdown': max(0.0, max_drawdown),
+        'max_drawdown_pct': max(0.0, max_drawdown_pct) * 100,
+        'max_exposure': max(0.0, max_exposure),
+        'max_margin_usage': max_exposure / buying_power * 100 if buying_power else 0.0,
+        'liquidated': liquidation is not None,
+        'liquidation_date': liquidation[0] if liquidation else None,
+        'liquidation_price': liquidation[1] if liquidation else None,
+        'ticks': ticks,
+        'elapsed': elapsed,
+        'ticks_per_second': ticks / elapsed if elapsed else None,
+    }
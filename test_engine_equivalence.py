@@ -0,0 +1,243 @@
+import os
+
+import matplotlib
+import numpy as np
+import pandas as pd
+import pytest
+
+from Grid_bot_backtesting import PreparedSeries, grid_bot_backtest
+
+
+# The rewritten engines must reproduce these per-bar loops exactly; each is the code as it stood
+# before the rewrite, trimmed to what the comparison needs
+
+def reference_grid_backtest(df, initial_price, lower_limit, upper_limit, grid_levels, initial_capital, leverage,
+                            lower_stop_loss, upper_stop_loss, stop_loss_enabled):
+    # grid_bot_strategy's original loop: every bar checks the stops, closes positions in the
+    # order they were opened, then opens every eligible level not held yet
+    grid_range = (upper_limit - lower_limit) / grid_levels
+    buy_levels = [initial_price - i * grid_range for i in range(1, grid_levels + 1)]
+    sell_levels = [initial_price + i * grid_range for i in range(1, grid_levels + 1)]
+    trade_log = []
+    total_pnl = 0
+    total_cost = 0
+    working_capital = initial_capital * leverage
+    open_positions = []
+    stop_loss_triggered = False
+    stop_loss_trigger_price = None
+
+    for _, row in df.iterrows():
+        price = row['Close']
+        date = row['Open time']
+        if stop_loss_enabled and (price >= upper_stop_loss or price <= lower_stop_loss):
+            stop_loss_triggered = True
+            stop_loss_trigger_price = price
+            break
+
+        for pos in open_positions[:]:
+            if pos['type'] == 'Buy' and price >= pos['target']:
+                pnl_current = (price - pos['price']) * pos['quantity']
+                transaction_cost = 0.0003 * price * pos['quantity']
+                total_pnl += pnl_current
+                total_cost += transaction_cost
+                working_capital += pnl_current
+                trade_log.append([date, price, 'Sell (Closing)', pos['price'], pos['target'],
+                                  round(pnl_current, 3), pos['quantity'], round(transaction_cost, 3)])
+                open_positions.remove(pos)
+            elif pos['type'] == 'Sell' and price <= pos['target']:
+                pnl_current = (pos['price'] - price) * pos['quantity']
+                transaction_cost = 0.0003 * price * pos['quantity']
+                total_pnl += pnl_current
+                total_cost += transaction_cost
+                working_capital += pnl_current
+                trade_log.append([date, price, 'Buy (Closing)', pos['target'], pos['price'],
+                                  round(pnl_current, 3), pos['quantity'], round(transaction_cost, 3)])
+                open_positions.remove(pos)
+
+        if price < initial_price:
+            for level in [level for level in buy_levels if price <= level]:
+                if not any(p['price'] == level for p in open_positions):
+                    quantity = working_capital / price / (grid_levels / 2)
+                    transaction_cost = 0.0003 * price * quantity
+                    total_cost += transaction_cost
+                    open_positions.append({'type': 'Buy', 'price': level, 'target': level + grid_range,
+                                           'quantity': round(quantity, 8)})
+                    trade_log.append([date, price, 'Buy (Opening)', level, level + grid_range, 0,
+                                      round(quantity, 8), round(transaction_cost, 3)])
+        elif price > initial_price:
+            for level in [level for level in sell_levels if price >= level]:
+                if not any(p['price'] == level for p in open_positions):
+                    quantity = working_capital / price / (grid_levels / 2)
+                    transaction_cost = 0.0003 * price * quantity
+                    total_cost += transaction_cost
+                    open_positions.append({'type': 'Sell', 'price': level, 'target': level - grid_range,
+                                           'quantity': round(quantity, 8)})
+                    trade_log.append([date, price, 'Sell (Opening)', level - grid_range, level, 0,
+                                      round(quantity, 8), round(transaction_cost, 3)])
+
+    if stop_loss_triggered:
+        mtm_price = stop_loss_trigger_price
+    elif not df.empty:
+        mtm_price = df.iloc[-1]['Close']
+    else:
+        mtm_price = initial_price
+    mtm_value = 0
+    for pos in open_positions:
+        if pos['type'] == 'Buy':
+            mtm_value += (mtm_price - pos['price']) * pos['quantity']
+        else:
+            mtm_value += (pos['price'] - mtm_price) * pos['quantity']
+
+    trade_log_df = pd.DataFrame(trade_log, columns=['Date', 'Price', 'B/S', 'Entry_Level', 'Target_Level',
+                                                    'PNL_Current', 'Quantity', 'Transaction_Cost'])
+    trade_log_df.insert(0, 'Seq', range(1, len(trade_log_df) + 1))
+    trade_log_df['Cumulative_PNL'] = trade_log_df['PNL_Current'].cumsum()
+    trade_log_df['Cumulative_Cost'] = trade_log_df['Transaction_Cost'].cumsum()
+    trade_log_df['Net_PNL'] = trade_log_df['Cumulative_PNL'] - trade_log_df['Cumulative_Cost']
+    return trade_log_df, {
+        'total_current_pnl': total_pnl,
+        'mtm_value': mtm_value,
+        'total_mtm': total_pnl + mtm_value - total_cost,
+        'total_cost': total_cost,
+        'open_trades': len(open_positions),
+        'stop_loss_triggered': stop_loss_triggered,
+        'stop_loss_trigger_price': stop_loss_trigger_price,
+    }
+
+
+def reference_trailing_grid(df, start_date, end_date, initial_price, lower_limit, upper_limit, grid_levels,
+                            initial_capital):
+    # Grid_Str_Backtest's original row loop and its rescan of the open positions per trade
+    df['date'] = pd.to_datetime(df['date'])
+    df = df[(df['date'] >= start_date) & (df['date'] <= end_date)]
+    df = df[(df['close'] >= lower_limit) & (df['close'] <= upper_limit)]
+    df = df.iloc[::-1]
+    grid_range = (upper_limit - lower_limit) / grid_levels
+    buy_level = initial_price - grid_range
+    sell_level = initial_price + grid_range
+    trade_log = []
+    total_pnl = 0
+    quantity = 0
+    open_positions = {}
+
+    for _, row in df.iterrows():
+        price = row['close']
+        date = row['date']
+        quantity = ((initial_capital / price) / (grid_levels / 2))
+        if price <= buy_level:
+            trade_log.append({'Date': date, 'Price': price, 'B/S': 'Buy', 'Buy_Level': buy_level,
+                              'Sell_Level': sell_level})
+            open_positions[date] = {'Price': price, 'B/S': 'Buy'}
+            sell_level = buy_level + grid_range
+            buy_level = buy_level - grid_range
+        elif price >= sell_level:
+            trade_log.append({'Date': date, 'Price': price, 'B/S': 'Sell', 'Buy_Level': buy_level,
+                              'Sell_Level': sell_level})
+            open_positions[date] = {'Price': price, 'B/S': 'Sell'}
+            buy_level = sell_level - grid_range
+            sell_level = sell_level + grid_range
+
+    closed_trades = {}
+    for trade in trade_log:
+        date, price, bs = trade['Date'], trade['Price'], trade['B/S']
+        other_side = 'Sell' if bs == 'Buy' else 'Buy'
+        for other_date, other_trade in open_positions.items():
+            if other_trade['B/S'] == other_side and abs(other_trade['Price'] - price) <= grid_range:
+                pnl = (price - other_trade['Price']) * quantity if bs == 'Buy' else \
+                    (other_trade['Price'] - price) * quantity
+                closed_trades[other_date] = {'Date': other_date, 'Price': other_trade['Price'], 'B/S': other_side,
+                                             'PNL': pnl}
+                closed_trades[date] = {'Date': date, 'Price': price, 'B/S': bs, 'PNL': pnl}
+                total_pnl += pnl
+                del open_positions[other_date]
+                break
+
+    trade_log_df = pd.DataFrame(trade_log, columns=['Date', 'Price', 'B/S', 'Buy_Level', 'Sell_Level'])
+    closed_trades_df = pd.DataFrame(list(closed_trades.values()), columns=['Date', 'Price', 'B/S', 'PNL'])
+    return trade_log_df, closed_trades_df, total_pnl
+
+
+def hourly_walk(n, seed, vol):
+    rng = np.random.default_rng(seed)
+    close = 30000.0 * np.exp(np.cumsum(rng.normal(0, vol, n)))
+    return pd.DataFrame({'Open time': pd.date_range('2024-01-01', periods=n, freq='1h'), 'Close': close,
+                         'Volume': rng.random(n) * 100})
+
+
+def assert_matches_reference(results, reference):
+    trade_log_df, summary = reference
+    engine_log = results['trade_log_df'].astype({'Date': 'datetime64[ns]'})
+    pd.testing.assert_frame_equal(engine_log, trade_log_df.astype({'Date': 'datetime64[ns]'}), check_exact=True)
+    for key, value in summary.items():
+        assert results[key] == value, key
+
+
+GRID = dict(initial_price=30000.0, lower_limit=27000.0, upper_limit=33000.0, initial_capital=10000.0,
+            leverage=10.0, lower_stop_loss=25000.0, upper_stop_loss=36000.0)
+
+
+@pytest.mark.parametrize('seed', range(4))
+@pytest.mark.parametrize('grid_levels', [7, 20, 50])
+@pytest.mark.parametrize('stop_loss_enabled', [False, True])
+def test_backtest_matches_per_bar_loop(seed, grid_levels, stop_loss_enabled):
+    # Both engine paths on one shared PreparedSeries date slice: the first run of a geometry skips
+    # ahead with the range index, the repeat uses the cached crossing events
+    df = hourly_walk(1500, seed, 0.004)
+    params = dict(GRID, grid_levels=grid_levels, stop_loss_enabled=stop_loss_enabled)
+    start_date, end_date = '2024-01-03', '2024-02-20'
+    dated = df[(df['Open time'] >= start_date) & (df['Open time'] <= end_date)]
+    reference = reference_grid_backtest(dated, **params)
+
+    series = PreparedSeries.from_frame(df).slice(start_date, end_date)
+    first = grid_bot_backtest(series, None, None, **params)
+    repeat = grid_bot_backtest(series, None, None, **params)
+    assert_matches_reference(first, reference)
+    assert_matches_reference(repeat, reference)
+
+
+@pytest.mark.parametrize('seed', range(4))
+def test_unbound_volume_limit_matches_per_bar_loop(seed):
+    df = hourly_walk(1500, seed, 0.004)
+    params = dict(GRID, grid_levels=20, stop_loss_enabled=bool(seed % 2))
+    results = grid_bot_backtest(PreparedSeries.from_frame(df), None, None, volume_fraction=1e12, **params)
+    assert_matches_reference(results, reference_grid_backtest(df, **params))
+
+
+@pytest.fixture(scope='module')
+def trailing_grid(tmp_path_factory):
+    # Grid_Str_Backtest plots BTC-2017min.csv when imported: give it a small file and no display
+    matplotlib.use('Agg')
+    directory = tmp_path_factory.mktemp('btc')
+    minute_walk(500, 0, 0.002, duplicates=False).to_csv(directory / 'BTC-2017min.csv', index=False)
+    cwd = os.getcwd()
+    os.chdir(directory)
+    try:
+        import Grid_Str_Backtest
+    finally:
+        os.chdir(cwd)
+    return Grid_Str_Backtest
+
+
+def minute_walk(n, seed, vol, duplicates):
+    # Newest first, like BTC-2017min.csv; with duplicates many bars share a timestamp
+    rng = np.random.default_rng(seed)
+    close = 4500.0 * np.exp(np.cumsum(rng.normal(0, vol, n)))
+    dates = pd.date_range('2017-10-01', periods=n, freq='1min')
+    if duplicates:
+        dates = dates[rng.integers(0, n // 3, n)].sort_values()
+    df = pd.DataFrame({'date': dates.strftime('%Y-%m-%d %H:%M:%S'), 'close': close})
+    return df.iloc[::-1].reset_index(drop=True)
+
+
+@pytest.mark.parametrize('seed', range(3))
+@pytest.mark.parametrize('vol, grid_levels', [(0.002, 15), (0.004, 40), (0.01, 60)])
+@pytest.mark.parametrize('duplicates', [False, True])
+def test_trailing_grid_matches_row_loop(trailing_grid, seed, vol, grid_levels, duplicates):
+    df = minute_walk(4000, seed, vol, duplicates)
+    args = ('2017-10-01', '2017-11-01', 4500, 3000, 6000, grid_levels, 1000)
+    trade_log_df, closed_trades_df, total_pnl = trailing_grid.grid_bot_strategy(df.copy(), *args)
+    reference_log, reference_closed, reference_pnl = reference_trailing_grid(df.copy(), *args)
+
+    pd.testing.assert_frame_equal(trade_log_df, reference_log, check_exact=True)
+    pd.testing.assert_frame_equal(closed_trades_df, reference_closed, check_exact=True)
+    assert total_pnl == reference_pnl
@@ -0,0 +1,42 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from Grid_bot_backtesting import PreparedSeries, grid_bot_backtest, simulate_grid_batch
+
+
+GRID = dict(initial_price=30000.0, lower_limit=27000.0, upper_limit=33000.0, grid_levels=20,
+            initial_capital=10000.0, leverage=10.0)
+
+
+def path_leaving_limits():
+    # Swings well past both limits and back, so whole stretches lie outside the grid
+    bars = np.arange(3000)
+    return 30000.0 + 4500.0 * np.sin(bars / 90.0) + 300.0 * np.sin(bars / 7.0)
+
+
+@pytest.mark.parametrize('stop_loss_enabled, lower_stop_loss, upper_stop_loss', [
+    (False, 25000.0, 36000.0),  # Outside the limits: never reached by traded bars
+    (True, 25000.0, 36000.0),
+    (True, 27500.0, 34000.0),  # Lower stop inside the limits: triggers on a traded bar
+])
+def test_path_outside_limits_matches_backtest(stop_loss_enabled, lower_stop_loss, upper_stop_loss):
+    path = path_leaving_limits()
+    assert path.min() < GRID['lower_limit'] and path.max() > GRID['upper_limit']
+    stops = dict(lower_stop_loss=lower_stop_loss, upper_stop_loss=upper_stop_loss,
+                 stop_loss_enabled=stop_loss_enabled)
+
+    # The batch sees the raw path in chunks; the backtest sees only bars inside the limits
+    chunks = np.array_split(path[None, :], 7, axis=1)
+    batch = simulate_grid_batch(chunks, **GRID, **stops).iloc[0]
+    df = pd.DataFrame({'Open time': pd.date_range('2024-01-01', periods=len(path), freq='1h'), 'Close': path})
+    series = PreparedSeries.from_frame(df).between_prices(GRID['lower_limit'], GRID['upper_limit'])
+    results = grid_bot_backtest(series, None, None, summary_only=True, **GRID, **stops)
+
+    assert batch['stop_loss_triggered'] == results['stop_loss_triggered']
+    if results['stop_loss_triggered']:
+        assert batch['stop_loss_trigger_price'] == results['stop_loss_trigger_price']
+    assert batch['total_trades'] == results['total_trades']
+    assert batch['open_trades'] == results['open_trades']
+    for key in ['total_current_pnl', 'mtm_value', 'total_mtm', 'total_cost', 'roi']:
+        assert batch[key] == pytest.approx(results[key], rel=1e-9, abs=1e-6)
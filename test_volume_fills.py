@@ -0,0 +1,33 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from Grid_bot_backtesting import PreparedSeries, grid_bot_backtest
+
+
+def random_walk(n, seed, vol):
+    rng = np.random.default_rng(seed)
+    close = 30000.0 * np.exp(np.cumsum(rng.normal(0, vol, n)))
+    return pd.DataFrame({'Open time': pd.date_range('2024-01-01', periods=n, freq='1h'), 'Close': close,
+                         'Volume': rng.random(n) * 100})
+
+
+@pytest.mark.parametrize('seed', range(12))
+def test_unbound_volume_limit_matches_default_engine(seed):
+    # With capacity that never binds, every order fills on the bar it is placed, so the
+    # volume-limited book must trade exactly like GridPositionBook
+    rng = np.random.default_rng(seed)
+    params = dict(initial_price=30000.0, lower_limit=24000.0, upper_limit=37000.0,
+                  grid_levels=int(rng.integers(4, 60)), initial_capital=10000.0,
+                  leverage=float(rng.choice([1, 5, 10])), lower_stop_loss=26000.0, upper_stop_loss=35000.0,
+                  stop_loss_enabled=bool(seed % 2), grid_type=['arithmetic', 'geometric'][seed % 3 == 0])
+    df = random_walk(1500, seed, rng.uniform(0.002, 0.01))
+    series = PreparedSeries.from_frame(df).between_prices(params['lower_limit'], params['upper_limit'])
+
+    default = grid_bot_backtest(series, None, None, **params)
+    limited = grid_bot_backtest(series, None, None, volume_fraction=1e12, **params)
+
+    pd.testing.assert_frame_equal(limited['trade_log_df'], default['trade_log_df'], check_exact=True)
+    assert limited['total_mtm'] == default['total_mtm']
+    assert limited['open_trades'] == default['open_trades']
+    assert limited['fill_ratio'] == 1.0